@@ -1,139 +1,178 @@
+import time
+# Startup time is measured from here; see the startup metrics below
+IMPORT_STARTED = time.monotonic()
 import os
-import yaml
+import copy
+import logging
 import re
-import json
+import threading
 from datetime import datetime
+from contextlib import contextmanager
 from functools import wraps
-from flask import Flask, render_template, jsonify, request, session, redirect, url_for
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, WebDriverException
+from flask import Flask, Response, g, render_template, send_file, jsonify, request, session, redirect, url_for, stream_with_context
 from apscheduler.schedulers.background import BackgroundScheduler
 import atexit
 from werkzeug.security import generate_password_hash, check_password_hash
+from config_store import ConfigStore
+from driver_pool import DriverPool
+from load_profile import LoadProfile, PAGE_BYTES_SCRIPT
+from login_throttle import LoginThrottle, LoginRejected
+from http_cache import CachedJSON, CachedPages, cached_response
+from events import EventBroker
+from change_log import ChangeLog
+from coordination import Coordinator, LeaderLock, SharedState
+from world_store import WorldStore, SCHEMA_VERSION, empty_worlds_data, parse_players
+from refresh import RefreshEngine
+from poll_scheduler import PollScheduler
+from refresh_jobs import RefreshJobs
+from http_probe import GENERIC_TITLES, probe_instance_http, http as probe_http
+from http_transport import origin_of
+from image_cache import ImageCache
+from instance_snapshot import load_snapshot, save_snapshot
+from timeseries import PlayerHistory, parse_duration
+import metrics
+import assets
+import logs
+from tracing import Tracer
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+# Structured, queue-backed logging; see logs.py
+logs.configure()
+log = logging.getLogger('portal')
+scraper_log = logging.getLogger('portal.scraper')
+# Timed spans of the last few refresh cycles, served at /debug/trace
+tracer = Tracer()
 
 # Initialize the Flask application
 app = Flask(__name__)
 app.secret_key = os.urandom(24)  # Secret key for session management
+# Hashed, precompressed static files built by `python assets.py`
+assets.init_app(app)
 
 # Global cache to store instance data
 instance_data_cache = []
+# Bumped whenever instance_data_cache changes
+instance_data_version = 0
+instance_data_lock = threading.Lock()
+# Pushes instance and world updates to /api/events subscribers
+event_broker = EventBroker()
+published_world_version = None
+published_world_lock = threading.Lock()
+# Versioned log of instance and world changes, served by /api/changes
+change_log = ChangeLog()
+# Warm Chrome sessions reused across status probes
+driver_pool = DriverPool()
+# Page load strategy and blocked requests for browser probes; see load_profile.py
+scraper_profile = LoadProfile()
 CONFIG_FILE = 'config.yaml'
+# Last published instance statuses, restored on startup
+INSTANCE_SNAPSHOT_FILE = 'instance_snapshot.json'
+saved_instance_version = None
+# Seconds from IMPORT_STARTED until the app was ready and until it first answered a request
+startup_seconds = None
+first_response_seconds = None
+# Set by gunicorn.conf.py: worker processes elect one leader to run the scheduler
+MULTI_WORKER = os.environ.get('PORTAL_MULTI_WORKER') == '1'
+SHARED_STATE_FILE = 'portal_state.db'
+LEADER_LOCK_FILE = 'portal_leader.lock'
+shared_state = SharedState(SHARED_STATE_FILE) if MULTI_WORKER else None
+if shared_state is not None:
+    # Sessions must be readable by every worker
+    app.secret_key = shared_state.secret('secret_key', lambda: os.urandom(24).hex())
+# Pre-SQLite world history, imported into WORLDS_DATABASE on first start
 WORLDS_FILE = 'worlds.json'
+WORLDS_DATABASE = 'worlds.db'
+# Parsed config.yaml, reloaded only when the file changes
+config_store = ConfigStore(CONFIG_FILE)
+# World history and probe observations, kept in memory and flushed to SQLite in the background
+world_store = WorldStore(WORLDS_DATABASE, legacy_path=WORLDS_FILE,
+                         on_change=lambda key, world: change_log.record('worlds', key, world))
+# Rate limits and a bounded hashing pool for /api/login; see login_throttle.py
+login_throttle = LoginThrottle(shared=shared_state)
+# Card-sized copies of world backgrounds, served by /backgrounds/<key>
+image_cache = ImageCache(probe_http, cache_dir='image_cache')
+background_fetcher = ThreadPoolExecutor(max_workers=2, thread_name_prefix='background')
+DEFAULT_BACKGROUND = '/static/images/background.jpg'
+# Chrome's own default; pooled sessions keep whatever was last set
+DEFAULT_PAGE_LOAD_TIMEOUT = 300
+# Cached backgrounds only change when their URL (and so their key) changes
+BACKGROUND_MAX_AGE = 7 * 24 * 3600
+# How often the scheduler checks which instances are due for a probe
+SCHEDULER_TICK_SECONDS = 2
+# Refresh cycles kept for /debug/trace
+DEFAULT_TRACE_CYCLES = 20
+# Cycles that can be waiting on their probes at once; more wait for one to finish
+MAX_RUNNING_CYCLES = 16
 
 def load_config():
     """
-    Load the configuration from the 'config.yaml' file.
+    Load a private, modifiable copy of the configuration.
     Returns:
         dict: Configuration dictionary.
     """
-    if not os.path.exists(CONFIG_FILE):
-        print(f"DEBUG: Config file {CONFIG_FILE} NOT found.")
-        return {}
-    with open(CONFIG_FILE, 'r') as file:
-        config = yaml.safe_load(file) or {}
-        print(f"DEBUG: Loaded config. Keys: {config.keys()}")
-        if 'admin_password_hash' in config:
-            print("DEBUG: admin_password_hash is present.")
-        else:
-            print("DEBUG: admin_password_hash is MISSING.")
-        return config
+    return copy.deepcopy(config_store.snapshot())
+
+def get_config():
+    """
+    Return the cached configuration snapshot without touching disk.
+    The snapshot is shared and must not be modified; use load_config() for that.
+    """
+    return config_store.snapshot()
 
 def save_config(config):
     """
     Save the configuration to 'config.yaml'.
     """
-    with open(CONFIG_FILE, 'w') as file:
-        yaml.dump(config, file)
+    config_store.save(config)
 
 def load_worlds():
-    """Load world history from worlds.json file."""
-    if not os.path.exists(WORLDS_FILE):
-        return {"worlds": {}, "schema_version": 1}
-    try:
-        with open(WORLDS_FILE, 'r') as file:
-            return json.load(file)
-    except (json.JSONDecodeError, IOError):
-        print(f"ERROR: Could not load {WORLDS_FILE}, returning empty data")
-        return {"worlds": {}, "schema_version": 1}
+    """Load world history (served from the in-memory world store)."""
+    return {"worlds": world_store.snapshot(), "schema_version": SCHEMA_VERSION}
 
 def save_worlds(worlds_data):
-    """Save world history to worlds.json file with atomic write."""
-    temp_file = WORLDS_FILE + '.tmp'
-    try:
-        with open(temp_file, 'w') as file:
-            json.dump(worlds_data, file, indent=2)
-        os.replace(temp_file, WORLDS_FILE)  # Atomic on POSIX
-        print(f"DEBUG: Saved {len(worlds_data.get('worlds', {}))} worlds to {WORLDS_FILE}")
-    except IOError as e:
-        print(f"ERROR: Could not save {WORLDS_FILE}: {e}")
-        if os.path.exists(temp_file):
-            os.remove(temp_file)
-
-def update_world_statuses(instances):
-    """Update world statuses based on current instance states."""
-    worlds_data = load_worlds()
-    worlds = worlds_data.get("worlds", {})
-    now = datetime.utcnow().isoformat() + 'Z'
-
-    # First, mark all worlds as offline
-    for world in worlds.values():
-        world['status'] = 'offline'
-
-    # Then update based on current instance states
-    for instance in instances:
-        instance_name = instance['name']
-        instance_url = instance['url']
-        instance_status = instance['status']
-
-        if instance_status == 'active' and instance.get('active_world'):
-            # World is running
-            active_world = instance['active_world']
-            world_key = f"{instance_name}::{active_world['name']}"
-
-            if world_key in worlds:
-                # Update existing world
-                world = worlds[world_key]
-                world['last_seen'] = now
-                world['status'] = 'active'
-                world['times_seen'] = world.get('times_seen', 0) + 1
-                if active_world.get('background'):
-                    world['cached_background_url'] = active_world['background']
-            else:
-                # Create new world entry
-                worlds[world_key] = {
-                    'name': active_world['name'],
-                    'instance_name': instance_name,
-                    'instance_url': instance_url,
-                    'first_seen': now,
-                    'last_seen': now,
-                    'status': 'active',
-                    'cached_background_url': active_world.get('background'),
-                    'times_seen': 1
-                }
-        else:
-            # Instance is online or offline, mark any of its worlds as idle/offline
-            for world_key, world in worlds.items():
-                if world['instance_name'] == instance_name:
-                    if instance_status == 'online':
-                        world['status'] = 'idle'
-                    else:
-                        world['status'] = 'offline'
+    """Replace world history; written to the database by the store's write-behind flush."""
+    world_store.replace(worlds_data.get('worlds', {}))
 
-    worlds_data['worlds'] = worlds
-    save_worlds(worlds_data)
+def resolve_background_url(world):
+    """
+    Absolute URL of a world's background on its Foundry instance, or None if
+    the portal shouldn't fetch it. The URL comes from the instance's own page,
+    so anything pointing at another origin is left to the browser; otherwise
+    the page could make the portal fetch and re-serve arbitrary URLs.
+    """
+    if not image_cache.enabled or not world.get('cached_background_url'):
+        return None
+    url = urljoin(world['instance_url'].rstrip('/') + '/', world['cached_background_url'])
+    if origin_of(url) != origin_of(world['instance_url']):
+        return None
+    return url
+
+def update_world_statuses(instances, probed=None):
+    """
+    Update world statuses based on current instance states. `probed` names
+    the instances actually probed this time (default: all of them).
+    """
+    for world in world_store.apply_instances(instances, probed):
+        # Only new or changed background URLs are fetched again
+        url = resolve_background_url(world)
+        if url is not None:
+            background_fetcher.submit(image_cache.warm, url)
+
+def world_view(world):
+    """Add the cached thumbnail path to a world entry before sending it to clients."""
+    url = resolve_background_url(world)
+    if url is not None:
+        world['background_thumbnail'] = f'/backgrounds/{image_cache.register(url)}'
+    return world
 
 def get_all_worlds_sorted():
     """Get all worlds sorted by status (active, idle, offline) then by last_seen desc."""
-    worlds_data = load_worlds()
-    worlds_list = list(worlds_data.get("worlds", {}).values())
+    worlds_list = [world_view(world) for world in world_store.worlds()]
+    status_priority = {'active': 0, 'idle': 1, 'offline': 2}
 
     # Define sort priority: active=0, idle=1, offline=2
     def get_sort_key(world):
-        status_priority = {'active': 0, 'idle': 1, 'offline': 2}
         return (
             status_priority.get(world.get('status', 'offline'), 2),
             -datetime.fromisoformat(world.get('last_seen', '1970-01-01T00:00:00Z').replace('Z', '+00:00')).timestamp()
@@ -142,47 +181,96 @@ def get_all_worlds_sorted():
     worlds_list.sort(key=get_sort_key)
     return worlds_list
 
-def check_instance_status(instance_url):
+# Serialized API bodies, rebuilt only when the underlying state changes
+worlds_response_cache = CachedJSON(get_all_worlds_sorted, lambda data: app.json.dumps(data))
+instance_status_response_cache = CachedJSON(lambda: instance_data_cache, lambda data: app.json.dumps(data))
+
+@contextmanager
+def probe_phase(label, phase):
+    """Time a probe phase for both /metrics and the cycle trace."""
+    with metrics.probe_phase_duration.time(instance=label, phase=phase), tracer.span(phase):
+        yield
+
+def record_page_bytes(driver, label):
+    """Stop loading the rest of the page and record how many bytes the probe transferred."""
+    from selenium.common.exceptions import WebDriverException
+    try:
+        driver.execute_script('window.stop();')
+        page_bytes = driver.execute_script(PAGE_BYTES_SCRIPT) or 0
+    except WebDriverException:
+        return
+    metrics.probe_bytes.observe(page_bytes, instance=label)
+    scraper_log.debug("Transferred %s bytes", page_bytes, extra={'fields': {'instance': label}})
+
+def page_decidable(driver):
+    """True once the status can be read from the URL, or the document has been parsed."""
+    url = driver.current_url
+    if url == 'about:blank':
+        return False
+    if any(path in url for path in ('/join', '/game', '/auth', '/setup')):
+        return True
+    return driver.execute_script('return document.readyState') != 'loading'
+
+def check_instance_status(instance_url, expires_at=None, instance_name=None, blocked_urls=None):
     """
     Check the status of a Foundry instance by navigating to its URL using Selenium.
     Uses regex to parse player counts from the body text.
+    The browser session is borrowed from the shared driver pool.
+    If `expires_at` (a time.monotonic() deadline) is given, waiting for a pooled
+    session, the page load and element waits all end by then; a probe that
+    can't get a session in time raises PoolTimeout.
+    Phase timings are recorded under `instance_name` (defaults to the URL).
+    Requests matching `blocked_urls` (DevTools URL patterns) are not sent.
     """
-    options = Options()
-    options.add_argument('--headless')
-    options.add_argument('--no-sandbox')
-    options.add_argument('--disable-dev-shm-usage')
-    options.add_argument('--disable-gpu')
-    options.add_argument('window-size=1920x1080')
-    options.add_argument('--ignore-certificate-errors')
+    # Selenium is only imported once a browser probe is actually needed
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import TimeoutException, WebDriverException
 
-    driver = webdriver.Chrome(options=options)
+    label = instance_name or instance_url
+    with probe_phase(label, 'driver_startup'):
+        driver = driver_pool.acquire(None if expires_at is None else max(0, expires_at - time.monotonic()))
+    if expires_at is None:
+        expires_at = time.monotonic() + DEFAULT_PAGE_LOAD_TIMEOUT
 
     status = "offline"
     active_world = None
     background_url = None
 
     try:
-        driver.get(instance_url)
+        # Only what is left of the deadline after waiting for a session
+        driver.set_page_load_timeout(max(0.001, expires_at - time.monotonic()))
+        # Set on every probe, since pooled sessions move between instances with different rules
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': blocked_urls or []})
+        with probe_phase(label, 'page_load'):
+            driver.get(instance_url)
+            if scraper_profile.page_load_strategy == 'none':
+                # driver.get returned as soon as navigation started
+                WebDriverWait(driver, max(0, expires_at - time.monotonic())).until(page_decidable)
 
-        # DEBUG: Print what the scraper actually sees
-        print(f"DEBUG SCRAPER: URL={driver.current_url}, Title={driver.title}")
-        print(f"DEBUG SCRAPER: Checking conditions...")
+        scraper_log.debug("Loaded page", extra={'fields': {'instance': label, 'url': driver.current_url,
+                                                          'title': driver.title}})
 
         # Check for /join first (active world)
         if "/join" in driver.current_url:
-            print(f"DEBUG SCRAPER: Matched /join condition")
+            scraper_log.debug("Matched /join condition", extra={'fields': {'instance': label}})
             # Wait for the page to load - check for the current-players element
+            wait_timeout = max(0, min(10, expires_at - time.monotonic()))
             try:
-                WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.CLASS_NAME, "current-players"))
-                )
+                with probe_phase(label, 'players_wait'):
+                    WebDriverWait(driver, wait_timeout).until(
+                        EC.presence_of_element_located((By.CLASS_NAME, "current-players"))
+                    )
             except TimeoutException:
-                print("DEBUG SCRAPER: Timeout waiting for current-players element")
+                scraper_log.debug("Timeout waiting for current-players element",
+                                  extra={'fields': {'instance': label}})
 
             world_name = driver.title.strip()
 
             # Validate world name - must be non-empty and not a generic loading message
-            if world_name and len(world_name) > 0 and world_name not in ['Foundry Virtual Tabletop', 'Loading...', 'foundry.tongatime.us', '']:
+            if world_name and len(world_name) > 0 and world_name not in GENERIC_TITLES:
                 # Try to get background
                 try:
                     background_url = driver.execute_script("""
@@ -200,7 +288,8 @@ def check_instance_status(instance_url):
                         current = count_elements[0].text
                         max_players = count_elements[1].text
                         player_info = f"{current} / {max_players}"
-                        print(f"DEBUG SCRAPER: Found player info from elements: {player_info}")
+                        scraper_log.debug("Found player info from elements: %s", player_info,
+                                          extra={'fields': {'instance': label}})
                     else:
                         # Fallback to regex on body text
                         body_text = driver.find_element(By.TAG_NAME, "body").text
@@ -208,13 +297,14 @@ def check_instance_status(instance_url):
                         match = re.search(r"Current Players\s*(\d+)\s*/\s*(\d+)", body_text, re.DOTALL)
                         if match:
                             player_info = f"{match.group(1)} / {match.group(2)}"
-                            print(f"DEBUG SCRAPER: Found player info from text: {player_info}")
+                            scraper_log.debug("Found player info from text: %s", player_info,
+                                              extra={'fields': {'instance': label}})
                         else:
                             player_info = "Unknown / Unknown"
-                            print(f"DEBUG SCRAPER: No player match found")
+                            scraper_log.debug("No player match found", extra={'fields': {'instance': label}})
                 except Exception as e:
                     player_info = "Unknown / Unknown"
-                    print(f"DEBUG SCRAPER: Exception getting player count: {e}")
+                    scraper_log.warning("Could not read player count: %s", e, extra={'fields': {'instance': label}})
 
                 # Create active world entry
                 active_world = {
@@ -223,12 +313,13 @@ def check_instance_status(instance_url):
                     'players': player_info
                 }
                 status = "active"
-                print(f"DEBUG SCRAPER: Valid world detected: {world_name}")
+                scraper_log.debug("Valid world detected: %s", world_name, extra={'fields': {'instance': label}})
             else:
-                print(f"DEBUG SCRAPER: Skipping invalid/incomplete world name: '{world_name}'")
+                scraper_log.debug("Skipping invalid/incomplete world name: %r", world_name,
+                                  extra={'fields': {'instance': label}})
         # Check for /game (player is in a game)
         elif "/game" in driver.current_url:
-            print(f"DEBUG SCRAPER: Matched /game condition")
+            scraper_log.debug("Matched /game condition", extra={'fields': {'instance': label}})
             status = "online"
             # Try to get background
             try:
@@ -240,7 +331,7 @@ def check_instance_status(instance_url):
             except:
                 pass
         elif "Foundry Virtual Tabletop" in driver.title or "/auth" in driver.current_url or "/setup" in driver.current_url:
-            print(f"DEBUG SCRAPER: Matched online condition (title/auth/setup)")
+            scraper_log.debug("Matched online condition (title/auth/setup)", extra={'fields': {'instance': label}})
             status = "online"
             
             # Try to get background (same as before)
@@ -252,56 +343,255 @@ def check_instance_status(instance_url):
                 """)
             except:
                 pass
+        record_page_bytes(driver, label)
     except (TimeoutException, WebDriverException) as e:
-        print(f"DEBUG SCRAPER ERROR: {e}")
+        scraper_log.info("Browser probe failed: %s", e.msg, extra={'fields': {'instance': label}})
         status = "offline"
     finally:
-        driver.quit()
+        driver_pool.release(driver)
 
-    print(f"DEBUG SCRAPER: Final status={status}, active_world={active_world}")
+    scraper_log.debug("Final status", extra={'fields': {'instance': label, 'status': status,
+                                                        'active_world': active_world}})
     return status, active_world, background_url
 
+def build_instance_data(instance, status='offline', active_world=None, background_url=None):
+    """Build the cached status entry for a configured instance."""
+    return {
+        'name': instance['name'],
+        'url': instance['url'],
+        'status': status,
+        'active_world': active_world,
+        'background': background_url if background_url else DEFAULT_BACKGROUND
+    }
+
+def publish_instance_data(instances):
+    """Replace the instance cache, bumping its version if anything changed."""
+    with instance_data_lock:
+        replace_instance_data(instances)
+
+def publish_instance_entry(entry):
+    """Replace one instance's entry in the cache, keeping the rest (e.g. results from overlapping cycles)."""
+    with instance_data_lock:
+        replace_instance_data([entry if (instance['name'], instance['url']) == (entry['name'], entry['url'])
+                               else instance for instance in instance_data_cache])
+
+def replace_instance_data(instances):
+    """publish_instance_data() for callers already holding instance_data_lock."""
+    global instance_data_cache, instance_data_version
+    if instances == instance_data_cache:
+        return
+    previous = {instance['name']: instance for instance in instance_data_cache}
+    for instance in instances:
+        if previous.pop(instance['name'], None) != instance:
+            change_log.record('instances', instance['name'], instance)
+    for name in previous:
+        change_log.record('instances', name, None)
+    instance_data_cache = instances
+    instance_data_version += 1
+    entry = instance_status_response_cache.get(instance_data_version)
+    event_broker.publish('instances', entry.body.decode('utf-8'))
+
+def publish_world_changes():
+    """Push the world list to event subscribers if it changed since the last push."""
+    global published_world_version
+    # Probe results and admin actions call this from different threads; one push per version, in order
+    with published_world_lock:
+        version = world_store.version
+        if version == published_world_version:
+            return
+        published_world_version = version
+        entry = worlds_response_cache.get(version)
+        event_broker.publish('worlds', entry.body.decode('utf-8'))
+
 def initialize_instance_data():
-    global instance_data_cache
-    config = load_config()
+    """Start from the last saved statuses (marked stale), or offline for instances without one."""
+    config = get_config()
+    restored = load_snapshot(INSTANCE_SNAPSHOT_FILE)
     instances = []
 
     if 'instances' in config:
         for instance in config['instances']:
-            instance_data = {
-                'name': instance['name'],
-                'url': instance['url'],
-                'status': 'offline',
-                'active_world': None,
-                'background': '/static/images/background.jpg'
-            }
-            instances.append(instance_data)
+            instances.append(restored.get((instance['name'], instance['url'])) or build_instance_data(instance))
 
-    instance_data_cache = instances
+    publish_instance_data(instances)
+
+def save_instance_snapshot():
+    """Write the published statuses to disk if they changed since the last save."""
+    global saved_instance_version
+    with instance_data_lock:
+        if saved_instance_version == instance_data_version:
+            return
+        instances, saved_instance_version = instance_data_cache, instance_data_version
+    save_snapshot(INSTANCE_SNAPSHOT_FILE, instances)
+
+def probe_instance(instance, deadline):
+    """
+    Probe a single configured instance within `deadline` seconds.
+
+    The instance's `probe` setting picks the method: `http` only uses the
+    lightweight HTTP probe, `browser` only uses Selenium, and `auto` (default)
+    tries HTTP first and falls back to Selenium when it can't decide.
+    Instances whose circuit is open only get a cheap HTTP reachability check.
+    """
+    name = instance['name']
+    with metrics.probe_duration.time(instance=name), tracer.span('probe', instance=name) as span:
+        result = run_probe(instance, deadline)
+        if span is not None:
+            span.set(status=result[0])
+        return result
+
+def run_probe(instance, deadline):
+    name = instance['name']
+    if poll_scheduler.is_circuit_open(name):
+        with probe_phase(name, 'http_probe'):
+            return probe_instance_http(instance['url'], deadline, best_effort=True)
+
+    mode = instance.get('probe', 'auto')
+    # The HTTP probe and any browser fallback share one deadline
+    expires_at = time.monotonic() + deadline if deadline else None
+    if mode != 'browser':
+        with probe_phase(name, 'http_probe'):
+            result = probe_instance_http(instance['url'], deadline, best_effort=(mode == 'http'))
+        if result is not None:
+            return result
+        log.debug("HTTP probe undecided, falling back to browser", extra={'fields': {'instance': name}})
+    return check_instance_status(instance['url'], expires_at, instance_name=name,
+                                 blocked_urls=scraper_profile.blocked_urls(instance))
+
+# Probes instances concurrently; see refresh.py
+refresh_engine = RefreshEngine(probe_instance)
+# Threads waiting on running cycles; at most one cycle starts per scheduler tick
+cycle_runner = ThreadPoolExecutor(max_workers=MAX_RUNNING_CYCLES, thread_name_prefix='cycle')
+# Decides when each instance is probed next; see poll_scheduler.py
+poll_scheduler = PollScheduler()
+# Fixed-size player count history per instance; see timeseries.py
+player_history = PlayerHistory()
+# Progress of refreshes started by saving the config; see refresh_jobs.py
+refresh_jobs = RefreshJobs()
+
+def share_probe_result(name, status, current, maximum, started):
+    """Pass a probe result on to follower workers (no-op with a single process)."""
+    if shared_state is not None:
+        shared_state.append_event('probe', {'name': name, 'status': status, 'current': current,
+                                            'maximum': maximum, 'started': started,
+                                            'timestamp': time.time()})
+
+def queue_refresh(names):
+    """Make `names` due so the next scheduler tick probes them with whatever else is due."""
+    poll_scheduler.sync(get_config().get('instances', []))
+    for name in names:
+        poll_scheduler.request_refresh(name)
+
+def start_refresh_job(names):
+    """Queue a refresh of `names` and return the ID of a job following their probes."""
+    job_id = refresh_jobs.create(names)
+    if shared_state is not None:
+        job = {'id': job_id, 'names': names, 'created': refresh_jobs.get(job_id)['created']}
+        # Every worker can then answer /api/refresh/<id>
+        shared_state.append_event('refresh_job', job)
+        if is_follower():
+            shared_state.send_command('refresh_instances', **job)
+            return job_id
+    queue_refresh(names)
+    return job_id
 
 def update_instance_statuses():
-    global instance_data_cache
-    config = load_config()
-    instances = []
+    """
+    Start a refresh cycle for the instances the poll scheduler says are due.
+    The cycle runs on its own thread, so the next tick can start another for
+    whatever comes due meanwhile, even while a slow probe is still running.
+    Returns the started cycle's Future, or None if nothing was due.
+    """
+    config = get_config()
+    logs.configure(config.get('logging'))
+    tracer.configure((config.get('logging') or {}).get('trace_cycles', DEFAULT_TRACE_CYCLES))
+    driver_pool.configure(config.get('scraper'))
+    scraper_profile.configure((config.get('scraper') or {}).get('load_profile'))
+    driver_pool.set_launch_options(scraper_profile.chrome_arguments(config.get('instances', [])),
+                                   scraper_profile.page_load_strategy)
+    refresh_engine.configure(config.get('scraper'))
+    probe_http.configure(config.get('http'), config.get('instances', []))
+    poll_scheduler.configure(config.get('polling'))
+    world_store.configure(config.get('storage'))
+    configured = config.get('instances', [])
+    poll_scheduler.sync(configured)
+    player_history.sync({inst['name'] for inst in configured})
+    refresh_jobs.sync({inst['name'] for inst in configured})
 
-    if 'instances' in config:
-        for instance in config['instances']:
-            status, active_world, background_url = check_instance_status(instance['url'])
-            instance_data = {
-                'name': instance['name'],
-                'url': instance['url'],
-                'status': status,
-                'active_world': active_world,
-                'background': background_url if background_url else '/static/images/background.jpg'
-            }
-            instances.append(instance_data)
+    # Start from the last known state so the dashboard never goes blank while probes run
+    with instance_data_lock:
+        previous = {(i['name'], i['url']): i for i in instance_data_cache}
+        instances = [previous.get((inst['name'], inst['url'])) or build_instance_data(inst)
+                     for inst in configured]
+        config_changed = [(i['name'], i['url']) for i in instances] != \
+            [(i['name'], i['url']) for i in instance_data_cache]
+        replace_instance_data(instances)
+    if config_changed:
+        update_worlds(set())
 
-    instance_data_cache = instances
+    # Probes claimed below complete refresh jobs created before this point
+    cycle_started = time.time()
+    due_names = set(poll_scheduler.claim_due(hold=refresh_engine.cycle_deadline))
+    due = [inst for inst in configured if inst['name'] in due_names]
+    if due:
+        return cycle_runner.submit(run_cycle, due, len(configured), cycle_started)
+    return None
+
+def update_worlds(probed):
+    """Update world history from the published instance states, then save those states."""
+    with tracer.span('update_worlds'):
+        update_world_statuses(instance_data_cache, probed)
+        publish_world_changes()
+    save_instance_snapshot()
+
+def run_cycle(due, configured_count, cycle_started):
+    """Probe `due`, publishing each result as it arrives; runs on a cycle thread, possibly alongside others."""
+    try:
+        # Instances with a fresh result this cycle; the others' entries are from earlier cycles
+        probed = set()
+
+        def publish(index, instance, result):
+            status, active_world, background_url = result
+            probed.add(instance['name'])
+            poll_scheduler.record(instance['name'], status)
+            metrics.probe_outcomes.inc(instance=instance['name'], status=status)
+            players, max_players = parse_players((active_world or {}).get('players'))
+            world_store.record_observation(instance['name'], status, (active_world or {}).get('name'),
+                                           players, max_players)
+            player_history.record(instance['name'], status, players, max_players)
+            refresh_jobs.complete(instance['name'], status, cycle_started)
+            share_probe_result(instance['name'], status, players, max_players, cycle_started)
+            publish_instance_entry(build_instance_data(instance, status, active_world, background_url))
 
-    # Update world history based on current instance states
-    update_world_statuses(instances)
+        with tracer.cycle(due=len(due), configured=configured_count) as cycle_span:
+            summary = refresh_engine.run(due, publish)
+            cycle_span.set(completed=summary['completed'], failed=summary['failed'],
+                           timed_out=summary['timed_out'], skipped=summary['skipped'])
+            metrics.cycle_duration.observe(summary['duration'])
+            for outcome in ('failed', 'timed_out'):
+                status = 'failed' if outcome == 'failed' else 'timeout'
+                for name in summary[outcome]:
+                    poll_scheduler.record(name, None)
+                    metrics.probe_outcomes.inc(instance=name, status=status)
+                    refresh_jobs.complete(name, status, cycle_started)
+                    share_probe_result(name, status, None, None, cycle_started)
+            for name in summary['skipped']:
+                metrics.probes_skipped.inc(instance=name)
+            update_worlds(probed)
+    except Exception as e:
+        log.error("Refresh cycle failed: %s", e)
+        return
 
-    print("Instance statuses updated.")
+    if summary['timed_out']:
+        log.warning("Cycle deadline hit", extra={'fields': {'timed_out': summary['timed_out']}})
+    if summary['skipped']:
+        # Expected while an earlier cycle's slow probe is still running
+        log.debug("Skipped instances still being probed", extra={'fields': {'still_probing': summary['skipped']}})
+    pool_stats = driver_pool.stats()
+    log.info("Probed %d of %d instances in %.1fs", len(due), configured_count, summary['duration'],
+             extra={'fields': {'drivers_started': pool_stats['started'], 'drivers_reused': pool_stats['reused'],
+                               'drivers_recycled': pool_stats['recycled'],
+                               'drivers_crashed': pool_stats['crashed']}})
 
 # --- Authentication Decorators ---
 
@@ -316,7 +606,7 @@ def admin_required(f):
 def viewer_auth_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        config = load_config()
+        config = get_config()
         # If viewer password is set and user is not logged in as viewer or admin
         if config.get('viewer_password_hash') and not (session.get('viewer_logged_in') or session.get('admin_logged_in')):
              # For API calls, return 401. For page loads, we might handle differently in frontend, 
@@ -326,29 +616,171 @@ def viewer_auth_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def is_viewer_locked(config):
+    """True if a viewer password is set and this session hasn't logged in."""
+    if config.get('admin_password_hash') and config.get('viewer_password_hash'):
+        return not (session.get('viewer_logged_in') or session.get('admin_logged_in'))
+    return False
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    global first_response_seconds
+    started = g.pop('request_started', None)
+    if first_response_seconds is None:
+        first_response_seconds = time.monotonic() - IMPORT_STARTED
+        log.info("First response %.0f ms after startup", first_response_seconds * 1000)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.request_duration.observe(time.perf_counter() - started, route=route,
+                                         method=request.method, status=response.status_code)
+    return response
+
+def collect_driver_pool_metrics():
+    stats = driver_pool.stats()
+    lines = ['# HELP portal_driver_pool_events_total Chrome sessions started, reused, recycled and crashed.',
+             '# TYPE portal_driver_pool_events_total counter']
+    for event in ('started', 'reused', 'recycled', 'crashed'):
+        lines.append(f'portal_driver_pool_events_total{{event="{event}"}} {stats[event]}')
+    lines += ['# HELP portal_driver_pool_sessions Chrome sessions currently idle or in use.',
+              '# TYPE portal_driver_pool_sessions gauge',
+              f'portal_driver_pool_sessions{{state="idle"}} {stats["idle"]}',
+              f'portal_driver_pool_sessions{{state="in_use"}} {stats["in_use"]}']
+    return lines
+
+metrics.registry.register_collector(collect_driver_pool_metrics)
+metrics.registry.register_collector(lambda: [
+    '# HELP portal_startup_seconds Time from loading app.py until the app was ready and until its first response.',
+    '# TYPE portal_startup_seconds gauge'] + [
+    f'portal_startup_seconds{{phase="{phase}"}} {value}'
+    for phase, value in (('ready', startup_seconds), ('first_response', first_response_seconds))
+    if value is not None])
+metrics.registry.register_collector(lambda: [
+    '# HELP portal_player_history_bytes Memory held by the in-memory player count history.',
+    '# TYPE portal_player_history_bytes gauge',
+    f'portal_player_history_bytes {player_history.nbytes()}'])
+metrics.registry.register_collector(lambda: [
+    '# HELP portal_http_connection_reuse_ratio Share of requests to an origin sent on an already open connection.',
+    '# TYPE portal_http_connection_reuse_ratio gauge'] + [
+    f'portal_http_connection_reuse_ratio{{origin="{origin}"}} {stats["reuse_ratio"]}'
+    for origin, stats in probe_http.stats().items() if stats['reuse_ratio'] is not None])
+metrics.registry.register_collector(lambda: [
+    '# HELP portal_login_queued Login attempts waiting for or running a password check.',
+    '# TYPE portal_login_queued gauge',
+    f'portal_login_queued {login_throttle.queued()}'])
+
 # --- Routes ---
 
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus text exposition of probe, cycle, storage and API metrics."""
+    text = metrics.registry.render()
+    if coordinator is not None:
+        # Every running worker's metrics, labelled by process id, whichever worker is asked
+        expositions = {kind.split(':', 1)[1]: data['text']
+                       for kind, data in shared_state.snapshots('metrics:').items()
+                       if time.time() - data['published'] < WORKER_METRICS_MAX_AGE}
+        expositions[str(os.getpid())] = text
+        text = metrics.merge_expositions(expositions)
+    return Response(text, mimetype='text/plain; version=0.0.4')
+
+def with_state_version(response, version):
+    """Tell clients which state version a full response covers, for /api/changes?since=."""
+    response.headers['X-State-Version'] = change_log.token(version)
+    return response
+
 @app.route('/api/instance-status')
 def api_instance_status():
-    return jsonify(instance_data_cache)
+    # Read the version first: a change racing with this request is then resent, never lost
+    version = change_log.version
+    entry = instance_status_response_cache.get(instance_data_version)
+    return with_state_version(cached_response(request, entry), version)
 
 @app.route('/api/worlds')
 def api_worlds():
     """Return all worlds (active and historical) sorted by relevance."""
-    worlds = get_all_worlds_sorted()
-    return jsonify(worlds)
+    version = change_log.version
+    entry = worlds_response_cache.get(world_store.version)
+    return with_state_version(cached_response(request, entry), version)
+
+@app.route('/api/changes')
+def api_changes():
+    """
+    Instance and world entries changed since state version `since`.
+    Clients that are too far behind get `resync: true` and should reload
+    /api/instance-status and /api/worlds.
+    """
+    if is_viewer_locked(get_config()):
+        return jsonify({'error': 'Unauthorized'}), 401
+    changes = change_log.since(request.args.get('since'))
+    if changes['resync']:
+        return jsonify(changes)
+    worlds = changes.pop('worlds', None)
+    if worlds:
+        worlds['changed'] = {key: world_view(dict(world)) for key, world in worlds['changed'].items()}
+    changes['worlds'] = worlds or {'changed': {}, 'removed': []}
+    changes.setdefault('instances', {'changed': {}, 'removed': []})
+    changes['instance_order'] = [instance['name'] for instance in instance_data_cache]
+    return jsonify(changes)
+
+@app.route('/api/events')
+def api_events():
+    """Stream instance status and world list updates as Server-Sent Events."""
+    if is_viewer_locked(get_config()):
+        return jsonify({'error': 'Unauthorized'}), 401
+    if MULTI_WORKER:
+        # Each open stream would hold one of a worker's few threads for as long as the tab is open,
+        # starving every other route; 204 tells EventSource to give up and the page polls /api/changes
+        return '', 204
+
+    # Make sure a fresh client always receives the current state
+    publish_world_changes()
+    event_broker.publish_if_missing(
+        'instances', lambda: instance_status_response_cache.get(instance_data_version).body.decode('utf-8'))
+
+    return Response(stream_with_context(event_broker.stream(request.headers.get('Last-Event-ID'))),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/backgrounds/<key>')
+def world_background(key):
+    """Serve a cached, card-sized world background."""
+    if image_cache.source_for(key) is None:
+        # Registry is filled while building the worlds view
+        worlds_response_cache.get(world_store.version)
+    cached = image_cache.get(key)
+    if cached is None:
+        return jsonify({'error': 'Background not available'}), 404
+    response = send_file(cached.path, mimetype=cached.mimetype, etag=cached.etag,
+                         conditional=True, max_age=BACKGROUND_MAX_AGE)
+    response.cache_control.public = True
+    return response
+
+@app.route('/api/worlds/<path:world_key>/history')
+def world_history(world_key):
+    """Hourly activity and player counts of a world over the last `days` days (default 7)."""
+    if is_viewer_locked(get_config()):
+        return jsonify({'error': 'Unauthorized'}), 401
+    if world_store.get(world_key) is None:
+        return jsonify({'error': 'World not found'}), 404
+    days = request.args.get('days', default=7, type=float)
+    return jsonify(world_store.history(key=world_key, since=time.time() - days * 24 * 3600))
 
 @app.route('/api/worlds/<path:world_key>', methods=['DELETE'])
 @admin_required
 def delete_world(world_key):
     """Delete a single world from history."""
-    worlds_data = load_worlds()
-    worlds = worlds_data.get("worlds", {})
-
-    if world_key in worlds:
-        del worlds[world_key]
-        worlds_data['worlds'] = worlds
-        save_worlds(worlds_data)
+    if is_follower():
+        # Only the leader writes world history
+        if world_store.get(world_key) is None:
+            return jsonify({'success': False, 'error': 'World not found'}), 404
+        shared_state.send_command('delete_world', key=world_key)
+        return jsonify({'success': True})
+    if world_store.delete(world_key):
+        publish_world_changes()
         return jsonify({'success': True})
     else:
         return jsonify({'success': False, 'error': 'World not found'}), 404
@@ -357,26 +789,87 @@ def delete_world(world_key):
 @admin_required
 def clear_worlds():
     """Clear all world history."""
-    worlds_data = {"worlds": {}, "schema_version": 1}
-    save_worlds(worlds_data)
+    if is_follower():
+        shared_state.send_command('clear_worlds')
+        return jsonify({'success': True})
+    save_worlds(empty_worlds_data())
+    publish_world_changes()
     return jsonify({'success': True})
 
+@app.route('/api/instances/<path:name>/refresh', methods=['POST'])
+@admin_required
+def refresh_instance(name):
+    """Probe a single instance on the next scheduler tick instead of waiting for its turn."""
+    if is_follower():
+        if not any(instance['name'] == name for instance in get_config().get('instances', [])):
+            return jsonify({'success': False, 'error': 'Instance not found'}), 404
+        shared_state.send_command('refresh_instance', name=name)
+        return jsonify({'success': True}), 202
+    if not poll_scheduler.request_refresh(name):
+        return jsonify({'success': False, 'error': 'Instance not found'}), 404
+    return jsonify({'success': True}), 202
+
+@app.route('/api/instances/<path:name>/history')
+def instance_history(name):
+    """
+    Player counts and uptime of an instance over `range` (default 1h), in
+    points `step` apart (chosen automatically if omitted). Both accept
+    durations like "90", "15m", "6h" or "7d".
+    """
+    if is_viewer_locked(get_config()):
+        return jsonify({'error': 'Unauthorized'}), 401
+    try:
+        range_seconds = parse_duration(request.args.get('range', '1h'))
+        step = parse_duration(request.args['step']) if 'step' in request.args else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    history = player_history.query(name, range_seconds, step)
+    if history is None:
+        return jsonify({'error': 'No history for this instance'}), 404
+    return jsonify(history)
+
+@app.route('/api/instances/schedule')
+@admin_required
+def instance_schedule():
+    """Current polling interval, backoff and circuit state of each instance."""
+    if is_follower():
+        schedule, age = leader_view('schedule')
+        return jsonify({name: dict(entry, next_probe_in=max(0, round(entry['next_probe_in'] - age, 1)))
+                        for name, entry in (schedule or {}).items()})
+    return jsonify(poll_scheduler.snapshot())
+
+@app.route('/debug/trace')
+@admin_required
+def debug_trace():
+    """Span trees of the most recent refresh cycles (cycle > probe > phase), newest first."""
+    limit = request.args.get('limit', type=int)
+    if is_follower():
+        cycles, _ = leader_view('trace')
+        return jsonify({'cycles': (cycles or [])[:limit]})
+    return jsonify({'cycles': tracer.snapshot(limit)})
+
 @app.route('/api/login', methods=['POST'])
 def login():
     data = request.json
     password = data.get('password')
     role = data.get('role', 'admin') # 'admin' or 'viewer'
-    config = load_config()
-
-    if role == 'admin':
-        if config.get('admin_password_hash') and check_password_hash(config['admin_password_hash'], password):
-            session['admin_logged_in'] = True
-            return jsonify({'success': True})
-    elif role == 'viewer':
-        if config.get('viewer_password_hash') and check_password_hash(config['viewer_password_hash'], password):
-            session['viewer_logged_in'] = True
-            return jsonify({'success': True})
-    
+    config = get_config()
+    login_throttle.configure(config.get('login'))
+
+    password_hash = config.get(f'{role}_password_hash') if role in ('admin', 'viewer') else None
+    try:
+        # Hashing runs on the throttle's small thread pool, never more than it allows at once
+        valid = login_throttle.verify(request.remote_addr or '',
+                                      lambda: bool(password_hash) and check_password_hash(password_hash, password))
+    except LoginRejected as e:
+        response = jsonify({'success': False, 'error': 'Too many login attempts, try again later'})
+        response.headers['Retry-After'] = str(max(1, int(e.retry_after + 0.999)))
+        return response, 503 if e.reason == 'queue_full' else 429
+
+    if valid:
+        session[f'{role}_logged_in'] = True
+        return jsonify({'success': True})
+
     return jsonify({'success': False, 'error': 'Invalid password'}), 401
 
 @app.route('/api/logout', methods=['POST'])
@@ -388,7 +881,7 @@ def logout():
 @admin_required
 def handle_config():
     if request.method == 'GET':
-        config = load_config()
+        config = get_config()
         # Don't send hashes back
         safe_config = {
             'shared_data_mode': config.get('shared_data_mode', False),
@@ -400,6 +893,7 @@ def handle_config():
     if request.method == 'POST':
         new_data = request.json
         config = load_config()
+        previous_instances = {instance['name']: instance for instance in config.get('instances', [])}
         
         # Update fields
         if 'shared_data_mode' in new_data:
@@ -419,14 +913,26 @@ def handle_config():
                 config.pop('viewer_password_hash', None)
 
         save_config(config)
-        # Trigger update immediately
-        update_instance_statuses()
-        return jsonify({'success': True})
+        # Probe only new or changed instances, on the next scheduler tick rather than in this request
+        changed = [instance['name'] for instance in config.get('instances', [])
+                   if previous_instances.get(instance['name']) != instance]
+        job_id = start_refresh_job(changed)
+        return jsonify({'success': True, 'refresh_id': job_id, 'refreshing': changed,
+                        'progress_url': url_for('refresh_progress', job_id=job_id)}), 202
+
+@app.route('/api/refresh/<job_id>')
+@admin_required
+def refresh_progress(job_id):
+    """Per-instance progress of a refresh started by saving the config."""
+    job = refresh_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown refresh job'}), 404
+    return jsonify(job)
 
 @app.route('/api/init', methods=['POST'])
 def init_config():
     """Endpoint for initial setup if no config exists."""
-    if os.path.exists(CONFIG_FILE) and load_config().get('admin_password_hash'):
+    if os.path.exists(CONFIG_FILE) and get_config().get('admin_password_hash'):
          return jsonify({'error': 'Already configured'}), 403
     
     data = request.json
@@ -442,36 +948,230 @@ def init_config():
     save_config(config)
     return jsonify({'success': True})
 
+def render_home(variant):
+    is_admin, is_configured, viewer_locked = variant
+    # Instance and world data are loaded by the page's script, so they are not part of the page
+    return render_template('index.html',
+                           shared_data_mode=get_config().get('shared_data_mode', False),
+                           is_configured=is_configured,
+                           viewer_locked=viewer_locked,
+                           is_admin=is_admin,
+                           event_stream=not MULTI_WORKER)
+
+# Rendered home pages, re-rendered only when the configuration changes
+home_page_cache = CachedPages(render_home)
+
 @app.route('/')
 def home():
-    config = load_config()
+    config = get_config()
     
     # Check if configured
     is_configured = bool(config.get('admin_password_hash'))
-    print(f"DEBUG: home route - is_configured: {is_configured}")
     
     # Check viewer access
-    viewer_locked = False
-    if is_configured and config.get('viewer_password_hash'):
-        if not (session.get('viewer_logged_in') or session.get('admin_logged_in')):
-            viewer_locked = True
-    
-    print(f"DEBUG: home route - viewer_locked: {viewer_locked}")
+    viewer_locked = is_viewer_locked(config)
 
-    return render_template('index.html', 
-                           instances=instance_data_cache, 
-                           shared_data_mode=config.get('shared_data_mode', False),
-                           is_configured=is_configured,
-                           viewer_locked=viewer_locked,
-                           is_admin=session.get('admin_logged_in', False))
+    variant = (bool(session.get('admin_logged_in', False)), is_configured, viewer_locked)
+    entry, hit = home_page_cache.get(config_store.version, variant)
+    metrics.page_cache.inc(result='hit' if hit else 'miss')
+    # The page differs per session, so only the browser may keep it
+    return cached_response(request, entry, mimetype='text/html', cache_control='private, no-cache')
 
 # Initialize the background scheduler
 scheduler = BackgroundScheduler()
-scheduler.add_job(func=update_instance_statuses, trigger="interval", seconds=10)
-scheduler.start()
+# Ticks only claim due instances and hand them to a cycle thread, so they never overlap
+scheduler.add_job(func=update_instance_statuses, trigger="interval", seconds=SCHEDULER_TICK_SECONDS,
+                  id='update_instance_statuses', coalesce=True)
+
+# --- Multi-worker coordination ---
+
+coordinator = None
+# Snapshot sequence numbers and the last probe event a follower has imported
+imported_snapshots = {'instances': None, 'worlds': None, 'epoch': None}
+imported_probe_event = 0
+# Version of the last world snapshot or change a follower applied, and the snapshot it asked to replace
+imported_world_version = None
+requested_world_resync = None
+# Versions of the local state last published by the leader. 'worlds' is how far the change log has
+# been shared; 'world_delta' is the version of the last world snapshot or change in the chain
+# following snapshot 'world_chain'.
+shared_versions = {}
+# Views only the leader can answer (probe schedule, cycle traces), as last published for followers
+shared_views = {}
+# Metrics published by workers that stopped longer ago than this are left out of /metrics
+WORKER_METRICS_MAX_AGE = 10
+
+def is_follower():
+    return coordinator is not None and not coordinator.is_leader
+
+def become_leader():
+    """Take over from a previous leader: pick up its persisted state and start probing."""
+    world_store.reload()
+    # World changes only live in the events, so number from past the last one of those as well
+    stamps = [data['version'] for _, kind, data in shared_state.events_after(0) if kind == 'worlds']
+    change_log.advance_to(max([shared_state.latest_stamp()] + stamps))
+    # Versions handed out before the election may not match this worker's log; make clients resync
+    shared_state.publish('epoch', change_log.version, change_log.new_epoch())
+    scheduler.start()
+
+def run_leader_command(kind, args):
+    if kind == 'delete_world':
+        world_store.delete(args['key'])
+    elif kind == 'clear_worlds':
+        save_worlds(empty_worlds_data())
+    elif kind == 'refresh_instance':
+        poll_scheduler.request_refresh(args['name'])
+    elif kind == 'refresh_instances':
+        refresh_jobs.add(args['id'], args['names'], args['created'])
+        queue_refresh(args['names'])
+    elif kind == 'resync_worlds':
+        # A follower missed changes; send the whole registry again with the next share
+        shared_versions.pop('worlds', None)
+    publish_world_changes()
+
+def share_world_changes():
+    """
+    Publish the world entries changed since the last tick as one event. The
+    full registry is only published after an election, when a follower asks to
+    resync or when the change log no longer reaches back far enough; every
+    snapshot starts a new chain of changes.
+    """
+    changes = change_log.after(shared_versions.get('worlds'))
+    if changes['resync']:
+        # Read the version first: changes racing with the snapshot are sent again with the next event
+        version = change_log.version
+        shared_versions['world_chain'] = shared_state.publish('worlds', version, world_store.snapshot())
+        shared_versions['worlds'] = shared_versions['world_delta'] = version
+        return
+    worlds = changes.get('worlds')
+    if worlds:
+        shared_state.append_event('worlds', dict(worlds, chain=shared_versions['world_chain'],
+                                                 previous=shared_versions['world_delta'],
+                                                 version=changes['version']))
+        shared_versions['world_delta'] = changes['version']
+    shared_versions['worlds'] = changes['version']
+
+def share_leader_state():
+    """Apply followers' commands and publish anything that changed since the last tick."""
+    for kind, args in shared_state.take_commands():
+        run_leader_command(kind, args)
+    with instance_data_lock:
+        stamp = change_log.version
+        instances = instance_data_cache if shared_versions.get('instances') != instance_data_version else None
+        shared_versions['instances'] = instance_data_version
+    if instances is not None:
+        shared_state.publish('instances', stamp, instances)
+    share_world_changes()
+    share_leader_views()
+    share_metrics()
+    shared_state.prune_events()
+
+def share_leader_views():
+    """Publish the probe schedule and cycle traces, which only the leader has, when they change."""
+    for kind, view in (('schedule', poll_scheduler.snapshot()), ('trace', tracer.snapshot())):
+        if shared_views.get(kind) != view:
+            shared_views[kind] = view
+            shared_state.publish(kind, change_log.version, {'published': time.time(), 'view': view})
+
+def leader_view(kind):
+    """(view, seconds since it was published) of a view shared by the leader, or (None, 0)."""
+    published = shared_state.snapshot(kind)
+    if published is None:
+        return None, 0
+    data = published[2]
+    return data['view'], max(0, time.time() - data['published'])
+
+def share_metrics():
+    """Publish this worker's metrics, so /metrics on any worker can report every worker's."""
+    shared_state.publish(f'metrics:{os.getpid()}', change_log.version,
+                         {'published': time.time(), 'text': metrics.registry.render()})
+
+def import_world_snapshot(seq, stamp, worlds):
+    global imported_world_version
+    with change_log.pinned(stamp):
+        world_store.mirror(worlds)
+    imported_snapshots['worlds'] = seq
+    imported_world_version = stamp
+
+def import_world_changes(changes):
+    """Apply one event of world changes, or ask the leader for the full registry if some are missing."""
+    global imported_world_version, requested_world_resync
+    chain = imported_snapshots.get('worlds')
+    if chain is None or changes['chain'] > chain:
+        # Follows a snapshot published after this tick read them
+        snapshot = shared_state.snapshot('worlds')
+        if snapshot is None:
+            return
+        import_world_snapshot(*snapshot)
+        chain = snapshot[0]
+    if changes['chain'] != chain or changes['version'] <= imported_world_version:
+        return
+    if changes['previous'] > imported_world_version:
+        # Events in between were pruned before this worker read them
+        if requested_world_resync != chain:
+            requested_world_resync = chain
+            shared_state.send_command('resync_worlds')
+        return
+    with change_log.pinned(changes['version']):
+        world_store.mirror_changes(changes['changed'], changes['removed'])
+    imported_world_version = changes['version']
+
+def import_leader_state():
+    """Serve the leader's latest snapshots and replay its probe results and world changes locally."""
+    global imported_probe_event
+    changed = shared_state.changed_snapshots(imported_snapshots)
+    if 'instances' in changed:
+        seq, stamp, instances = changed['instances']
+        with change_log.pinned(stamp):
+            publish_instance_data(instances)
+            player_history.sync({instance['name'] for instance in instances})
+        imported_snapshots['instances'] = seq
+    if 'worlds' in changed:
+        import_world_snapshot(*changed['worlds'])
+    if 'epoch' in changed:
+        seq, _, epoch = changed['epoch']
+        change_log.epoch = epoch
+        imported_snapshots['epoch'] = seq
+    config = get_config()
+    # Background images are still fetched on demand here
+    probe_http.configure(config.get('http'), config.get('instances', []))
+    refresh_jobs.sync({instance['name'] for instance in config.get('instances', [])})
+    for event_id, kind, data in shared_state.events_after(imported_probe_event):
+        if kind == 'probe':
+            player_history.record(data['name'], data['status'], data['current'], data['maximum'],
+                                  data['timestamp'])
+            refresh_jobs.complete(data['name'], data['status'], data['started'])
+        elif kind == 'refresh_job':
+            refresh_jobs.add(data['id'], data['names'], data['created'])
+        elif kind == 'worlds':
+            import_world_changes(data)
+        imported_probe_event = event_id
+    publish_world_changes()
+    share_metrics()
+
+# Serve the last known statuses right away; a follower replaces them with the leader's
+initialize_instance_data()
+
+if MULTI_WORKER:
+    coordinator = Coordinator(LeaderLock(LEADER_LOCK_FILE), become_leader, share_leader_state,
+                              import_leader_state)
+    coordinator.start()
+else:
+    scheduler.start()
+
+# Exit handlers run in reverse order: stop the scheduler first, flush world history last
+atexit.register(world_store.flush)
+atexit.register(lambda: not is_follower() and save_instance_snapshot())
+atexit.register(lambda: background_fetcher.shutdown(wait=False))
+atexit.register(driver_pool.close)
+atexit.register(probe_http.clear)
+atexit.register(refresh_engine.shutdown)
+atexit.register(lambda: cycle_runner.shutdown(wait=False))
+atexit.register(login_throttle.shutdown)
+atexit.register(lambda: scheduler.running and scheduler.shutdown())
 
-atexit.register(lambda: scheduler.shutdown())
+startup_seconds = time.monotonic() - IMPORT_STARTED
+log.info("Started in %.0f ms", startup_seconds * 1000)
 
 if __name__ == '__main__':
-    initialize_instance_data()
     app.run(host='0.0.0.0', port=5000)
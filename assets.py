@@ -0,0 +1,352 @@
+"""
+Static asset pipeline.
+
+`python assets.py` builds ``static/dist/``:
+
+- Font Awesome CSS is cut down to the icon families and icons the page
+  actually uses (found in ``templates/`` and ``static/js/``), and the matching
+  webfonts are subset to just those glyphs.
+- Bundled text fonts referenced by ``css/styles.css`` are subset to Latin
+  text, with a matching ``unicode-range`` so other scripts fall back cleanly.
+- Fonts are emitted as WOFF2 only (WOFF if Brotli isn't installed); the
+  EOT/SVG/TTF/WOFF variants are not shipped.
+- Every output gets a content-hashed filename, and text assets get
+  precompressed ``.gz`` and ``.br`` siblings.
+- ``manifest.json`` maps original names (``css/styles.css``) to hashed ones.
+
+At runtime `init_app` makes ``url_for('static', filename=...)`` resolve to the
+hashed file when a build exists and serves ``/static/dist/`` with
+``Cache-Control: immutable``, picking a precompressed variant the client
+accepts. Without a build, static files are served as before.
+
+Building needs fontTools (and Brotli for WOFF2 and ``.br`` files); serving
+does not.
+"""
+import gzip
+import hashlib
+import io
+import json
+import logging
+import mimetypes
+import os
+import re
+import shutil
+import sys
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - Brotli is only needed to build
+    brotli = None
+
+log = logging.getLogger('portal.assets')
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(ROOT_DIR, 'static')
+TEMPLATES_DIR = os.path.join(ROOT_DIR, 'templates')
+DIST_SUBDIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+STATIC_URL = '/static'
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+FONT_AWESOME_CSS = 'fontawesome-css/all.css'
+# The page links the minified file; the build replaces it with the subset
+FONT_AWESOME_LOGICAL = 'fontawesome-css/all.min.css'
+STYLESHEET = 'css/styles.css'
+SCRIPTS = ('js/main.js',)
+IMAGE_DIR = 'images'
+FAMILY_CLASSES = {'fa': 'solid', 'fas': 'solid', 'far': 'regular', 'fal': 'light', 'fad': 'duotone',
+                  'fab': 'brands'}
+FAMILY_FONTS = {'Font Awesome 5 Pro': None, 'Font Awesome 5 Brands': 'brands',
+                'Font Awesome 5 Duotone': 'duotone'}
+# Latin text, Latin-1 supplement and common punctuation, currency and symbols
+TEXT_UNICODE_RANGE = 'U+0020-007E, U+00A0-00FF, U+0131, U+0152-0153, U+02C6, U+02DA, U+02DC, ' \
+                     'U+2000-206F, U+20AC, U+2122, U+2191, U+2193, U+2212, U+2215, U+FEFF, U+FFFD'
+COMPRESSIBLE = ('.css', '.js', '.json', '.svg', '.txt')
+
+ICON_CLASS = re.compile(r'\bfa-([a-z0-9-]+)')
+FAMILY_CLASS = re.compile(r'(?<![\w-])(fa[srldb]?)(?![\w-])')
+SELECTOR_FAMILY = re.compile(r'\.(fa[srldb]?)(?![\w-])')
+SELECTOR_ICON = re.compile(r'\.fa-([a-z0-9-]+)')
+ICON_CONTENT = re.compile(r'content:\s*"\\([0-9a-f]+)"')
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+
+
+# --- Build ---
+
+def css_blocks(css):
+    """Top-level (prelude, body) pairs of a stylesheet; nested blocks stay in the body."""
+    blocks = []
+    depth = 0
+    start = 0
+    prelude = None
+    for index, char in enumerate(css):
+        if char == '{':
+            if depth == 0:
+                prelude = css[start:index].strip()
+                start = index + 1
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                blocks.append((prelude, css[start:index].strip()))
+                start = index + 1
+    return blocks
+
+
+def minify_css(css):
+    css = CSS_COMMENT.sub('', css)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};:,>])\s*', r'\1', css)
+    return css.replace(';}', '}').strip()
+
+
+def used_classes():
+    """Font Awesome family classes and icon names used by the templates and scripts."""
+    families, icons = set(), set()
+    sources = [os.path.join(TEMPLATES_DIR, name) for name in os.listdir(TEMPLATES_DIR)]
+    sources += [os.path.join(STATIC_DIR, name) for name in SCRIPTS]
+    for path in sources:
+        with open(path, encoding='utf-8') as file:
+            text = file.read()
+        families.update(FAMILY_CLASS.findall(text))
+        icons.update(ICON_CLASS.findall(text))
+    return {FAMILY_CLASSES[family] for family in families}, icons
+
+
+def font_awesome_family(body):
+    """Icon family a @font-face or family rule belongs to, from its font-family/weight."""
+    match = re.search(r'font-family:\s*["\']([^"\']+)["\']', body)
+    if not match or match.group(1) not in FAMILY_FONTS:
+        return None
+    family = FAMILY_FONTS[match.group(1)]
+    if family is None:
+        weight = re.search(r'font-weight:\s*(\d+)', body)
+        family = {'300': 'light', '400': 'regular', '900': 'solid'}.get(weight.group(1) if weight else '')
+    return family
+
+
+class Builder:
+    def __init__(self, static_dir=STATIC_DIR):
+        self.static_dir = static_dir
+        self.dist_dir = os.path.join(static_dir, DIST_SUBDIR)
+        self.manifest = {}
+        self.source_bytes = 0
+        self.output_bytes = 0
+        # Font Awesome icons kept by the subsetter, for the build summary
+        self.icon_count = 0
+
+    def emit(self, logical_name, data, ext=None, source_bytes=0):
+        """Write `data` under a content-hashed name and record it in the manifest."""
+        stem, original_ext = os.path.splitext(logical_name)
+        ext = ext or original_ext
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        hashed = f'{stem}.{digest}{ext}'
+        path = os.path.join(self.dist_dir, hashed)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(data)
+        if ext in COMPRESSIBLE:
+            with open(path + '.gz', 'wb') as file:
+                file.write(gzip.compress(data, 9))
+            if brotli is not None:
+                with open(path + '.br', 'wb') as file:
+                    file.write(brotli.compress(data))
+        self.manifest[logical_name] = hashed
+        self.source_bytes += source_bytes
+        self.output_bytes += len(data)
+        return f'{STATIC_URL}/{DIST_SUBDIR}/{hashed}'
+
+    def subset_font(self, logical_name, source_path, unicodes):
+        """Subset a font to `unicodes`, emit it as WOFF2 (or WOFF) and return its URL."""
+        from fontTools import subset
+        from fontTools.ttLib import TTFont
+
+        # fontTools reports every table it drops
+        logging.getLogger('fontTools').setLevel(logging.ERROR)
+
+        options = subset.Options()
+        options.flavor = 'woff2' if brotli is not None else 'woff'
+        options.layout_features = ['*']
+        options.name_IDs = ['*']
+        options.notdef_outline = True
+        font = TTFont(source_path)
+        subsetter = subset.Subsetter(options)
+        subsetter.populate(unicodes=unicodes)
+        subsetter.subset(font)
+        font.flavor = options.flavor
+        output = io.BytesIO()
+        font.save(output)
+        return self.emit(logical_name, output.getvalue(), '.' + options.flavor,
+                         source_bytes=os.path.getsize(source_path))
+
+    def build_font_awesome(self):
+        families, icons = used_classes()
+        source = os.path.join(self.static_dir, FONT_AWESOME_CSS)
+        with open(source, encoding='utf-8') as file:
+            css = file.read()
+        license_comment = CSS_COMMENT.match(css.lstrip())
+        rules = []
+        font_faces = []
+        codepoints = {}
+
+        for prelude, body in css_blocks(CSS_COMMENT.sub('', css)):
+            if prelude == '@font-face':
+                family = font_awesome_family(body)
+                if family in families:
+                    font_faces.append((family, body))
+                continue
+            if prelude.startswith('@'):
+                rules.append(f'{prelude}{{{body}}}')
+                continue
+            family = font_awesome_family(body)
+            if family is not None and family not in families:
+                continue
+
+            selectors = []
+            for selector in prelude.split(','):
+                selector = selector.strip()
+                if any(FAMILY_CLASSES[name] not in families for name in SELECTOR_FAMILY.findall(selector)):
+                    continue
+                content = ICON_CONTENT.search(body)
+                if content and not set(SELECTOR_ICON.findall(selector)) <= icons:
+                    continue
+                selectors.append(selector)
+                if content:
+                    codepoint = int(content.group(1), 16)
+                    for name in SELECTOR_FAMILY.findall(selector) or ['fa']:
+                        codepoints.setdefault(FAMILY_CLASSES[name], set()).add(codepoint)
+            if selectors:
+                rules.append(f'{",".join(selectors)}{{{body}}}')
+
+        faces = []
+        for family, body in font_faces:
+            urls = [url for _, url in CSS_URL.findall(body)]
+            ttf = next(url for url in urls if url.endswith('.ttf'))
+            source_path = os.path.normpath(os.path.join(os.path.dirname(source), ttf))
+            logical = os.path.relpath(source_path, self.static_dir).replace(os.sep, '/')
+            url = self.subset_font(logical, source_path, sorted(codepoints.get(family, ())))
+            body = re.sub(r'src:[^;]+;\s*', '', body).strip().rstrip(';')
+            fmt = 'woff2' if url.endswith('.woff2') else 'woff'
+            faces.append(f'@font-face{{{body};src:url("{url}") format("{fmt}")}}')
+
+        header = license_comment.group(0) + '\n' if license_comment else ''
+        output = header + minify_css('\n'.join(faces + rules))
+        self.emit(FONT_AWESOME_LOGICAL, output.encode('utf-8'),
+                  source_bytes=os.path.getsize(os.path.join(self.static_dir, FONT_AWESOME_LOGICAL)))
+        self.icon_count = sum(len(points) for points in codepoints.values())
+
+    def build_stylesheet(self):
+        """Subset the stylesheet's own fonts and point its URLs at hashed files."""
+        source = os.path.join(self.static_dir, STYLESHEET)
+        with open(source, encoding='utf-8') as file:
+            css = file.read()
+
+        def rewrite_font_face(match):
+            body = match.group(1)
+            url = CSS_URL.search(body).group(2)
+            source_path = os.path.join(self.static_dir, url[len(STATIC_URL) + 1:])
+            logical = url[len(STATIC_URL) + 1:]
+            hashed = self.subset_font(logical, source_path, self.text_unicodes())
+            fmt = 'woff2' if hashed.endswith('.woff2') else 'woff'
+            body = re.sub(r'src:[^;]+;', f'src: url("{hashed}") format("{fmt}");', body)
+            return f'@font-face {{{body}    unicode-range: {TEXT_UNICODE_RANGE};\n}}'
+
+        css = re.sub(r'@font-face\s*\{([^}]*)\}', rewrite_font_face, css)
+
+        def rewrite_url(match):
+            url = match.group(2)
+            logical = url[len(STATIC_URL) + 1:]
+            if url.startswith(STATIC_URL + '/') and logical in self.manifest:
+                return f"url('{STATIC_URL}/{DIST_SUBDIR}/{self.manifest[logical]}')"
+            return match.group(0)
+
+        css = CSS_URL.sub(rewrite_url, css)
+        self.emit(STYLESHEET, minify_css(css).encode('utf-8'), source_bytes=os.path.getsize(source))
+
+    @staticmethod
+    def text_unicodes():
+        unicodes = []
+        for part in TEXT_UNICODE_RANGE.split(','):
+            bounds = part.strip()[2:].split('-')
+            first = int(bounds[0], 16)
+            last = int(bounds[-1], 16)
+            unicodes.extend(range(first, last + 1))
+        return unicodes
+
+    def copy(self, logical_name):
+        with open(os.path.join(self.static_dir, logical_name), 'rb') as file:
+            data = file.read()
+        self.emit(logical_name, data, source_bytes=len(data))
+
+    def build(self):
+        shutil.rmtree(self.dist_dir, ignore_errors=True)
+        os.makedirs(self.dist_dir)
+        # Images first so the stylesheet can refer to their hashed names
+        for name in sorted(os.listdir(os.path.join(self.static_dir, IMAGE_DIR))):
+            self.copy(f'{IMAGE_DIR}/{name}')
+        self.build_font_awesome()
+        self.build_stylesheet()
+        for name in SCRIPTS:
+            self.copy(name)
+        with open(os.path.join(self.dist_dir, MANIFEST_NAME), 'w') as file:
+            json.dump(self.manifest, file, indent=2, sort_keys=True)
+        print(f"Built {len(self.manifest)} assets in {self.dist_dir}: "
+              f"{self.output_bytes // 1024} KB (from {self.source_bytes // 1024} KB), "
+              f"{self.icon_count} Font Awesome icons")
+        if brotli is None:
+            print("WARNING: Brotli is not installed; fonts were written as WOFF and no .br files were made")
+
+
+# --- Serving ---
+
+def load_manifest(static_folder):
+    path = os.path.join(static_folder, DIST_SUBDIR, MANIFEST_NAME)
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (IOError, ValueError):
+        return {}
+
+
+def init_app(app):
+    """Resolve static URLs to built, hashed assets and serve them with long-lived caching."""
+    from flask import request, send_from_directory
+
+    manifest = load_manifest(app.static_folder)
+    if not manifest:
+        log.info("No built assets found (run `python assets.py`); serving static files as-is")
+        return
+    dist_dir = os.path.join(app.static_folder, DIST_SUBDIR)
+
+    @app.url_defaults
+    def hashed_static_url(endpoint, values):
+        if endpoint == 'static' and values.get('filename') in manifest:
+            values['filename'] = f"{DIST_SUBDIR}/{manifest[values['filename']]}"
+
+    def built_asset(filename):
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        served, encoding = filename, None
+        for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if candidate in request.accept_encodings and \
+                    os.path.isfile(os.path.join(dist_dir, filename + suffix)):
+                served, encoding = filename + suffix, candidate
+                break
+        response = send_from_directory(dist_dir, served, mimetype=mimetype, max_age=ASSET_MAX_AGE)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    app.add_url_rule(f'{app.static_url_path}/{DIST_SUBDIR}/<path:filename>', 'built_asset', built_asset)
+    log.info("Serving %d built assets from %s", len(manifest), dist_dir)
+
+
+if __name__ == '__main__':
+    try:
+        import fontTools  # noqa: F401
+    except ImportError:
+        sys.exit("fontTools is required to build assets: pip install fonttools brotli")
+    Builder().build()
@@ -0,0 +1,192 @@
+"""
+Local stand-in for a fleet of Foundry VTT servers, for benchmarking the probes.
+
+Each simulated instance lives under its own path prefix (``/i/<n>``) on one
+threaded HTTP server and serves the pages the portal looks at: the root
+redirect, ``/join``, ``/game``, ``/auth``, ``/setup``, ``/api/status`` and the
+world background image.
+Response latency, failure rate and how long the ``current-players`` element
+takes to appear on the join page are all configurable.
+
+Run it on its own to poke at it from a browser:
+
+    python benchmarks/fake_foundry.py --instances 3 --port 30000
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+INSTANCE_PATH = re.compile(r'^/i/(\d+)(/.*)?$')
+
+JOIN_PAGE = """<!DOCTYPE html>
+<html>
+<head><title>{title}</title></head>
+<body class="vtt players" style="--background-url: url('worlds/{slug}/background.webp')">
+<section id="join-game">
+  <h1>{title}</h1>
+  <div id="players"></div>
+</section>
+<script>
+  setTimeout(function () {{
+    document.getElementById('players').innerHTML =
+      '<div class="current-players">Current Players ' +
+      '<span class="count">{current}</span> / <span class="count">{maximum}</span></div>';
+  }}, {players_delay_ms});
+</script>
+</body>
+</html>
+"""
+
+SETUP_PAGE = """<!DOCTYPE html>
+<html>
+<head><title>Foundry Virtual Tabletop</title></head>
+<body class="vtt setup" style="--background-url: url('ui/denim075.png')"><main id="setup"></main></body>
+</html>
+"""
+
+# 1x1 GIF, enough for the portal's background cache to decode and thumbnail
+BACKGROUND_IMAGE = (b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00'
+                    b'\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;')
+
+
+class Scenario:
+    """What the fake fleet looks like and how badly it behaves."""
+
+    def __init__(self, instances=10, latency_ms=0, failure_rate=0.0, players_delay_ms=0,
+                 active_ratio=0.5, offline_ratio=0.0, seed=1):
+        self.instances = instances
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self.players_delay_ms = players_delay_ms
+        self.random = random.Random(seed)
+        self.states = []
+        for index in range(instances):
+            roll = self.random.random()
+            if roll < offline_ratio:
+                self.states.append('offline')
+            elif roll < offline_ratio + active_ratio:
+                self.states.append('active')
+            else:
+                self.states.append('online')
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def should_fail(self):
+        with self._lock:
+            return self.random.random() < self.failure_rate
+
+
+def make_handler(scenario):
+    class FakeFoundryHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, code, body=b'', content_type='text/html; charset=utf-8', headers=None):
+            self.send_response(code)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            scenario.count_request()
+            match = INSTANCE_PATH.match(self.path)
+            if not match or int(match.group(1)) >= scenario.instances:
+                return self._send(404, b'not found')
+            index = int(match.group(1))
+            route = match.group(2) or '/'
+            base = f'/i/{index}'
+            state = scenario.states[index]
+
+            if scenario.latency_ms:
+                time.sleep(scenario.latency_ms / 1000)
+            if state == 'offline':
+                return self._send(502, b'Bad Gateway')
+            if scenario.should_fail():
+                return self._send(500, b'Internal Server Error')
+
+            if route == '/api/status':
+                status = {'active': state == 'active', 'version': '12.331',
+                          'world': f'world-{index}' if state == 'active' else None,
+                          'system': 'dnd5e' if state == 'active' else None,
+                          'users': index % 5 if state == 'active' else 0, 'uptime': 3600}
+                return self._send(200, json.dumps(status).encode(), 'application/json')
+            if route == '/':
+                target = '/join' if state == 'active' else '/setup'
+                return self._send(302, headers={'Location': base + target})
+            if route == '/join' and state == 'active':
+                page = JOIN_PAGE.format(title=f'Simulated World {index}', slug=f'world-{index}',
+                                        current=index % 5, maximum=6,
+                                        players_delay_ms=scenario.players_delay_ms)
+                return self._send(200, page.encode())
+            if route in ('/join', '/game', '/auth'):
+                return self._send(302, headers={'Location': base + '/setup'})
+            if route.startswith('/worlds/') and route.endswith('/background.webp'):
+                return self._send(200, BACKGROUND_IMAGE, 'image/gif')
+            if route == '/setup':
+                return self._send(200, SETUP_PAGE.encode())
+            return self._send(404, b'not found')
+
+    return FakeFoundryHandler
+
+
+class FakeFoundryServer:
+    """Runs the fake fleet on a background thread."""
+
+    def __init__(self, scenario, host='127.0.0.1', port=0):
+        self.scenario = scenario
+        self.httpd = ThreadingHTTPServer((host, port), make_handler(scenario))
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def instance_urls(self):
+        return [f'{self.base_url}/i/{index}' for index in range(self.scenario.instances)]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--instances', type=int, default=3)
+    parser.add_argument('--port', type=int, default=30000)
+    parser.add_argument('--latency-ms', type=int, default=0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--players-delay-ms', type=int, default=0)
+    args = parser.parse_args()
+
+    scenario = Scenario(args.instances, args.latency_ms, args.failure_rate, args.players_delay_ms)
+    server = FakeFoundryServer(scenario, port=args.port)
+    for url, state in zip(server.instance_urls(), scenario.states):
+        print(f'{state:8} {url}')
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,524 @@
+"""
+HTTP load test for the portal's dashboard routes.
+
+Seeds a scratch portal with a synthetic world history (``--worlds``, e.g.
+1000 10000 100000) and a synthetic instance status cache, without Selenium or
+any Foundry server. The portal runs in a child process. Simulated viewers
+behave like main.js in polling mode:
+
+- Each viewer loads ``/``, then ``/api/instance-status`` and ``/api/worlds``.
+  These requests use keep-alive and ETags, like a browser.
+- Every ``--poll-interval`` seconds it asks ``/api/changes`` for what changed.
+- Every ``--reload-interval`` seconds it reloads the page.
+
+While the viewers run, the server process keeps changing instance statuses
+and player counts every ``--churn-interval`` seconds, the way probe results
+would.
+
+The report covers requests per second, latency percentiles per route, and the
+server's CPU use and RSS. With ``--baseline`` the results are checked against
+stored numbers, and the run exits with status 1 if any check fails:
+
+    python benchmarks/load_bench.py --worlds 1000 10000 100000 --clients 50
+    python benchmarks/load_bench.py --worlds 10000 --baseline benchmarks/baselines/load.json
+    python benchmarks/load_bench.py --worlds 10000 --save-baseline benchmarks/baselines/load.json
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from probe_bench import git_revision, percentile  # noqa: E402
+
+ROUTES = ('/', '/api/instance-status', '/api/worlds', '/api/changes')
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baselines', 'load.json')
+# Latency increases smaller than this never fail a check; timer noise on tiny requests
+LATENCY_SLACK_MS = 5
+
+
+# --- Synthetic portal state (runs in the server process) ---
+
+def synthetic_fleet(worlds, instances, active_ratio, offline_ratio, seed):
+    """
+    Configured instances, their world histories (in the legacy worlds.json
+    layout) and the instance states to publish. The same arguments always
+    give the same fleet.
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    configured = [{'name': f'sim-{index}', 'url': f'http://127.0.0.1:9/i/{index}'} for index in range(instances)]
+    history = {}
+    names = defaultdict(list)
+    for index in range(worlds):
+        instance = configured[index % instances]
+        name = f'World {index}'
+        last_seen = now - timedelta(seconds=rng.randint(60, 365 * 86400))
+        history[f"{instance['name']}::{name}"] = {
+            'name': name,
+            'instance_name': instance['name'],
+            'instance_url': instance['url'],
+            'first_seen': (last_seen - timedelta(days=rng.randint(0, 365))).isoformat() + 'Z',
+            'last_seen': last_seen.isoformat() + 'Z',
+            'status': 'offline',
+            'cached_background_url': f'worlds/world-{index}/background.webp',
+            'times_seen': rng.randint(1, 500),
+        }
+        names[instance['name']].append((name, index))
+
+    states = []
+    for instance in configured:
+        roll = rng.random()
+        status = 'offline' if roll < offline_ratio else 'active' if roll < offline_ratio + active_ratio else 'online'
+        states.append(status)
+    return configured, history, names, states
+
+
+def serve(args):
+    """Seed `args.serve` as a portal directory, then run the portal in it on `args.port`."""
+    import yaml
+    configured, history, names, states = synthetic_fleet(args.world_count, args.instances, args.active_ratio,
+                                                         args.offline_ratio, args.seed)
+    os.chdir(args.serve)
+    with open('config.yaml', 'w') as file:
+        yaml.dump({'admin_password_hash': 'benchmark', 'shared_data_mode': False, 'instances': configured,
+                   'logging': {'level': 'WARNING'}}, file)
+    with open('worlds.json', 'w') as file:
+        json.dump({'worlds': history, 'schema_version': 1}, file)
+
+    # stdout is kept for the ready line; the portal's own log output goes to stderr
+    ready = os.fdopen(os.dup(sys.stdout.fileno()), 'w')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    seed_started = time.perf_counter()
+    import app
+    app.scheduler.pause()
+    # Normally applied by the (paused) refresh cycle
+    app.logs.configure(app.get_config().get('logging'))
+    rng = random.Random(args.seed)
+
+    def instance_state(index, status):
+        instance = configured[index]
+        active_world = None
+        if status == 'active' and names[instance['name']]:
+            world_name, world_index = rng.choice(names[instance['name']])
+            # Same background as the seeded history, so no image fetches are triggered
+            active_world = {'name': world_name, 'players': f'{rng.randint(0, 6)} / 6',
+                            'background': f'worlds/world-{world_index}/background.webp'}
+        return app.build_instance_data(instance, status, active_world)
+
+    def publish(instances, probed=None):
+        app.publish_instance_data(list(instances))
+        app.update_world_statuses(instances, probed)
+        app.publish_world_changes()
+
+    instances = [instance_state(index, status) for index, status in enumerate(states)]
+    publish(instances)
+    app.get_all_worlds_sorted()
+    seed_seconds = time.perf_counter() - seed_started
+
+    def churn():
+        # Probe results trickling in: player counts move, worlds start and stop
+        while True:
+            time.sleep(args.churn_interval)
+            index = rng.randrange(len(instances))
+            current = instances[index]['status']
+            status = rng.choice(['active', 'online']) if current != 'offline' else current
+            instances[index] = instance_state(index, status)
+            publish(instances, {instances[index]['name']})
+
+    if args.churn_interval > 0:
+        threading.Thread(target=churn, daemon=True, name='churn').start()
+
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class KeepAliveHandler(WSGIRequestHandler):
+        # Browsers (and gunicorn in production) keep connections open
+        protocol_version = 'HTTP/1.1'
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', args.port, app.app, threaded=True, request_handler=KeepAliveHandler)
+    print(json.dumps({'ready': True, 'seed_seconds': round(seed_seconds, 3)}), file=ready, flush=True)
+    server.serve_forever()
+
+
+# --- Server process and resource sampling ---
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def process_usage(pid):
+    """(CPU seconds, RSS in MB) of a process, from /proc."""
+    try:
+        with open(f'/proc/{pid}/stat') as stat_file:
+            fields = stat_file.read().rsplit(')', 1)[1].split()
+        with open(f'/proc/{pid}/status') as status_file:
+            status = dict(line.split(':', 1) for line in status_file if ':' in line)
+    except (IOError, OSError):
+        return None, None
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    return cpu, int(status.get('VmRSS', '0 kB').split()[0]) / 1024
+
+
+class ServerSampler:
+    """Samples the server's RSS while the load runs and its CPU time over the run."""
+
+    def __init__(self, pid, interval=0.2):
+        self.pid = pid
+        self.interval = interval
+        self.peak_rss_mb = 0
+        self.cpu_seconds = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        cpu, rss = process_usage(self.pid)
+        if rss is not None:
+            self.peak_rss_mb = max(self.peak_rss_mb, rss)
+        return cpu
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._started_cpu = self._sample()
+        self._started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        cpu = self._sample()
+        self.elapsed = time.perf_counter() - self._started
+        if cpu is not None and self._started_cpu is not None:
+            self.cpu_seconds = cpu - self._started_cpu
+
+
+def start_server(worlds, args):
+    workdir = tempfile.mkdtemp(prefix='portal-load-')
+    port = free_port()
+    command = [sys.executable, os.path.abspath(__file__), '--serve', workdir, '--port', str(port),
+               '--world-count', str(worlds), '--instances', str(args.instances),
+               '--active-ratio', str(args.active_ratio), '--offline-ratio', str(args.offline_ratio),
+               '--churn-interval', str(args.churn_interval), '--seed', str(args.seed)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    # The server prints one line once the synthetic state is loaded
+    line = process.stdout.readline()
+    if not line:
+        raise RuntimeError(f'portal server exited with status {process.wait()}')
+    return process, port, json.loads(line)
+
+
+# --- Simulated viewers ---
+
+class Viewer:
+    """One dashboard tab in polling mode, as main.js drives it."""
+
+    def __init__(self, port, results, args, rng):
+        self.connection = http.client.HTTPConnection('127.0.0.1', port, timeout=args.timeout)
+        self.results = results
+        self.args = args
+        self.rng = rng
+        self.etags = {}
+        self.version = None
+
+    def get(self, path):
+        route = path.split('?', 1)[0]
+        headers = {'Accept-Encoding': 'gzip'}
+        if route in self.etags:
+            headers['If-None-Match'] = self.etags[route]
+        started = time.perf_counter()
+        try:
+            self.connection.request('GET', path, headers=headers)
+            response = self.connection.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            self.connection.close()
+            self.results.record(route, None, time.perf_counter() - started, 0, error=type(e).__name__)
+            return None, None
+        self.results.record(route, response.status, time.perf_counter() - started, len(body))
+        if response.getheader('ETag'):
+            self.etags[route] = response.getheader('ETag')
+        return response, body
+
+    def resync(self):
+        versions = []
+        for path in ('/api/instance-status', '/api/worlds'):
+            response, _ = self.get(path)
+            if response is None or response.status >= 400:
+                self.version = None
+                return
+            versions.append((response.getheader('X-State-Version') or '').partition(':'))
+        epochs = {epoch for epoch, _, _ in versions}
+        if len(epochs) != 1 or not all(number.isdigit() for _, _, number in versions):
+            self.version = None
+            return
+        self.version = f'{epochs.pop()}:{min(int(number) for _, _, number in versions)}'
+
+    def load_page(self):
+        self.get('/')
+        self.resync()
+
+    def poll(self):
+        if self.version is None:
+            return self.resync()
+        response, body = self.get(f'/api/changes?since={self.version}')
+        if response is None or response.status != 200:
+            return
+        changes = json.loads(body)
+        if changes.get('resync'):
+            return self.resync()
+        self.version = changes['version']
+
+    def run(self, stop_at):
+        # Viewers arrive spread over the first poll interval rather than all at once
+        time.sleep(self.rng.uniform(0, min(self.args.poll_interval, 5)))
+        next_reload = time.monotonic() + self.args.reload_interval
+        self.load_page()
+        while True:
+            delay = self.args.poll_interval * self.rng.uniform(0.9, 1.1)
+            if time.monotonic() + delay >= stop_at:
+                break
+            time.sleep(delay)
+            if time.monotonic() >= next_reload:
+                next_reload = time.monotonic() + self.args.reload_interval
+                self.load_page()
+            else:
+                self.poll()
+        self.connection.close()
+
+
+class Results:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.bytes = Counter()
+        self.errors = Counter()
+
+    def record(self, route, status, seconds, size, error=None):
+        with self._lock:
+            self.latencies[route].append(seconds)
+            self.bytes[route] += size
+            if error:
+                self.errors[error] += 1
+                self.statuses[route]['error'] += 1
+            else:
+                self.statuses[route][str(status)] += 1
+                if status >= 500:
+                    self.errors[f'http_{status}'] += 1
+
+
+def run_scenario(worlds, args):
+    process, port, ready = start_server(worlds, args)
+    results = Results()
+    try:
+        _, idle_rss_mb = process_usage(process.pid)
+        stop_at = time.monotonic() + args.duration
+        threads = [threading.Thread(target=Viewer(port, results, args, random.Random(args.seed + index)).run,
+                                    args=(stop_at,), daemon=True)
+                   for index in range(args.clients)]
+        with ServerSampler(process.pid) as sampler:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+    finally:
+        process.terminate()
+        process.wait()
+
+    total = sum(len(latencies) for latencies in results.latencies.values())
+    routes = {}
+    for route in ROUTES:
+        latencies = results.latencies.get(route, [])
+        routes[route] = {
+            'requests': len(latencies),
+            'statuses': dict(results.statuses.get(route, {})),
+            'mean_bytes': round(results.bytes[route] / len(latencies)) if latencies else None,
+            'latency_ms': {
+                'p50': milliseconds(percentile(latencies, 0.50)),
+                'p95': milliseconds(percentile(latencies, 0.95)),
+                'p99': milliseconds(percentile(latencies, 0.99)),
+                'max': milliseconds(max(latencies) if latencies else None),
+            },
+        }
+    return {
+        'worlds': worlds,
+        'requests': total,
+        'errors': dict(results.errors),
+        'requests_per_second': round(total / sampler.elapsed, 2) if sampler.elapsed else None,
+        'routes': routes,
+        'server': {
+            'seed_seconds': ready['seed_seconds'],
+            'idle_rss_mb': round(idle_rss_mb or 0, 1),
+            'peak_rss_mb': round(sampler.peak_rss_mb, 1),
+            'cpu_percent': round(100 * sampler.cpu_seconds / sampler.elapsed, 1)
+            if sampler.cpu_seconds is not None else None,
+        },
+    }
+
+
+def milliseconds(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+# --- Baselines ---
+
+def baseline_entry(scenario, args):
+    """What a scenario's results are checked against in later runs."""
+    return {
+        'parameters': comparable_parameters(args),
+        'requests_per_second': scenario['requests_per_second'],
+        'p95_ms': {route: stats['latency_ms']['p95'] for route, stats in scenario['routes'].items()
+                   if stats['latency_ms']['p95'] is not None},
+        'peak_rss_mb': scenario['server']['peak_rss_mb'],
+        'cpu_percent': scenario['server']['cpu_percent'],
+    }
+
+
+def comparable_parameters(args):
+    return {name: getattr(args, name) for name in ('clients', 'duration', 'instances', 'poll_interval',
+                                                  'reload_interval', 'churn_interval')}
+
+
+def check_scenario(scenario, baseline, args):
+    """Failed checks (as strings) for one scenario against its stored baseline."""
+    tolerance = args.tolerance
+    failures = []
+    if scenario['errors']:
+        failures.append(f"errors: {scenario['errors']}")
+    for route, expected in baseline.get('p95_ms', {}).items():
+        actual = scenario['routes'].get(route, {}).get('latency_ms', {}).get('p95')
+        limit = max(expected * (1 + tolerance), expected + LATENCY_SLACK_MS)
+        if actual is not None and actual > limit:
+            failures.append(f'{route} p95 {actual} ms > {limit:.2f} ms')
+    expected = baseline.get('requests_per_second')
+    if expected and scenario['requests_per_second'] < expected * (1 - tolerance):
+        failures.append(f"{scenario['requests_per_second']} requests/s < {expected * (1 - tolerance):.2f}")
+    for key, unit in (('peak_rss_mb', 'MB'), ('cpu_percent', '% CPU')):
+        expected = baseline.get(key)
+        actual = scenario['server'][key]
+        if expected and actual is not None and actual > expected * (1 + tolerance):
+            failures.append(f'server {key} {actual} {unit} > {expected * (1 + tolerance):.1f}')
+    return failures
+
+
+def load_baselines(path):
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--worlds', type=int, nargs='+', default=[1000],
+                        help='world history sizes to test, one server per size')
+    parser.add_argument('--instances', type=int, default=20, help='number of configured instances')
+    parser.add_argument('--clients', type=int, default=50, help='concurrent simulated viewers')
+    parser.add_argument('--duration', type=float, default=30, help='seconds of load per world history size')
+    parser.add_argument('--poll-interval', type=float, default=5,
+                        help='seconds between /api/changes polls per viewer (main.js uses 5)')
+    parser.add_argument('--reload-interval', type=float, default=60, help='seconds between page reloads per viewer')
+    parser.add_argument('--churn-interval', type=float, default=1,
+                        help='seconds between simulated probe results on the server (0 for none)')
+    parser.add_argument('--active-ratio', type=float, default=0.4)
+    parser.add_argument('--offline-ratio', type=float, default=0.2)
+    parser.add_argument('--timeout', type=float, default=30, help='per-request timeout in seconds')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--baseline', nargs='?', const=DEFAULT_BASELINE,
+                        help='fail if results regress against this baseline file')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='allowed regression against the baseline, as a fraction')
+    parser.add_argument('--save-baseline', nargs='?', const=DEFAULT_BASELINE,
+                        help='store these results as the baseline for their world history sizes')
+    parser.add_argument('--output', help='also write the JSON result to this file')
+    # Internal: run the seeded portal server (started by the benchmark itself)
+    parser.add_argument('--serve', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--world-count', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    baselines = load_baselines(args.baseline)
+    # Numbers measured under a different load say nothing about a regression
+    for worlds in args.worlds:
+        baseline = baselines.get('scenarios', {}).get(str(worlds))
+        if baseline is not None and baseline.get('parameters') != comparable_parameters(args):
+            parser.error(f'baseline for {worlds} worlds in {args.baseline} was recorded with '
+                         f'{baseline.get("parameters")}; rerun with those parameters or without --baseline')
+
+    scenarios = []
+    failures = {}
+    for worlds in args.worlds:
+        print(f'{worlds} worlds, {args.clients} viewers, {args.duration:g}s ...', file=sys.stderr)
+        scenario = run_scenario(worlds, args)
+        scenarios.append(scenario)
+        baseline = baselines.get('scenarios', {}).get(str(worlds))
+        if args.baseline and baseline is None:
+            print(f'no baseline for {worlds} worlds in {args.baseline}', file=sys.stderr)
+        elif baseline is not None:
+            scenario_failures = check_scenario(scenario, baseline, args)
+            if scenario_failures:
+                failures[str(worlds)] = scenario_failures
+
+    result = {
+        'benchmark': 'load',
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'git_revision': git_revision(),
+        'parameters': {name: value for name, value in vars(args).items()
+                       if name not in ('serve', 'port', 'world_count')},
+        'results': scenarios,
+    }
+    if args.baseline:
+        result['regressions'] = failures
+
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+
+    if args.save_baseline:
+        stored = load_baselines(args.save_baseline)
+        stored.setdefault('scenarios', {})
+        stored['git_revision'] = result['git_revision']
+        for scenario in scenarios:
+            stored['scenarios'][str(scenario['worlds'])] = baseline_entry(scenario, args)
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, 'w') as file:
+            json.dump(stored, file, indent=2, sort_keys=True)
+            file.write('\n')
+
+    for worlds, scenario_failures in failures.items():
+        for failure in scenario_failures:
+            print(f'REGRESSION ({worlds} worlds): {failure}', file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+"""
+Offline benchmark for the instance status probes.
+
+Starts a local fake Foundry fleet (see fake_foundry.py), points the portal's
+probes at it and reports throughput, latency percentiles, peak memory and the
+number of Chrome processes. Nothing touches a real Foundry server or the
+portal's own config.yaml or world history; the portal runs in a scratch directory.
+
+    python benchmarks/probe_bench.py --instances 20 --mode http --rounds 5
+    python benchmarks/probe_bench.py --target cycle --mode browser --output before.json
+
+Results are printed as JSON (and written to --output) so runs can be compared
+across changes.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from fake_foundry import FakeFoundryServer, Scenario  # noqa: E402
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def process_tree(root_pid):
+    """(pid, command name, rss_kb) for a process and all of its descendants, from /proc."""
+    if not os.path.isdir('/proc'):
+        return []
+    info = {}
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/status') as status_file:
+                fields = dict(line.split(':', 1) for line in status_file if ':' in line)
+        except (IOError, OSError):
+            continue
+        pid = int(entry)
+        rss_kb = int(fields.get('VmRSS', '0 kB').split()[0])
+        info[pid] = (fields.get('Name', '').strip(), rss_kb)
+        children.setdefault(int(fields.get('PPid', '0')), []).append(pid)
+
+    tree = []
+    pending = [root_pid]
+    while pending:
+        pid = pending.pop()
+        if pid in info:
+            tree.append((pid, *info[pid]))
+        pending.extend(children.get(pid, []))
+    return tree
+
+
+class ResourceSampler:
+    """Samples RSS of this process tree and the number of Chrome processes."""
+
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.peak_rss_mb = 0
+        self.peak_chrome_processes = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        tree = process_tree(os.getpid())
+        self.peak_rss_mb = max(self.peak_rss_mb, sum(rss for _, _, rss in tree) / 1024)
+        chrome = sum(1 for _, name, _ in tree if 'chrom' in name.lower())
+        self.peak_chrome_processes = max(self.peak_chrome_processes, chrome)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_portal(workdir, instances, args):
+    """Import app.py inside `workdir` with a generated config and its scheduler paused."""
+    import yaml
+    config = {
+        'admin_password_hash': 'benchmark',
+        'instances': instances,
+        'scraper': {'workers': args.workers, 'pool_size': args.pool_size,
+                    'instance_deadline': args.deadline, 'cycle_deadline': args.cycle_deadline},
+    }
+    with open(os.path.join(workdir, 'config.yaml'), 'w') as file:
+        yaml.dump(config, file)
+    os.chdir(workdir)
+    import app
+    app.scheduler.pause()
+    return app
+
+
+def run_probes(app, instances, rounds, deadline):
+    """Call probe_instance for every instance, one after another, `rounds` times."""
+    latencies = []
+    outcomes = Counter()
+    for _ in range(rounds):
+        for instance in instances:
+            started = time.perf_counter()
+            try:
+                status = app.probe_instance(instance, deadline)[0]
+            except Exception as e:
+                print(f"probe error: {e}", file=sys.stderr)
+                status = 'error'
+            latencies.append(time.perf_counter() - started)
+            outcomes[status] += 1
+    return latencies, outcomes
+
+
+def run_cycles(app, instances, rounds):
+    """Run full update_instance_statuses cycles with every instance due each time."""
+    latencies = []
+    outcomes = Counter()
+    for _ in range(rounds):
+        for instance in instances:
+            app.poll_scheduler.request_refresh(instance['name'])
+        started = time.perf_counter()
+        cycle = app.update_instance_statuses()
+        if cycle is not None:
+            cycle.result()
+        latencies.append(time.perf_counter() - started)
+        outcomes.update(entry['status'] for entry in app.instance_data_cache)
+    return latencies, outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--instances', type=int, default=10, help='number of simulated instances')
+    parser.add_argument('--rounds', type=int, default=3, help='times each instance (or cycle) is run')
+    parser.add_argument('--target', choices=['probe', 'cycle'], default='probe',
+                        help='time single probes or whole update_instance_statuses cycles')
+    parser.add_argument('--mode', choices=['auto', 'http', 'browser'], default='auto',
+                        help='probe mode configured for every instance')
+    parser.add_argument('--latency-ms', type=int, default=20, help='fake server response latency')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='fraction of requests answered with 500')
+    parser.add_argument('--players-delay-ms', type=int, default=300,
+                        help='delay before the join page renders current-players')
+    parser.add_argument('--active-ratio', type=float, default=0.5)
+    parser.add_argument('--offline-ratio', type=float, default=0.1)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--pool-size', type=int, default=2)
+    parser.add_argument('--deadline', type=float, default=20)
+    parser.add_argument('--cycle-deadline', type=float, default=120)
+    parser.add_argument('--output', help='also write the JSON result to this file')
+    args = parser.parse_args()
+    if args.output:
+        # The portal is run from a scratch directory; resolve against where we were started
+        args.output = os.path.abspath(args.output)
+
+    scenario = Scenario(args.instances, args.latency_ms, args.failure_rate, args.players_delay_ms,
+                        args.active_ratio, args.offline_ratio)
+    server = FakeFoundryServer(scenario).start()
+    instances = [{'name': f'sim-{index}', 'url': url, 'probe': args.mode}
+                 for index, url in enumerate(server.instance_urls())]
+
+    workdir = tempfile.mkdtemp(prefix='portal-bench-')
+    app = load_portal(workdir, instances, args)
+
+    with ResourceSampler() as sampler:
+        started = time.perf_counter()
+        if args.target == 'probe':
+            latencies, outcomes = run_probes(app, instances, args.rounds, args.deadline)
+            probes = len(latencies)
+        else:
+            latencies, outcomes = run_cycles(app, instances, args.rounds)
+            probes = len(instances) * args.rounds
+        elapsed = time.perf_counter() - started
+    app.driver_pool.close()
+
+    result = {
+        'benchmark': 'probe',
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'git_revision': git_revision(),
+        'parameters': vars(args),
+        'results': {
+            'probes': probes,
+            'elapsed_seconds': round(elapsed, 4),
+            'throughput_probes_per_second': round(probes / elapsed, 3) if elapsed else None,
+            'latency_seconds': {
+                'unit': 'probe' if args.target == 'probe' else 'cycle',
+                'mean': round(sum(latencies) / len(latencies), 4) if latencies else None,
+                'p50': percentile(latencies, 0.50),
+                'p95': percentile(latencies, 0.95),
+                'p99': percentile(latencies, 0.99),
+                'max': max(latencies) if latencies else None,
+            },
+            'peak_rss_mb': round(sampler.peak_rss_mb, 1),
+            'peak_chrome_processes': sampler.peak_chrome_processes,
+            'outcomes': dict(outcomes),
+            'expected_states': dict(Counter(scenario.states)),
+            'fake_server_requests': scenario.requests,
+            'driver_pool': app.driver_pool.stats(),
+            'http_transport': app.probe_http.stats(),
+        },
+    }
+
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+    server.stop()
+    # The portal registers exit handlers and background threads we don't need to wait for
+    os._exit(0)
+
+
+if __name__ == '__main__':
+    main()
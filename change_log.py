@@ -0,0 +1,108 @@
+"""
+Versioned portal state with a bounded log of recent changes.
+
+Every real change to an instance status entry or a world history entry bumps
+a single, monotonically increasing state version and is appended to the log
+as (version, kind, key, value), where a value of None means the entry was
+removed. Clients that know the version they last saw ask for just the
+entries changed since then instead of re-downloading the full instance list
+and world history. Only the most recent changes are kept; a client that is
+further behind than that is told to resync from the full endpoints.
+
+Clients are handed versions as ``<epoch>:<n>`` tokens, where the epoch is
+random per process, so a version numbered by an earlier run of the portal is
+never mistaken for one of the current run; a token from another epoch also
+means resync.
+
+With several workers the leader's versions are authoritative: followers
+replay what they import from it under the leader's version (`pinned`), so a
+version obtained from one worker means the same thing on every other. Each
+newly elected leader starts a new epoch and followers adopt it.
+"""
+import os
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+DEFAULT_MAX_ENTRIES = 2000
+
+
+class ChangeLog:
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self._lock = threading.Lock()
+        self._entries = deque(maxlen=max_entries)
+        self._pinned = None
+        self.epoch = os.urandom(4).hex()
+        self.version = 0
+
+    def token(self, version=None):
+        """`version` (default: the current one) as handed to clients, ``<epoch>:<n>``."""
+        return f'{self.epoch}:{self.version if version is None else version}'
+
+    def record(self, kind, key, value):
+        """Log that entry `key` of `kind` is now `value` (None if removed). Returns the new version."""
+        with self._lock:
+            if self._pinned is not None:
+                self.version = max(self.version, self._pinned)
+            else:
+                self.version += 1
+            self._entries.append((self.version, kind, key, value))
+            return self.version
+
+    def new_epoch(self):
+        """Start a new epoch: every token handed out so far now gets a resync."""
+        with self._lock:
+            self.epoch = os.urandom(4).hex()
+        return self.epoch
+
+    def advance_to(self, version):
+        """Continue numbering from at least `version` (e.g. after taking over from another leader)."""
+        with self._lock:
+            self.version = max(self.version, version)
+
+    @contextmanager
+    def pinned(self, version):
+        """Record every change made inside the block under `version`."""
+        with self._lock:
+            self._pinned = version
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pinned = None
+            self.advance_to(version)
+
+    def since(self, token):
+        """Like `after`, for a version token from `token()`; tokens of another epoch get a resync."""
+        epoch, _, version = (token or '').partition(':')
+        changes = self.after(int(version) if epoch == self.epoch and version.isdigit() else None)
+        changes['version'] = self.token(changes['version'])
+        return changes
+
+    def after(self, version):
+        """
+        Changes after `version`, collapsed to the latest value per entry:
+        ``{'version': N, 'resync': bool, '<kind>': {'changed': {key: value}, 'removed': [key]}}``.
+        `resync` is True (and nothing else is returned) when the changes
+        can't be reconstructed from the log.
+        """
+        with self._lock:
+            current = self.version
+            full = len(self._entries) == self._entries.maxlen
+            oldest = self._entries[0][0] - 1 if full else 0
+            if version is None or version < oldest or version > current:
+                return {'version': current, 'resync': True}
+            latest = {}
+            for entry_version, kind, key, value in reversed(self._entries):
+                if entry_version <= version:
+                    break
+                latest.setdefault((kind, key), value)
+
+        changes = {'version': current, 'resync': False}
+        for (kind, key), value in latest.items():
+            section = changes.setdefault(kind, {'changed': {}, 'removed': []})
+            if value is None:
+                section['removed'].append(key)
+            else:
+                section['changed'][key] = value
+        return changes
@@ -0,0 +1,79 @@
+"""
+In-memory cache of config.yaml.
+
+The parsed configuration is kept as a snapshot and only re-read when the
+file's modification time or size changes (checked at most once per
+`check_interval` seconds) or when the portal saves it itself, so request
+handlers and the scheduler can read the config without touching disk.
+"""
+import copy
+import logging
+import os
+import threading
+import time
+import yaml
+
+log = logging.getLogger('portal.config')
+
+DEFAULT_CHECK_INTERVAL = 1.0
+
+
+class ConfigStore:
+    def __init__(self, path, check_interval=DEFAULT_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._snapshot = {}
+        self._file_key = None
+        self._next_check = 0
+        self.version = 0
+
+    def _stat_key(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            log.warning("Config file %s not found", self.path)
+            return {}
+        with open(self.path, 'r') as file:
+            config = yaml.safe_load(file) or {}
+        log.debug("Loaded config", extra={'fields': {'keys': sorted(config),
+                                                     'admin_password_set': 'admin_password_hash' in config}})
+        return config
+
+    def snapshot(self):
+        """
+        The current configuration. Shared between callers, so it must be
+        treated as read-only; use a deep copy to make changes.
+        """
+        now = time.monotonic()
+        if now < self._next_check:
+            return self._snapshot
+        with self._lock:
+            if now >= self._next_check:
+                file_key = self._stat_key()
+                if file_key != self._file_key or self.version == 0:
+                    self._snapshot = self._read()
+                    self._file_key = file_key
+                    self.version += 1
+                self._next_check = now + self.check_interval
+            return self._snapshot
+
+    def save(self, config):
+        """Write `config` to disk and make it the current snapshot immediately."""
+        snapshot = copy.deepcopy(config)
+        # Written aside and renamed into place, so other workers re-reading the
+        # file never see it empty or half written
+        temp_file = f'{self.path}.{os.getpid()}.tmp'
+        with self._lock:
+            with open(temp_file, 'w') as file:
+                yaml.dump(snapshot, file)
+            os.replace(temp_file, self.path)
+            self._snapshot = snapshot
+            self._file_key = self._stat_key()
+            self._next_check = time.monotonic() + self.check_interval
+            self.version += 1
@@ -0,0 +1,281 @@
+"""
+Leader election and shared state for running several portal workers.
+
+Under gunicorn every worker is a separate process. Exactly one of them, the
+leader, holds an exclusive lock on a lock file and runs the probe scheduler;
+it publishes the instance list and the world changes to a small shared SQLite
+database that every other worker (the followers) polls and serves from. The
+full world registry is only published when a follower needs to resync; the
+rest of the time followers apply the changed entries. Followers forward changes that only the leader may make (deleting worlds,
+refreshing an instance) as commands through the same database.
+
+The lock is an `flock` held for the life of the leader process, so the kernel
+releases it as soon as the leader exits or crashes and the next follower to
+poll takes over. All workers must run on the same host.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+log = logging.getLogger('portal.coordination')
+
+POLL_INTERVAL = 1.0
+# Probe results and world changes kept for followers that are catching up
+EVENT_RETENTION = 300
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    kind TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    stamp INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS commands (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    args TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    kind TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+
+class LeaderLock:
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def try_acquire(self):
+        """Take the lock without blocking. True if this process now holds it."""
+        if self._file is not None:
+            return True
+        if fcntl is None:
+            # Nothing to coordinate with; a single process is always the leader
+            return True
+        file = open(self.path, 'a+')
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            file.close()
+            return False
+        file.seek(0)
+        file.truncate()
+        file.write(str(os.getpid()))
+        file.flush()
+        self._file = file
+        return True
+
+
+class FileSemaphore:
+    """
+    Counting semaphore shared by the processes on one host. Each slot is a lock
+    file held with flock by at most one holder, so the kernel frees a slot as
+    soon as its holder exits, even if it crashed.
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+
+    def try_acquire(self, slots):
+        """A handle on one of the first `slots` slots, or None if they are all taken."""
+        for index in range(max(1, slots)):
+            file = open(f'{self.prefix}.{index}.lock', 'a+')
+            try:
+                if fcntl is not None:
+                    fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return file
+            except OSError:
+                file.close()
+        return None
+
+    def acquire(self, slots, poll=0.02):
+        """Wait for a free slot and return its handle."""
+        while True:
+            handle = self.try_acquire(slots)
+            if handle is not None:
+                return handle
+            time.sleep(poll)
+
+    @staticmethod
+    def release(handle):
+        handle.close()
+
+
+class SharedState:
+    """Snapshots, commands and events exchanged between workers."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(SCHEMA)
+
+    def secret(self, name, generate):
+        """A value shared by all workers, created by `generate()` on first use."""
+        with self._lock:
+            self._db.execute('INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)', (name, generate()))
+            return self._db.execute('SELECT value FROM settings WHERE key = ?', (name,)).fetchone()[0]
+
+    # --- Snapshots (leader -> followers) ---
+
+    def publish(self, kind, stamp, data):
+        """Replace the `kind` snapshot and return its new sequence number."""
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO snapshots (kind, seq, stamp, data) '
+                'SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ? FROM snapshots WHERE kind = ?',
+                (kind, stamp, json.dumps(data), kind))
+            return self._db.execute('SELECT seq FROM snapshots WHERE kind = ?', (kind,)).fetchone()[0]
+
+    def snapshot(self, kind):
+        """(seq, stamp, data) of the `kind` snapshot, or None if there is none."""
+        with self._lock:
+            row = self._db.execute('SELECT seq, stamp, data FROM snapshots WHERE kind = ?', (kind,)).fetchone()
+        return None if row is None else (row[0], row[1], json.loads(row[2]))
+
+    def changed_snapshots(self, seen):
+        """{kind: (seq, stamp, data)} for snapshots of the kinds in `seen` newer than their seqs there."""
+        with self._lock:
+            rows = self._db.execute(f"SELECT kind, seq FROM snapshots WHERE kind IN ({', '.join('?' for _ in seen)})",
+                                    tuple(seen)).fetchall()
+            changed = {}
+            for kind, seq in rows:
+                if seen.get(kind) != seq:
+                    stamp, data = self._db.execute('SELECT stamp, data FROM snapshots WHERE kind = ?',
+                                                   (kind,)).fetchone()
+                    changed[kind] = (seq, stamp, json.loads(data))
+            return changed
+
+    def snapshots(self, prefix):
+        """{kind: data} of every snapshot whose kind starts with `prefix`."""
+        with self._lock:
+            rows = self._db.execute('SELECT kind, data FROM snapshots WHERE substr(kind, 1, ?) = ?',
+                                    (len(prefix), prefix)).fetchall()
+        return {kind: json.loads(data) for kind, data in rows}
+
+    def latest_stamp(self):
+        with self._lock:
+            return self._db.execute('SELECT COALESCE(MAX(stamp), 0) FROM snapshots').fetchone()[0]
+
+    # --- Token buckets (rate limits shared by all workers) ---
+
+    def update_buckets(self, keys, update, stale_before=None):
+        """
+        Read the stored (tokens, updated) of each of `keys` (None if not
+        stored), pass them to `update(states)` and store the states it returns,
+        all in one transaction; if `update` raises, nothing changes. Buckets not
+        updated since `stale_before` are dropped.
+        """
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                states = {}
+                for key in keys:
+                    row = self._db.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+                    states[key] = tuple(row) if row is not None else None
+                updated = update(states)
+                self._db.executemany('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                                     [(key, tokens, stamp) for key, (tokens, stamp) in updated.items()])
+                if stale_before is not None:
+                    self._db.execute('DELETE FROM buckets WHERE updated < ?', (stale_before,))
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+
+    # --- Commands (followers -> leader) ---
+
+    def send_command(self, kind, **args):
+        with self._lock:
+            self._db.execute('INSERT INTO commands (kind, args) VALUES (?, ?)', (kind, json.dumps(args)))
+
+    def take_commands(self):
+        """Remove and return all pending (kind, args) commands, oldest first."""
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            rows = self._db.execute('SELECT id, kind, args FROM commands ORDER BY id').fetchall()
+            if rows:
+                self._db.execute('DELETE FROM commands WHERE id <= ?', (rows[-1][0],))
+            self._db.execute('COMMIT')
+        return [(kind, json.loads(args)) for _, kind, args in rows]
+
+    # --- Events (leader -> followers, every one delivered) ---
+
+    def append_event(self, kind, data):
+        with self._lock:
+            self._db.execute('INSERT INTO events (created, kind, data) VALUES (?, ?, ?)',
+                             (time.time(), kind, json.dumps(data)))
+
+    def events_after(self, event_id):
+        """(id, kind, data) of events newer than `event_id`."""
+        with self._lock:
+            rows = self._db.execute('SELECT id, kind, data FROM events WHERE id > ? ORDER BY id',
+                                    (event_id,)).fetchall()
+        return [(row_id, kind, json.loads(data)) for row_id, kind, data in rows]
+
+    def last_event_id(self):
+        with self._lock:
+            return self._db.execute('SELECT COALESCE(MAX(id), 0) FROM events').fetchone()[0]
+
+    def prune_events(self, max_age=EVENT_RETENTION):
+        with self._lock:
+            self._db.execute('DELETE FROM events WHERE created < ?', (time.time() - max_age,))
+
+
+class Coordinator:
+    """
+    Keeps trying to become the leader. Once elected, `on_elected()` runs once
+    and `leader_tick()` runs every `interval` seconds; until then
+    `follower_tick()` does.
+    """
+
+    def __init__(self, lock, on_elected, leader_tick, follower_tick, interval=POLL_INTERVAL):
+        self.lock = lock
+        self.on_elected = on_elected
+        self.leader_tick = leader_tick
+        self.follower_tick = follower_tick
+        self.interval = interval
+        self.is_leader = False
+        self._thread = None
+
+    def _step(self):
+        if not self.is_leader and self.lock.try_acquire():
+            log.info("Worker %d elected leader", os.getpid())
+            self.is_leader = True
+            self.on_elected()
+        (self.leader_tick if self.is_leader else self.follower_tick)()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self._step()
+            except Exception as e:
+                log.error("Worker coordination failed: %s", e)
+
+    def start(self):
+        self._step()
+        self._thread = threading.Thread(target=self._run, name='coordinator', daemon=True)
+        self._thread.start()
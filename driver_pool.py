@@ -0,0 +1,280 @@
+"""
+Pool of warm headless Chrome sessions shared by the instance status scraper.
+
+Starting Chrome is the most expensive part of a probe, so instead of creating
+and quitting a driver for every instance on every cycle the scraper borrows a
+session from this pool and hands it back when it is done. Sessions are reset
+between pages, recycled after a number of pages or once their memory grows
+past a limit, and replaced automatically when Chrome crashes. Changing the
+launch options (see `set_launch_options`) retires sessions started with the
+old ones as they come back to the pool.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_POOL_SIZE = 2
+DEFAULT_MAX_PAGES = 50
+DEFAULT_MAX_RSS_MB = 768
+# Measuring a session's memory walks all of /proc, so it is done at most this often per session
+RSS_CHECK_INTERVAL = 30
+
+
+def build_chrome_options(extra_arguments=(), page_load_strategy='normal'):
+    """Chrome options used for every scraper session."""
+    # Selenium is imported on first use so processes that never start Chrome don't pay for it
+    from selenium.webdriver.chrome.options import Options
+    options = Options()
+    options.page_load_strategy = page_load_strategy
+    options.add_argument('--headless')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--disable-gpu')
+    options.add_argument('window-size=1920x1080')
+    options.add_argument('--ignore-certificate-errors')
+    for argument in extra_arguments:
+        options.add_argument(argument)
+    return options
+
+
+def process_tree_rss_mb(root_pid):
+    """
+    Resident memory of a process and all of its descendants, in MB.
+    Reads /proc directly; returns 0 where /proc is not available.
+    """
+    if not root_pid or not os.path.isdir('/proc'):
+        return 0
+    children = {}
+    rss_kb = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/status') as status_file:
+                ppid = None
+                for line in status_file:
+                    if line.startswith('PPid:'):
+                        ppid = int(line.split()[1])
+                    elif line.startswith('VmRSS:'):
+                        rss_kb[int(entry)] = int(line.split()[1])
+                if ppid is not None:
+                    children.setdefault(ppid, []).append(int(entry))
+        except (IOError, OSError, ValueError):
+            continue
+
+    total_kb = 0
+    pending = [root_pid]
+    while pending:
+        pid = pending.pop()
+        total_kb += rss_kb.get(pid, 0)
+        pending.extend(children.get(pid, []))
+    return total_kb / 1024
+
+
+class PoolTimeout(Exception):
+    """Raised by ``acquire()`` when no session became free within its timeout."""
+
+
+class PooledDriver:
+    """A Chrome session plus the bookkeeping the pool needs to recycle it."""
+
+    def __init__(self, driver, generation=0):
+        self.driver = driver
+        self.generation = generation
+        self.pages = 0
+        self.rss_checked_at = time.monotonic()
+
+    @property
+    def pid(self):
+        service = getattr(self.driver, 'service', None)
+        process = getattr(service, 'process', None)
+        return getattr(process, 'pid', None)
+
+    def is_alive(self):
+        try:
+            self.driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def reset(self):
+        """Clear cookies and storage and park the session on a blank page."""
+        self.driver.delete_all_cookies()
+        self.driver.execute_script(
+            "try { window.localStorage.clear(); window.sessionStorage.clear(); } catch (e) {}"
+        )
+        self.driver.get('about:blank')
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception:
+            pass
+
+
+class DriverPool:
+    """
+    Bounded pool of reusable Chrome sessions.
+
+    Borrow a driver with ``acquire()`` and hand it back with ``release()`` (or
+    use ``with pool.session() as driver:``). At most ``size`` sessions exist at
+    once; callers beyond that wait for one to be returned.
+    """
+
+    def __init__(self, size=DEFAULT_POOL_SIZE, max_pages=DEFAULT_MAX_PAGES,
+                 max_rss_mb=DEFAULT_MAX_RSS_MB, options_factory=build_chrome_options):
+        self.size = size
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.options_factory = options_factory
+        self.chrome_arguments = ()
+        self.page_load_strategy = 'normal'
+        # Bumped whenever the launch options change
+        self.generation = 0
+        self._idle = []
+        self._borrowed = {}
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._counts = {'started': 0, 'reused': 0, 'recycled': 0, 'crashed': 0}
+
+    def configure(self, settings):
+        """Apply the ``scraper`` section of config.yaml."""
+        settings = settings or {}
+        with self._cond:
+            self.size = max(1, int(settings.get('pool_size', DEFAULT_POOL_SIZE)))
+            self.max_pages = int(settings.get('max_pages_per_driver', DEFAULT_MAX_PAGES))
+            self.max_rss_mb = int(settings.get('max_driver_rss_mb', DEFAULT_MAX_RSS_MB))
+            self._cond.notify_all()
+
+    def set_launch_options(self, chrome_arguments, page_load_strategy):
+        """Launch new sessions with these options; existing ones are retired when returned."""
+        chrome_arguments = tuple(chrome_arguments)
+        with self._cond:
+            if (chrome_arguments, page_load_strategy) == (self.chrome_arguments, self.page_load_strategy):
+                return
+            self.chrome_arguments = chrome_arguments
+            self.page_load_strategy = page_load_strategy
+            self.generation += 1
+            stale, self._idle = self._idle, []
+        for pooled in stale:
+            self._count('recycled')
+            pooled.quit()
+
+    def stats(self):
+        """Start/reuse/recycle/crash counters and current pool occupancy."""
+        with self._cond:
+            stats = dict(self._counts)
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._in_use
+        return stats
+
+    def _count(self, key):
+        with self._cond:
+            self._counts[key] += 1
+
+    def _start(self):
+        with self._cond:
+            generation = self.generation
+            options = self.options_factory(self.chrome_arguments, self.page_load_strategy)
+        from selenium import webdriver
+        driver = webdriver.Chrome(options=options)
+        self._count('started')
+        return PooledDriver(driver, generation)
+
+    def _checkout(self, timeout=None):
+        expires_at = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._in_use >= self.size:
+                remaining = None if expires_at is None else expires_at - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise PoolTimeout(f'No browser session became free within {timeout:.1f}s')
+                self._cond.wait(remaining)
+            self._in_use += 1
+            pooled = self._idle.pop() if self._idle else None
+
+        try:
+            # Chrome may have died while the session sat idle
+            while pooled is not None and not pooled.is_alive():
+                self._count('crashed')
+                pooled.quit()
+                with self._cond:
+                    pooled = self._idle.pop() if self._idle else None
+            if pooled is None:
+                return self._start()
+            self._count('reused')
+            return pooled
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def _needs_recycle(self, pooled):
+        if pooled.generation != self.generation:
+            return True
+        if self.max_pages and pooled.pages >= self.max_pages:
+            return True
+        if self.max_rss_mb:
+            now = time.monotonic()
+            if now - pooled.rss_checked_at >= RSS_CHECK_INTERVAL:
+                pooled.rss_checked_at = now
+                if process_tree_rss_mb(pooled.pid) > self.max_rss_mb:
+                    return True
+        return False
+
+    def _checkin(self, pooled):
+        keep = False
+        if not self._closed:
+            try:
+                pooled.reset()
+                if self._needs_recycle(pooled):
+                    self._count('recycled')
+                else:
+                    keep = True
+            except Exception:
+                self._count('crashed')
+
+        with self._cond:
+            self._in_use -= 1
+            if keep and len(self._idle) < self.size:
+                self._idle.append(pooled)
+                pooled = None
+            self._cond.notify()
+
+        if pooled is not None:
+            pooled.quit()
+
+    def acquire(self, timeout=None):
+        """
+        Borrow a driver for a single page visit. Raises PoolTimeout if none
+        became free within `timeout` seconds (None waits as long as it takes).
+        """
+        pooled = self._checkout(timeout)
+        pooled.pages += 1
+        with self._cond:
+            self._borrowed[id(pooled.driver)] = pooled
+        return pooled.driver
+
+    def release(self, driver):
+        """Return a driver obtained from ``acquire``."""
+        with self._cond:
+            pooled = self._borrowed.pop(id(driver))
+        self._checkin(pooled)
+
+    @contextmanager
+    def session(self):
+        driver = self.acquire()
+        try:
+            yield driver
+        finally:
+            self.release(driver)
+
+    def close(self):
+        """Quit every idle session; sessions still in use are quit on return."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            pooled.quit()
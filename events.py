@@ -0,0 +1,79 @@
+"""
+Server-Sent Events broker for pushing dashboard updates.
+
+Every event carries the full current document for its type (the instance
+status list or the world list), so the broker only needs to remember the
+latest event of each type. A client reconnecting with `Last-Event-ID` is sent
+just the types that changed after that id, and a new client gets all of them.
+
+Event ids are ``<epoch>-<n>``, where the epoch is random per broker. An id
+issued by another worker process or before a restart therefore never matches,
+and that client is sent every type again instead of being compared against an
+unrelated counter.
+"""
+import os
+import threading
+
+HEARTBEAT_INTERVAL = 15
+RETRY_MS = 5000
+
+
+class EventBroker:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.epoch = os.urandom(4).hex()
+        self._last_id = 0
+        # event type -> (id, data)
+        self._latest = {}
+
+    def publish(self, event_type, data):
+        """Record a new `event_type` document (a single-line str) and wake subscribers."""
+        with self._cond:
+            self._last_id += 1
+            self._latest[event_type] = (self._last_id, data)
+            self._cond.notify_all()
+
+    def publish_if_missing(self, event_type, build):
+        """Publish `build()` as `event_type` unless that type was already published."""
+        with self._cond:
+            if event_type in self._latest:
+                return
+            self._last_id += 1
+            self._latest[event_type] = (self._last_id, build())
+            self._cond.notify_all()
+
+    def events_since(self, last_id):
+        """Latest events with an id greater than `last_id`, oldest first."""
+        with self._cond:
+            events = [(event_id, event_type, data)
+                      for event_type, (event_id, data) in self._latest.items()
+                      if event_id > last_id]
+        return sorted(events)
+
+    def wait(self, last_id, timeout):
+        """Block until an event newer than `last_id` exists or `timeout` passes."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._last_id > last_id, timeout)
+
+    def stream(self, last_event_id=None, heartbeat=HEARTBEAT_INTERVAL):
+        """Generator of SSE-formatted chunks for one client connection."""
+        last_id = parse_last_event_id(last_event_id, self.epoch)
+        yield f"retry: {RETRY_MS}\n\n"
+        while True:
+            events = self.events_since(last_id)
+            for event_id, event_type, data in events:
+                yield f"id: {self.epoch}-{event_id}\nevent: {event_type}\ndata: {data}\n\n"
+                last_id = max(last_id, event_id)
+            if not events and not self.wait(last_id, heartbeat):
+                yield ": heartbeat\n\n"
+
+
+def parse_last_event_id(value, epoch):
+    """The counter part of a `Last-Event-ID` issued under `epoch`; 0 (resend everything) for any other."""
+    prefix, _, counter = (value or '').partition('-')
+    if prefix != epoch:
+        return 0
+    try:
+        return max(0, int(counter))
+    except ValueError:
+        return 0
@@ -0,0 +1,20 @@
+"""
+Gunicorn settings for running the portal with several worker processes.
+
+Usage: gunicorn -c gunicorn.conf.py app:app
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('PORTAL_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('PORTAL_WORKERS', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+# Threaded workers, so one slow request doesn't block the others. /api/events is turned off in
+# multi-worker mode because every open stream would hold a thread; dashboards poll /api/changes instead
+worker_class = 'gthread'
+threads = int(os.environ.get('PORTAL_THREADS', 8))
+# Workers import the app themselves so each one gets its own scheduler, Chrome pool and database connections
+preload_app = False
+# Open /api/events streams are cut off after this long on shutdown; clients reconnect to another worker
+graceful_timeout = 10
+# Tells app.py to elect a single leader to run the probe scheduler
+raw_env = ['PORTAL_MULTI_WORKER=1']
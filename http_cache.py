@@ -0,0 +1,113 @@
+"""
+Serialized, compressed API responses built once per state change.
+
+A `CachedJSON` holds the encoded body of an endpoint for one version of the
+underlying state along with its gzip-compressed form and a strong ETag. The
+body is only rebuilt when the version changes, so repeated polling of an idle
+dashboard costs a dictionary lookup and, with `If-None-Match`, an empty 304.
+`CachedPages` does the same for rendered HTML pages.
+"""
+import gzip
+import hashlib
+import threading
+from flask import Response
+
+# Bodies smaller than this aren't worth compressing
+GZIP_MIN_SIZE = 256
+
+
+class CachedEntry:
+    def __init__(self, body):
+        self.body = body
+        self.etag = hashlib.sha1(body).hexdigest()[:20]
+        self.gzipped = gzip.compress(body, 6) if len(body) >= GZIP_MIN_SIZE else None
+
+
+class CachedJSON:
+    """
+    Cache of a JSON document keyed on a state version.
+
+    `build()` returns the Python data for the current state and `dumps`
+    encodes it to a str.
+    """
+
+    def __init__(self, build, dumps):
+        self.build = build
+        self.dumps = dumps
+        self._lock = threading.Lock()
+        self._version = None
+        self._entry = None
+
+    def get(self, version):
+        entry = self._entry
+        if entry is not None and self._version == version:
+            return entry
+        with self._lock:
+            if self._entry is None or self._version != version:
+                self._entry = CachedEntry(self.dumps(self.build()).encode('utf-8'))
+                self._version = version
+            return self._entry
+
+
+class CachedPages:
+    """
+    Rendered pages for one version of the underlying state, one per variant
+    (e.g. the viewer's role). `render(variant)` returns the page as a str;
+    every variant is rendered again once the version changes.
+    """
+
+    def __init__(self, render):
+        self.render = render
+        self._lock = threading.Lock()
+        self._version = None
+        self._entries = {}
+
+    def get(self, version, variant):
+        """The cached entry for `variant` and whether it was already cached."""
+        with self._lock:
+            if self._version != version:
+                self._version = version
+                self._entries = {}
+            entry = self._entries.get(variant)
+        if entry is not None:
+            return entry, True
+        entry = CachedEntry(self.render(variant).encode('utf-8'))
+        with self._lock:
+            if self._version == version:
+                self._entries[variant] = entry
+        return entry, False
+
+
+def etag_matches(request, etag):
+    """True if the request's If-None-Match names any encoding of `etag`."""
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate.strip('"') in (etag, etag + '-gzip'):
+            return True
+    return False
+
+
+def cached_response(request, entry, mimetype='application/json', cache_control='no-cache'):
+    """Build a response for `entry`, honouring If-None-Match and Accept-Encoding."""
+    use_gzip = entry.gzipped is not None and 'gzip' in request.headers.get('Accept-Encoding', '')
+    etag = entry.etag + '-gzip' if use_gzip else entry.etag
+
+    if etag_matches(request, entry.etag):
+        response = Response(status=304)
+    elif use_gzip:
+        response = Response(entry.gzipped, mimetype=mimetype)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(entry.body, mimetype=mimetype)
+
+    response.headers['ETag'] = f'"{etag}"'
+    response.headers['Cache-Control'] = cache_control
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
@@ -0,0 +1,148 @@
+"""
+Browserless status probe for Foundry instances.
+
+Most of the time we only need to know whether a world is running and how many
+players are in it, which Foundry already tells us through its ``/api/status``
+endpoint and the page it redirects visitors to (``/join``, ``/game``, ``/auth``
+or ``/setup``). This module reads those directly over HTTP and returns the same
+``(status, active_world, background_url)`` tuple as ``check_instance_status``,
+or ``None`` when the answer can't be decided without a real browser.
+"""
+import html
+import json
+import logging
+import re
+import time
+from urllib.parse import urljoin, urlsplit
+import urllib3
+
+from http_transport import Transport
+
+log = logging.getLogger('portal.http_probe')
+
+DEFAULT_TIMEOUT = 10
+MAX_REDIRECTS = 5
+# Titles Foundry shows before a world has finished loading, plus the bare host name
+# of the deployment this portal was written for
+GENERIC_TITLES = ['Foundry Virtual Tabletop', 'Loading...', 'foundry.tongatime.us', '']
+ROUTE_SUFFIX = re.compile(r'/(join|game|auth|setup|players)/?$')
+TITLE_PATTERN = re.compile(r'<title[^>]*>(.*?)</title>', re.IGNORECASE | re.DOTALL)
+BACKGROUND_PATTERN = re.compile(r'--background-url\s*:\s*url\(\s*(?:&quot;|["\'])?(.*?)(?:&quot;|["\'])?\s*\)')
+PLAYERS_SECTION_PATTERN = re.compile(r'class="[^"]*\bcurrent-players\b[^"]*"(.*?)</(?:div|section|footer)>',
+                                     re.IGNORECASE | re.DOTALL)
+COUNT_PATTERN = re.compile(r'class="[^"]*\bcount\b[^"]*"[^>]*>\s*(\d+)\s*<')
+PLAYERS_TEXT_PATTERN = re.compile(r"Current Players\s*(\d+)\s*/\s*(\d+)", re.DOTALL)
+
+# Keep-alive connections shared with the background image cache; see http_transport.py
+http = Transport()
+
+
+def base_url(instance_url):
+    """Instance URL without a trailing Foundry route such as /join."""
+    return ROUTE_SUFFIX.sub('', instance_url.rstrip('/'))
+
+
+def fetch(url, expires_at):
+    """GET `url` before `expires_at`, following redirects. Returns (final_url, status, body_text)."""
+    for _ in range(MAX_REDIRECTS + 1):
+        response = http.request('GET', url, expires_at=expires_at, redirect=False, retries=False,
+                                preload_content=True)
+        location = response.headers.get('Location')
+        if response.status in (301, 302, 303, 307, 308) and location:
+            url = urljoin(url, location)
+            continue
+        return url, response.status, response.data.decode('utf-8', errors='replace')
+    return url, None, ''
+
+
+def read_status_json(instance_url, expires_at):
+    """Foundry's /api/status document, or None if the instance doesn't serve one."""
+    _, code, body = fetch(base_url(instance_url) + '/api/status', expires_at)
+    if code != 200:
+        return None
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def parse_title(page):
+    match = TITLE_PATTERN.search(page)
+    return html.unescape(match.group(1)).strip() if match else ''
+
+
+def parse_background(page):
+    match = BACKGROUND_PATTERN.search(page)
+    return html.unescape(match.group(1)).strip() if match else None
+
+
+def parse_players(page):
+    """Player count string like "3 / 10" from the join page, or None."""
+    section = PLAYERS_SECTION_PATTERN.search(page)
+    if section:
+        counts = COUNT_PATTERN.findall(section.group(1))
+        if len(counts) >= 2:
+            return f"{counts[0]} / {counts[1]}"
+    match = PLAYERS_TEXT_PATTERN.search(re.sub(r'<[^>]+>', ' ', page))
+    if match:
+        return f"{match.group(1)} / {match.group(2)}"
+    return None
+
+
+def probe_instance_http(instance_url, deadline=None, best_effort=False):
+    """
+    Determine instance status without a browser.
+
+    Returns a `(status, active_world, background_url)` tuple, or None when the
+    fast tier can't decide and the Selenium scraper should take over. With
+    `best_effort`, a reachable but undecidable instance is reported as online
+    instead of returning None.
+    """
+    # Both requests (and any redirects) share the probe's deadline
+    expires_at = time.monotonic() + (deadline or DEFAULT_TIMEOUT)
+    try:
+        status_json = read_status_json(instance_url, expires_at)
+        final_url, code, page = fetch(instance_url, expires_at)
+    except urllib3.exceptions.HTTPError as e:
+        log.debug("Instance unreachable: %s", e, extra={'fields': {'url': instance_url}})
+        return "offline", None, None
+
+    path = urlsplit(final_url).path
+    title = parse_title(page)
+    background_url = parse_background(page)
+    log.debug("Fetched page", extra={'fields': {'url': final_url, 'code': code, 'title': title,
+                                                'status': status_json}})
+
+    if code is None or code >= 500:
+        return "offline", None, None
+
+    world_running = status_json.get('active') if status_json else None
+    if world_running is False:
+        # Foundry is up but no world is launched (setup or auth screen)
+        return "online", None, background_url
+
+    if "/join" in path or world_running:
+        if title in GENERIC_TITLES:
+            # World still loading or title only rendered client-side
+            return ("online", None, background_url) if best_effort else None
+
+        player_info = parse_players(page)
+        if player_info is None and status_json and status_json.get('users') is not None:
+            player_info = f"{status_json['users']} / Unknown"
+        if player_info is None:
+            if not best_effort:
+                return None
+            player_info = "Unknown / Unknown"
+
+        active_world = {
+            'name': title,
+            'background': background_url,
+            'players': player_info
+        }
+        return "active", active_world, background_url
+
+    if "/game" in path or "/auth" in path or "/setup" in path or "Foundry Virtual Tabletop" in title:
+        return "online", None, background_url
+
+    return ("online", None, background_url) if best_effort else None
@@ -0,0 +1,190 @@
+"""
+Shared keep-alive HTTP transport for requests to Foundry instances.
+
+The HTTP status probe and the background image cache talk to the same few
+instance origins over and over. They share one `Transport`, which keeps
+connections to each origin open between requests, so most probes skip the TCP
+and TLS handshakes entirely:
+
+- At most `max_connections_per_origin` requests to one origin run at once.
+  Further requests wait for a free connection instead of opening more.
+- Certificates are not verified by default, matching the scraper's
+  --ignore-certificate-errors, since Foundry is often served with self-signed
+  certificates. An instance can turn verification on with `verify_tls`,
+  optionally with its own CA bundle.
+- Requests made for a probe are given the probe's absolute deadline. Connect,
+  read and pool waits are cut short so the probe as a whole never overruns.
+
+New connections, requests and connect (handshake) times are counted per
+origin, so the connection reuse ratio shows up on /metrics.
+"""
+import threading
+import time
+from urllib.parse import urlsplit
+
+import urllib3
+from urllib3.connection import HTTPConnection, HTTPSConnection
+
+import metrics
+
+DEFAULT_SETTINGS = {
+    'max_connections_per_origin': 4,
+    'connect_timeout': 5,
+    'read_timeout': 10,
+    'verify_tls': False,
+}
+# Pools kept beyond one per configured instance, for other origins (e.g. redirects)
+SPARE_POOLS = 8
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+
+def origin_of(url):
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    return f'{parts.scheme}://{parts.hostname}:{port}'
+
+
+class ConnectTimer:
+    """Connection mixin reporting how long each new connection took to open (TCP and TLS)."""
+    on_connect = None
+
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        self.on_connect(time.perf_counter() - started)
+
+
+class TimedHTTPConnection(ConnectTimer, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(ConnectTimer, HTTPSConnection):
+    pass
+
+
+class TimedPoolManager(urllib3.PoolManager):
+    """PoolManager whose connections report to `on_connect(origin, seconds)` when opened."""
+
+    def __init__(self, on_connect, **kwargs):
+        super().__init__(**kwargs)
+        self.on_connect = on_connect
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        pool = super()._new_pool(scheme, host, port, request_context)
+        origin = f'{scheme}://{host}:{port}'
+        on_connect = self.on_connect
+        base = TimedHTTPSConnection if scheme == 'https' else TimedHTTPConnection
+        pool.ConnectionCls = type(base.__name__, (base,), {
+            'on_connect': staticmethod(lambda seconds: on_connect(origin, seconds))})
+        return pool
+
+
+class Transport:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._settings = None
+        self._verify = {}
+        self._managers = {}
+        self._num_pools = SPARE_POOLS
+        # origin -> [requests, connections opened, seconds spent connecting]
+        self._stats = {}
+        self.configure(None)
+
+    def configure(self, settings, instances=()):
+        """Apply the ``http`` section of config.yaml and each instance's `verify_tls`."""
+        merged = dict(DEFAULT_SETTINGS)
+        merged.update(settings or {})
+        verify = {origin_of(instance['url']): instance['verify_tls']
+                  for instance in instances if 'verify_tls' in instance and instance.get('url')}
+        with self._lock:
+            if merged == self._settings and verify == self._verify:
+                return
+            previous = self._managers
+            self._settings = merged
+            self._verify = verify
+            self._num_pools = len(instances) + SPARE_POOLS
+            # Rebuilt lazily with the new limits; requests in flight finish on the old pools
+            self._managers = {}
+        for manager in previous.values():
+            manager.clear()
+
+    def _manager(self, origin):
+        """The pool manager for the certificate verification `origin` needs."""
+        with self._lock:
+            verify = self._verify.get(origin, self._settings['verify_tls'])
+            manager = self._managers.get(verify)
+            if manager is None:
+                if verify is False:
+                    tls = {'cert_reqs': 'CERT_NONE'}
+                elif verify is True:
+                    tls = {'cert_reqs': 'CERT_REQUIRED'}
+                else:
+                    tls = {'cert_reqs': 'CERT_REQUIRED', 'ca_certs': verify}
+                manager = self._managers[verify] = TimedPoolManager(
+                    self._connected, num_pools=self._num_pools, block=True,
+                    maxsize=max(1, int(self._settings['max_connections_per_origin'])), **tls)
+            return manager
+
+    def _connected(self, origin, seconds):
+        with self._lock:
+            self._stats.setdefault(origin, [0, 0, 0.0])
+            self._stats[origin][1] += 1
+            self._stats[origin][2] += seconds
+        metrics.http_connections.inc(origin=origin)
+        metrics.http_connect_duration.observe(seconds, origin=origin)
+
+    def _timeouts(self, expires_at, timeout):
+        """(timeout, pool_timeout) for a request, cut to what is left before `expires_at`."""
+        settings = self._settings
+        if expires_at is None:
+            if timeout is None:
+                timeout = urllib3.Timeout(connect=settings['connect_timeout'], read=settings['read_timeout'])
+            return timeout, settings['connect_timeout'] + settings['read_timeout']
+        remaining = expires_at - time.monotonic()
+        if remaining <= 0:
+            raise urllib3.exceptions.TimeoutError('Probe deadline passed')
+        timeout = urllib3.Timeout(total=remaining, connect=min(settings['connect_timeout'], remaining),
+                                  read=min(settings['read_timeout'], remaining))
+        return timeout, remaining
+
+    def request(self, method, url, expires_at=None, timeout=None, **kwargs):
+        """
+        Make a request through the shared pools. `expires_at` is an absolute
+        time.monotonic() deadline; without one `timeout` (or the configured
+        timeouts) applies. Other arguments are passed on to urllib3.
+        """
+        # Retries would start the timeouts over; callers that want them ask explicitly
+        kwargs.setdefault('retries', False)
+        try:
+            return self._send(method, url, expires_at, timeout, kwargs)
+        except urllib3.exceptions.ProtocolError:
+            # Most likely a kept-alive connection the server closed while it was idle; try once more
+            return self._send(method, url, expires_at, timeout, kwargs)
+
+    def _send(self, method, url, expires_at, timeout, kwargs):
+        origin = origin_of(url)
+        manager = self._manager(origin)
+        request_timeout, pool_timeout = self._timeouts(expires_at, timeout)
+        with self._lock:
+            self._stats.setdefault(origin, [0, 0, 0.0])
+            self._stats[origin][0] += 1
+        metrics.http_requests.inc(origin=origin)
+        return manager.request(method, url, timeout=request_timeout, pool_timeout=pool_timeout, **kwargs)
+
+    def stats(self):
+        """Per origin: requests, connections opened, reuse ratio and mean connect time."""
+        with self._lock:
+            items = [(origin, list(values)) for origin, values in self._stats.items()]
+        return {origin: {
+            'requests': requests,
+            'connections': connections,
+            'reuse_ratio': round(1 - connections / requests, 4) if requests else None,
+            'mean_connect_seconds': round(seconds / connections, 6) if connections else None,
+        } for origin, (requests, connections, seconds) in sorted(items)}
+
+    def clear(self):
+        with self._lock:
+            managers, self._managers = self._managers, {}
+        for manager in managers.values():
+            manager.clear()
@@ -0,0 +1,236 @@
+"""
+On-disk cache of world background images.
+
+Browsers used to load every world's full-resolution background straight from
+its Foundry instance, once per viewer. The portal now fetches each background
+once, stores a card-sized, recompressed thumbnail in a size-bounded LRU cache
+directory and serves that instead. Only URLs the portal has registered from
+its own world history can be fetched, so this is not an open proxy.
+
+Thumbnails need Pillow; without it nothing is cached and browsers load the
+backgrounds from the instances themselves. Only bodies that decode as images
+are ever cached, always re-encoded as JPEG, so the cache can't be used to pass
+arbitrary responses through the portal.
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import urllib3
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - Pillow is optional
+    Image = None
+
+log = logging.getLogger('portal.images')
+
+DEFAULT_CACHE_DIR = 'image_cache'
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024
+# Twice the CSS size of a world card, for high-DPI screens
+THUMBNAIL_SIZE = (800, 450)
+THUMBNAIL_QUALITY = 80
+MAX_SOURCE_BYTES = 20 * 1024 * 1024
+FETCH_TIMEOUT = 15
+# Don't retry a background that failed to download for this long
+FAILURE_BACKOFF = 300
+# Most recent failures remembered; older ones are forgotten and may be retried early
+MAX_FAILURES = 10000
+# A hit updates the file's modification time (the LRU order after a restart) at most this often
+ACCESS_PERSIST_INTERVAL = 60
+
+
+class CachedImage:
+    def __init__(self, path, mimetype, etag):
+        self.path = path
+        self.mimetype = mimetype
+        self.etag = etag
+
+
+class ImageCache:
+    def __init__(self, http, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.http = http
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> source URL, for every background the portal knows about
+        self._sources = {}
+        # key -> lock, so each image is only fetched once at a time
+        self._fetch_locks = {}
+        # key -> time of the last failed download, oldest first
+        self._failures = OrderedDict()
+        self._index = None
+
+    @staticmethod
+    def key_for(url):
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()[:32]
+
+    def register(self, url):
+        """Allow `url` to be fetched and return its cache key."""
+        key = self.key_for(url)
+        with self._lock:
+            self._sources[key] = url
+        return key
+
+    @property
+    def enabled(self):
+        return Image is not None
+
+    def source_for(self, key):
+        with self._lock:
+            return self._sources.get(key)
+
+    # --- Disk index and LRU eviction ---
+
+    def _load_index(self):
+        """
+        key -> (path, size, last access written to disk) of every file in the
+        cache directory, least recently used first.
+        """
+        if self._index is not None:
+            return self._index
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entries = []
+        for filename in os.listdir(self.cache_dir):
+            key, ext = os.path.splitext(filename)
+            path = os.path.join(self.cache_dir, filename)
+            if ext == '.img':
+                # Undecoded original from an older version; those are no longer served
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            if ext != '.jpg':
+                continue
+            stat = os.stat(path)
+            entries.append((key, (path, stat.st_size, stat.st_mtime)))
+        self._index = OrderedDict(sorted(entries, key=lambda entry: entry[1][2]))
+        return self._index
+
+    def _touch(self, key):
+        """Mark `key` as most recently used; the file's mtime only follows now and then."""
+        self._index.move_to_end(key)
+        path, size, persisted = self._index[key]
+        now = time.time()
+        if now - persisted < ACCESS_PERSIST_INTERVAL:
+            return
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            return
+        self._index[key] = (path, size, now)
+
+    def _evict(self):
+        total = sum(size for _, size, _ in self._index.values())
+        # Least recently used first
+        for key, (path, size, _) in list(self._index.items()):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            del self._index[key]
+            total -= size
+
+    def _lookup(self, key):
+        with self._lock:
+            index = self._load_index()
+            if key not in index:
+                return None
+            self._touch(key)
+            path, size, _ = index[key]
+        return CachedImage(path, 'image/jpeg', f"{key}-{size}")
+
+    # --- Fetching ---
+
+    def _make_thumbnail(self, data):
+        if Image is None:
+            return None
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                image = image.convert('RGB')
+                image.thumbnail(THUMBNAIL_SIZE)
+                output = io.BytesIO()
+                image.save(output, 'JPEG', quality=THUMBNAIL_QUALITY, optimize=True, progressive=True)
+                return output.getvalue()
+        except Exception as e:
+            log.error("Could not create thumbnail: %s", e)
+            return None
+
+    def _fetch(self, key, url):
+        response = self.http.request('GET', url, timeout=FETCH_TIMEOUT, preload_content=False,
+                                     retries=urllib3.Retry(total=None, connect=1, read=1, redirect=3))
+        try:
+            if response.status != 200:
+                log.error("Background %s returned HTTP %s", url, response.status)
+                return False
+            data = response.read(MAX_SOURCE_BYTES + 1)
+        finally:
+            response.release_conn()
+        if len(data) > MAX_SOURCE_BYTES:
+            log.error("Background %s is larger than %d bytes", url, MAX_SOURCE_BYTES)
+            return False
+
+        data = self._make_thumbnail(data)
+        if data is None:
+            return False
+
+        path = os.path.join(self.cache_dir, key + '.jpg')
+        temp_file = path + '.tmp'
+        with self._lock:
+            index = self._load_index()
+            with open(temp_file, 'wb') as file:
+                file.write(data)
+            os.replace(temp_file, path)
+            index[key] = (path, len(data), os.path.getmtime(path))
+            index.move_to_end(key)
+            self._evict()
+        log.debug("Cached background %s (%d bytes)", url, len(data))
+        return True
+
+    def get(self, key):
+        """The cached image for `key`, fetching it on first use. None if unavailable."""
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        url = self.source_for(key)
+        if url is None:
+            return None
+        failed_at = self._failures.get(key)
+        if failed_at is not None and time.monotonic() - failed_at < FAILURE_BACKOFF:
+            return None
+
+        with self._lock:
+            fetch_lock = self._fetch_locks.setdefault(key, threading.Lock())
+        with fetch_lock:
+            cached = self._lookup(key)
+            if cached is None:
+                try:
+                    self._fetch(key, url)
+                except (urllib3.exceptions.HTTPError, IOError, OSError) as e:
+                    log.error("Could not fetch background %s: %s", url, e)
+                cached = self._lookup(key)
+                self._record_failure(key, cached is None)
+        with self._lock:
+            self._fetch_locks.pop(key, None)
+        return cached
+
+    def _record_failure(self, key, failed):
+        now = time.monotonic()
+        with self._lock:
+            self._failures.pop(key, None)
+            if failed:
+                self._failures[key] = now
+            # Entries are in failure order, so expired ones are at the front
+            while self._failures and (len(self._failures) > MAX_FAILURES
+                                      or now - next(iter(self._failures.values())) >= FAILURE_BACKOFF):
+                self._failures.popitem(last=False)
+
+    def warm(self, url):
+        """Register `url` and fetch it now unless it is already cached."""
+        return self.get(self.register(url))
@@ -0,0 +1,54 @@
+"""
+Last published instance statuses, kept on disk for warm starts.
+
+After each refresh cycle that changed anything, the instance list served by
+/api/instance-status is written to a small JSON file. On startup it is read
+back so the dashboard shows the last known statuses straight away instead of
+every instance as offline until the first probes finish. Restored entries are
+marked `stale` with the time they were saved (`stale_since`) and are replaced
+as soon as their instance has been probed again.
+"""
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+log = logging.getLogger('portal.snapshot')
+
+
+def save_snapshot(path, instances):
+    """Atomically write `instances` to `path`."""
+    temp_file = path + '.tmp'
+    try:
+        with open(temp_file, 'w') as file:
+            json.dump({'saved_at': time.time(), 'instances': instances}, file)
+        os.replace(temp_file, path)
+    except (IOError, OSError) as e:
+        log.error("Could not save instance snapshot %s: %s", path, e)
+
+
+def load_snapshot(path):
+    """
+    Entries of the snapshot at `path`, keyed by (name, url) and marked stale.
+    Empty if there is no usable snapshot.
+    """
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as file:
+            data = json.load(file)
+        saved_at = float(data['saved_at'])
+        instances = data['instances']
+    except (IOError, OSError, ValueError, KeyError, TypeError) as e:
+        log.error("Could not load instance snapshot %s: %s", path, e)
+        return {}
+    stale_since = datetime.utcfromtimestamp(saved_at).isoformat() + 'Z'
+    restored = {}
+    for instance in instances:
+        entry = dict(instance)
+        entry['stale'] = True
+        entry.setdefault('stale_since', stale_since)
+        restored[(entry.get('name'), entry.get('url'))] = entry
+    log.info("Restored %d instance statuses saved %.0fs ago", len(restored), time.time() - saved_at)
+    return restored
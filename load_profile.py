@@ -0,0 +1,103 @@
+"""
+Low-overhead page load profile for the Selenium scraper.
+
+A status probe only needs the page URL, title and a few DOM elements, but by
+default Chrome also downloads every image, sound, font and script the page
+references. The load profile trims that down:
+
+- Chrome's page load strategy is set to `eager` (return once the DOM is
+  ready) or `none` (return as soon as navigation starts) instead of waiting
+  for every subresource.
+- Images, media and fonts are blocked by URL through the DevTools
+  `Network.setBlockedURLs` command, set per probe so each instance can add
+  its own allow and deny rules.
+- Hosts other than the configured instances are made unresolvable for the
+  scraper's Chrome sessions, so third-party CDNs, analytics and embeds are
+  never contacted.
+"""
+import logging
+from urllib.parse import urlsplit
+
+log = logging.getLogger('portal.scraper')
+
+DEFAULT_SETTINGS = {
+    'page_load_strategy': 'eager',
+    'block': ['images', 'media', 'fonts'],
+    'block_third_party': True,
+}
+PAGE_LOAD_STRATEGIES = ('normal', 'eager', 'none')
+RESOURCE_EXTENSIONS = {
+    'images': ('png', 'jpg', 'jpeg', 'gif', 'webp', 'avif', 'svg', 'ico', 'bmp'),
+    'media': ('mp3', 'ogg', 'oga', 'opus', 'wav', 'flac', 'm4a', 'webm', 'mp4', 'm4v'),
+    'fonts': ('woff', 'woff2', 'ttf', 'otf', 'eot'),
+}
+
+# Bytes received for the document and every subresource it loaded
+PAGE_BYTES_SCRIPT = """
+    var entries = performance.getEntriesByType('navigation').concat(performance.getEntriesByType('resource'));
+    return entries.reduce(function (total, entry) { return total + (entry.transferSize || 0); }, 0);
+"""
+
+
+def resource_patterns(kind):
+    """Blocked-URL patterns matching files of a resource kind, with or without a query string."""
+    patterns = []
+    for extension in RESOURCE_EXTENSIONS[kind]:
+        patterns.append(f'*.{extension}')
+        patterns.append(f'*.{extension}?*')
+    return patterns
+
+
+def instance_rules(instance):
+    """The `load_profile` allow/deny rules of a configured instance."""
+    rules = instance.get('load_profile') or {}
+    return list(rules.get('allow') or []), list(rules.get('deny') or [])
+
+
+class LoadProfile:
+    def __init__(self):
+        self.configure(None)
+
+    def configure(self, settings):
+        """Apply the ``scraper.load_profile`` section of config.yaml."""
+        merged = dict(DEFAULT_SETTINGS)
+        merged.update(settings or {})
+        strategy = merged['page_load_strategy']
+        if strategy not in PAGE_LOAD_STRATEGIES:
+            log.warning("Unknown page_load_strategy %r, using 'eager'", strategy)
+            strategy = 'eager'
+        unknown = [kind for kind in merged['block'] if kind not in RESOURCE_EXTENSIONS]
+        if unknown:
+            log.warning("Ignoring unknown resource types in load_profile.block: %s", unknown)
+        self.page_load_strategy = strategy
+        self.block = [kind for kind in merged['block'] if kind in RESOURCE_EXTENSIONS]
+        self.block_third_party = bool(merged['block_third_party'])
+
+    def chrome_arguments(self, instances):
+        """
+        Extra Chrome command line arguments for the scraper's sessions. Only
+        the instances' own hosts, and hosts an instance allows, stay resolvable.
+        """
+        if not self.block_third_party:
+            return []
+        hosts = {'localhost'}
+        for instance in instances:
+            host = urlsplit(instance.get('url', '')).hostname
+            if host:
+                hosts.add(host)
+            allow, _ = instance_rules(instance)
+            hosts.update(rule for rule in allow if rule not in RESOURCE_EXTENSIONS)
+        rules = ', '.join(['MAP * ~NOTFOUND'] + [f'EXCLUDE {host}' for host in sorted(hosts)])
+        return [f'--host-resolver-rules={rules}']
+
+    def blocked_urls(self, instance):
+        """
+        URL patterns to block while probing `instance`: the blocked resource
+        types minus those it allows, plus its own deny patterns.
+        """
+        allow, deny = instance_rules(instance)
+        patterns = []
+        for kind in self.block:
+            if kind not in allow:
+                patterns.extend(resource_patterns(kind))
+        return patterns + deny
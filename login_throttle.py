@@ -0,0 +1,215 @@
+"""
+Admission control for password logins.
+
+Checking a password runs a deliberately slow key derivation function, so an
+unchecked burst of login attempts can use every CPU core and stall page
+requests and the probe scheduler. Each attempt therefore has to pass:
+
+1. a token bucket per client address (a few attempts per minute),
+2. a global token bucket shared by all clients, and
+3. a bounded queue in front of a small pool of hashing threads; attempts
+   that would make the queue longer than `max_queue` are turned away
+   instead of waiting.
+
+Rejected attempts never reach the hash function.
+
+With several worker processes (``shared`` set to the coordination database)
+the buckets are kept in that database and the queue and hashing threads are
+counted with lock files next to it, so the limits hold for the portal as a
+whole rather than once per worker.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from coordination import FileSemaphore
+
+DEFAULT_SETTINGS = {
+    'client_rate': 10,       # attempts per minute per client
+    'client_burst': 5,
+    'global_rate': 120,      # attempts per minute across all clients
+    'global_burst': 20,
+    'hash_workers': 1,
+    'max_queue': 8,
+}
+# Per-client buckets remembered at once; the least recently used are forgotten first
+MAX_CLIENTS = 10000
+# Shared buckets untouched for this long are full again and are dropped
+SHARED_BUCKET_TTL = 3600
+
+
+class LoginRejected(Exception):
+    """Raised when a login attempt is not admitted. `retry_after` is in seconds."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, rate_per_minute, burst, now):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = now
+
+    def take(self, now):
+        """Take a token. Returns 0 on success, otherwise the seconds until one is available."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else 60
+
+
+class LoginThrottle:
+    def __init__(self, clock=time.monotonic, shared=None):
+        # Shared buckets are compared across processes, so they need wall-clock time
+        self.clock = time.time if shared is not None and clock is time.monotonic else clock
+        self.shared = shared
+        self.settings = dict(DEFAULT_SETTINGS)
+        if shared is not None:
+            prefix = os.path.join(os.path.dirname(os.path.abspath(shared.path)), 'portal_login')
+            self._queue_slots = FileSemaphore(f'{prefix}_queue')
+            self._hash_slots = FileSemaphore(f'{prefix}_hash')
+        self._lock = threading.Lock()
+        self._clients = OrderedDict()
+        self._global = TokenBucket(float(self.settings['global_rate']), float(self.settings['global_burst']),
+                                   clock())
+        self._executor = None
+        self._executor_workers = None
+        self._queued = 0
+
+    def configure(self, settings):
+        """Apply the ``login`` section of config.yaml."""
+        merged = dict(DEFAULT_SETTINGS)
+        merged.update(settings or {})
+        with self._lock:
+            if merged == self.settings:
+                return
+            self.settings = merged
+            # Buckets pick up the new limits; existing per-client state starts over
+            self._clients.clear()
+            self._global = TokenBucket(float(merged['global_rate']), float(merged['global_burst']),
+                                       self.clock())
+
+    def queued(self):
+        """Attempts admitted by this process and waiting for, or running, a password check."""
+        with self._lock:
+            return self._queued
+
+    def _take_shared(self, client, settings, now):
+        client_key, global_key = f'login:client:{client}', 'login:global'
+
+        def take(states):
+            updated = {}
+            for key, rate, burst, reason in (
+                    (client_key, settings['client_rate'], settings['client_burst'], 'client_rate'),
+                    (global_key, settings['global_rate'], settings['global_burst'], 'global_rate')):
+                bucket = TokenBucket(float(rate), float(burst), now)
+                if states[key] is not None:
+                    bucket.tokens, bucket.updated = states[key]
+                wait = bucket.take(now)
+                if wait:
+                    # Raising rolls back the token already taken from the client bucket
+                    raise LoginRejected(reason, wait)
+                updated[key] = (bucket.tokens, bucket.updated)
+            return updated
+
+        self.shared.update_buckets((client_key, global_key), take, stale_before=now - SHARED_BUCKET_TTL)
+
+    def _admit(self, client):
+        settings = self.settings
+        now = self.clock()
+        if self.shared is not None:
+            self._take_shared(client, settings, now)
+            slot = self._queue_slots.try_acquire(int(settings['max_queue']))
+            if slot is None:
+                raise LoginRejected('queue_full', 1)
+            with self._lock:
+                self._queued += 1
+            return slot
+        with self._lock:
+            bucket = self._clients.get(client)
+            if bucket is None:
+                bucket = self._clients[client] = TokenBucket(
+                    float(settings['client_rate']), float(settings['client_burst']), now)
+                while len(self._clients) > MAX_CLIENTS:
+                    self._clients.popitem(last=False)
+            self._clients.move_to_end(client)
+            wait = bucket.take(now)
+            if wait:
+                raise LoginRejected('client_rate', wait)
+            wait = self._global.take(now)
+            if wait:
+                raise LoginRejected('global_rate', wait)
+            if self._queued >= int(settings['max_queue']):
+                raise LoginRejected('queue_full', 1)
+            self._queued += 1
+            workers = max(1, int(settings['hash_workers']))
+            if self._executor is None or self._executor_workers != workers:
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='login-hash')
+                self._executor_workers = workers
+            return self._executor
+
+    def _done(self, slot=None):
+        if slot is not None:
+            FileSemaphore.release(slot)
+        with self._lock:
+            self._queued -= 1
+
+    def _verify_shared(self, slot, check, submitted):
+        try:
+            hashing = self._hash_slots.acquire(max(1, int(self.settings['hash_workers'])))
+            try:
+                metrics.login_queue_wait.observe(time.perf_counter() - submitted)
+                return check()
+            finally:
+                FileSemaphore.release(hashing)
+        finally:
+            self._done(slot)
+
+    def verify(self, client, check):
+        """
+        Run `check()` (the password comparison) for `client` if the attempt
+        is admitted and return its result. Raises LoginRejected otherwise.
+        """
+        try:
+            admitted = self._admit(client)
+        except LoginRejected as e:
+            metrics.login_attempts.inc(outcome=f'rejected_{e.reason}')
+            raise
+        submitted = time.perf_counter()
+        if self.shared is not None:
+            # Admitted with a queue slot; this request thread waits for a hashing slot itself
+            result = self._verify_shared(admitted, check, submitted)
+            metrics.login_attempts.inc(outcome='success' if result else 'failure')
+            return result
+
+        def run():
+            metrics.login_queue_wait.observe(time.perf_counter() - submitted)
+            try:
+                return check()
+            finally:
+                self._done()
+
+        try:
+            future = admitted.submit(run)
+        except RuntimeError:
+            # The pool was replaced by a configuration change while we were admitted
+            self._done()
+            raise LoginRejected('queue_full', 1)
+        result = future.result()
+        metrics.login_attempts.inc(outcome='success' if result else 'failure')
+        return result
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
@@ -0,0 +1,138 @@
+"""
+Structured, non-blocking logging for the portal.
+
+Every module logs through a `portal.*` logger (e.g. `portal.scraper`). Records
+are put on an in-memory queue and written to stdout by a background thread,
+so request handlers and probe threads never block on a slow terminal or
+container log driver. Each line carries a timestamp, level and logger name,
+followed by the message and any `fields` passed in `extra`, either as text or
+as one JSON object per line.
+
+Messages that repeat with the same template (say, an unreachable instance on
+every probe) are sampled: only the first `sample_burst` of each template are
+written per `sample_interval` seconds, and the next one written says how many
+were dropped in between.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+
+DEFAULT_SETTINGS = {
+    'level': 'INFO',
+    'format': 'text',
+    'sample_interval': 60,
+    'sample_burst': 5,
+}
+# Records waiting to be written; beyond this they are dropped rather than blocking the caller
+QUEUE_SIZE = 10000
+
+root = logging.getLogger('portal')
+
+
+class SamplingFilter(logging.Filter):
+    """Pass at most `burst` records per message template every `interval` seconds."""
+
+    def __init__(self, interval, burst, clock=time.monotonic):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.clock = clock
+        self._lock = threading.Lock()
+        # (logger, template) -> [window start, records passed, records dropped]
+        self._windows = {}
+
+    def filter(self, record):
+        if self.interval <= 0 or record.levelno >= logging.ERROR:
+            return True
+        key = (record.name, record.msg)
+        now = self.clock()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                dropped = window[2] if window else 0
+                self._windows[key] = [now, 1, 0]
+                if len(self._windows) > 4096:
+                    # Forget templates that have gone quiet
+                    self._windows = {k: w for k, w in self._windows.items() if now - w[0] < self.interval}
+                if dropped:
+                    record.sampled = dropped
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+
+class StructuredFormatter(logging.Formatter):
+    def __init__(self, style='text'):
+        super().__init__()
+        self.style = style
+
+    def format(self, record):
+        fields = dict(getattr(record, 'fields', None) or {})
+        if getattr(record, 'sampled', 0):
+            fields['suppressed'] = record.sampled
+        message = record.getMessage()
+        if record.exc_info:
+            fields['exception'] = self.formatException(record.exc_info)
+        timestamp = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created))
+        timestamp += f'.{int(record.msecs):03d}'
+        if self.style == 'json':
+            entry = {'time': timestamp, 'level': record.levelname, 'logger': record.name,
+                     'message': message}
+            entry.update(fields)
+            return json.dumps(entry, default=str)
+        line = f'{timestamp} {record.levelname:<7} {record.name}: {message}'
+        if fields:
+            line += ' ' + ' '.join(f'{key}={value}' for key, value in fields.items())
+        return line
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full."""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+_lock = threading.Lock()
+_listener = None
+_output = None
+_sampler = None
+_settings = None
+
+
+def configure(settings=None):
+    """Set up (or update) portal logging from the ``logging`` section of config.yaml."""
+    global _listener, _output, _sampler, _settings
+    merged = dict(DEFAULT_SETTINGS)
+    merged.update(settings or {})
+    with _lock:
+        if merged == _settings:
+            return
+        _settings = merged
+        if _listener is None:
+            _output = logging.StreamHandler(sys.stdout)
+            log_queue = queue.Queue(QUEUE_SIZE)
+            _sampler = SamplingFilter(float(merged['sample_interval']), int(merged['sample_burst']))
+            handler = DroppingQueueHandler(log_queue)
+            handler.addFilter(_sampler)
+            root.addHandler(handler)
+            root.propagate = False
+            _listener = logging.handlers.QueueListener(log_queue, _output)
+            _listener.start()
+            atexit.register(_listener.stop)
+        _sampler.interval = float(merged['sample_interval'])
+        _sampler.burst = int(merged['sample_burst'])
+        _output.setFormatter(StructuredFormatter(merged['format']))
+        level = logging.getLevelName(str(merged['level']).upper())
+        root.setLevel(level if isinstance(level, int) else logging.INFO)
@@ -0,0 +1,222 @@
+"""
+Minimal Prometheus-style metrics registry.
+
+Counters, gauges and histograms with labels, rendered in the Prometheus text
+exposition format by `/metrics`. Collectors can be registered to report
+values owned by other components (e.g. the driver pool) at scrape time.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _add_label(sample, name, value):
+    """Add label `name` to a rendered sample line."""
+    label = _format_labels((name,), (value,))
+    brace, space = sample.find('{'), sample.find(' ')
+    if 0 <= brace < space:
+        return f'{sample[:brace + 1]}{label[1:-1]},{sample[brace + 1:]}'
+    return f'{sample[:space]}{label}{sample[space:]}'
+
+
+def merge_expositions(expositions):
+    """
+    Combine the rendered metrics of several processes (``{worker: text}``) into
+    one exposition, with a `worker` label on every sample to keep them apart.
+    """
+    families = {}
+    for worker, text in sorted(expositions.items()):
+        family = None
+        for line in text.splitlines():
+            if line.startswith('# '):
+                family = families.setdefault(line.split()[2], ([], []))
+                if line not in family[0]:
+                    family[0].append(line)
+            elif line and family is not None:
+                family[1].append(_add_label(line, 'worker', worker))
+    lines = []
+    for headers, samples in families.values():
+        lines.extend(headers)
+        lines.extend(samples)
+    return '\n'.join(lines) + '\n'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}'
+                                for key, value in items]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total, count))
+                           for key, (counts, total, count) in self._values.items())
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else _format_value(float(bound))
+                labels = _format_labels(self.label_names, key, ('le', le))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.label_names, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._add(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self._add(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def register_collector(self, collect):
+        """`collect()` is called at scrape time and returns extra exposition lines."""
+        with self._lock:
+            self._collectors.append(collect)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collect in collectors:
+            lines.extend(collect())
+        return '\n'.join(lines) + '\n'
+
+
+# Shared registry used throughout the portal
+registry = Registry()
+
+probe_duration = registry.histogram(
+    'portal_probe_duration_seconds', 'Total time to probe an instance.', ['instance'])
+probe_phase_duration = registry.histogram(
+    'portal_probe_phase_seconds',
+    'Time spent in each probe phase (http_probe, driver_startup, page_load, players_wait).',
+    ['instance', 'phase'])
+probe_bytes = registry.histogram(
+    'portal_probe_bytes', 'Bytes transferred by Chrome for a browser probe.', ['instance'],
+    buckets=(16e3, 64e3, 256e3, 1e6, 4e6, 16e6, 64e6))
+probe_outcomes = registry.counter(
+    'portal_probe_outcomes_total', 'Probe results by instance and status.', ['instance', 'status'])
+cycle_duration = registry.histogram(
+    'portal_refresh_cycle_seconds', 'Duration of refresh cycles that probed at least one instance.')
+probes_skipped = registry.counter(
+    'portal_refresh_probes_skipped_total',
+    'Due probes not started because the previous probe of the instance was still running.', ['instance'])
+storage_duration = registry.histogram(
+    'portal_storage_seconds', 'World history database load, flush, maintenance and migration time.',
+    ['operation'])
+request_duration = registry.histogram(
+    'portal_http_request_seconds', 'Portal API request latency by route.', ['route', 'method', 'status'])
+login_attempts = registry.counter(
+    'portal_login_attempts_total',
+    'Login attempts by outcome (success, failure, rejected_client_rate, rejected_global_rate, '
+    'rejected_queue_full).', ['outcome'])
+login_queue_wait = registry.histogram(
+    'portal_login_queue_seconds', 'Time admitted login attempts waited for a password hashing thread.')
+http_requests = registry.counter(
+    'portal_http_requests_total', 'Requests sent to Foundry instances, by origin.', ['origin'])
+http_connections = registry.counter(
+    'portal_http_connections_total', 'Connections opened to Foundry instances, by origin.', ['origin'])
+http_connect_duration = registry.histogram(
+    'portal_http_connect_seconds', 'Time to open a connection (TCP and TLS handshake), by origin.', ['origin'])
+page_cache = registry.counter(
+    'portal_page_cache_total', 'Home page requests by render cache result (hit, miss).', ['result'])
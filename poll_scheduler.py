@@ -0,0 +1,139 @@
+"""
+Adaptive per-instance polling schedule.
+
+Instead of probing every instance at one fixed rate, each instance gets its
+own next-due time based on what it was last seen doing: active instances are
+polled often, idle ones less, and offline or failing ones back off
+exponentially. After repeated failures an instance's circuit opens and it only
+receives a cheap reachability check until it answers again. Every interval is
+jittered so probes don't line up.
+"""
+import random
+import threading
+import time
+
+DEFAULT_SETTINGS = {
+    'active_interval': 10,
+    'online_interval': 30,
+    'offline_interval': 30,
+    'max_backoff': 900,
+    'failure_threshold': 3,
+    'jitter': 0.2,
+}
+
+
+class InstanceSchedule:
+    def __init__(self, url, due):
+        self.url = url
+        self.due = due
+        self.interval = 0
+        self.failures = 0
+        self.circuit_open = False
+        self.last_status = None
+
+
+class PollScheduler:
+    def __init__(self, clock=time.monotonic, rng=random.random):
+        self.clock = clock
+        self.rng = rng
+        self.settings = dict(DEFAULT_SETTINGS)
+        self._lock = threading.Lock()
+        self._schedules = {}
+
+    def configure(self, settings):
+        """Apply the ``polling`` section of config.yaml."""
+        merged = dict(DEFAULT_SETTINGS)
+        merged.update(settings or {})
+        self.settings = merged
+
+    def sync(self, instances):
+        """Track exactly the configured instances; new or re-pointed ones are due now."""
+        now = self.clock()
+        with self._lock:
+            wanted = {instance['name']: instance['url'] for instance in instances}
+            for name in list(self._schedules):
+                if name not in wanted:
+                    del self._schedules[name]
+            for name, url in wanted.items():
+                schedule = self._schedules.get(name)
+                if schedule is None or schedule.url != url:
+                    self._schedules[name] = InstanceSchedule(url, now)
+
+    def claim_due(self, hold):
+        """
+        Names of instances due for a probe. Claimed instances aren't offered
+        again for `hold` seconds unless `record` reschedules them first.
+        """
+        now = self.clock()
+        with self._lock:
+            due = [name for name, schedule in self._schedules.items() if schedule.due <= now]
+            for name in due:
+                self._schedules[name].due = now + hold
+        return due
+
+    def _jittered(self, interval):
+        jitter = float(self.settings['jitter'])
+        return interval * (1 + jitter * (2 * self.rng() - 1))
+
+    def record(self, name, status):
+        """Reschedule `name` after a probe. `status` is None if the probe failed."""
+        now = self.clock()
+        settings = self.settings
+        with self._lock:
+            schedule = self._schedules.get(name)
+            if schedule is None:
+                return
+            failed = status is None or status == 'offline'
+
+            if failed:
+                schedule.failures += 1
+                if schedule.failures >= int(settings['failure_threshold']):
+                    schedule.circuit_open = True
+                interval = min(float(settings['offline_interval']) * 2 ** min(schedule.failures - 1, 16),
+                               float(settings['max_backoff']))
+            elif schedule.circuit_open:
+                # Half-open check succeeded: close the circuit and do a full probe right away
+                schedule.circuit_open = False
+                schedule.failures = 0
+                interval = 0
+            else:
+                schedule.failures = 0
+                interval = float(settings['active_interval'] if status == 'active'
+                                 else settings['online_interval'])
+
+            schedule.last_status = status
+            schedule.interval = interval
+            schedule.due = now + (self._jittered(interval) if interval else 0)
+
+    def request_refresh(self, name):
+        """
+        Make `name` due immediately for a full probe. Returns False if it
+        isn't configured.
+        """
+        with self._lock:
+            schedule = self._schedules.get(name)
+            if schedule is None:
+                return False
+            schedule.circuit_open = False
+            schedule.due = self.clock()
+            return True
+
+    def is_circuit_open(self, name):
+        with self._lock:
+            schedule = self._schedules.get(name)
+            return bool(schedule and schedule.circuit_open)
+
+    def snapshot(self):
+        """Per-instance schedule state, with seconds until the next probe."""
+        now = self.clock()
+        with self._lock:
+            return {
+                name: {
+                    'next_probe_in': max(0, round(schedule.due - now, 1)),
+                    'interval': round(schedule.interval, 1),
+                    'failures': schedule.failures,
+                    'circuit_open': schedule.circuit_open,
+                    'last_status': schedule.last_status,
+                }
+                for name, schedule in self._schedules.items()
+            }
@@ -0,0 +1,127 @@
+"""
+Concurrent refresh engine for instance status probes.
+
+A cycle probes a batch of instances on a bounded pool of worker threads.
+Each probe is given a per-instance deadline and the cycle as a whole stops
+waiting once the cycle deadline passes, so one slow instance can no longer hold
+up everybody else. Results are handed to the caller as soon as each instance
+finishes.
+
+Cycles may overlap and share the worker pool: the scheduler starts one for
+whatever came due without waiting for earlier ones to finish, and an instance
+still being probed by an earlier cycle is skipped rather than probed twice.
+"""
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+log = logging.getLogger('portal.refresh')
+
+DEFAULT_WORKERS = 4
+DEFAULT_INSTANCE_DEADLINE = 20
+DEFAULT_CYCLE_DEADLINE = 30
+
+
+class RefreshEngine:
+    """
+    Runs probe cycles over a list of instances.
+
+    ``probe(instance, deadline)`` must return the probe result for a single
+    instance and should give up after ``deadline`` seconds. It runs with a
+    copy of the context `run` was called in. ``on_result(index, instance,
+    result)`` is called once per finished instance, serialized across all
+    cycles, for as long as its cycle is running.
+    """
+
+    def __init__(self, probe, workers=DEFAULT_WORKERS,
+                 instance_deadline=DEFAULT_INSTANCE_DEADLINE,
+                 cycle_deadline=DEFAULT_CYCLE_DEADLINE):
+        self.probe = probe
+        self.workers = workers
+        self.instance_deadline = instance_deadline
+        self.cycle_deadline = cycle_deadline
+        self._executor = None
+        self._executor_workers = None
+        self._executor_lock = threading.Lock()
+        self._result_lock = threading.Lock()
+        self._in_flight = set()
+        self._in_flight_lock = threading.Lock()
+
+    def configure(self, settings):
+        """Apply the ``scraper`` section of config.yaml."""
+        settings = settings or {}
+        self.workers = max(1, int(settings.get('workers', DEFAULT_WORKERS)))
+        self.instance_deadline = float(settings.get('instance_deadline', DEFAULT_INSTANCE_DEADLINE))
+        self.cycle_deadline = float(settings.get('cycle_deadline', DEFAULT_CYCLE_DEADLINE))
+
+    def _get_executor(self):
+        with self._executor_lock:
+            if self._executor is None or self._executor_workers != self.workers:
+                if self._executor is not None:
+                    # Let probes already queued on the old pool finish on their own
+                    self._executor.shutdown(wait=False)
+                self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                    thread_name_prefix='probe')
+                self._executor_workers = self.workers
+            return self._executor
+
+    def _run_probe(self, instance):
+        try:
+            return self.probe(instance, self.instance_deadline)
+        finally:
+            with self._in_flight_lock:
+                self._in_flight.discard(instance['url'])
+
+    def run(self, instances, on_result):
+        """
+        Probe ``instances`` and report each result through ``on_result``.
+        Returns a summary dict once every probe finished or the cycle deadline passed.
+        """
+        started = time.monotonic()
+        cycle_ends = started + self.cycle_deadline
+        executor = self._get_executor()
+
+        futures = {}
+        skipped = []
+        for index, instance in enumerate(instances):
+            with self._in_flight_lock:
+                # Still being probed by an earlier cycle
+                if instance['url'] in self._in_flight:
+                    skipped.append(instance['name'])
+                    continue
+                self._in_flight.add(instance['url'])
+            futures[executor.submit(contextvars.copy_context().run, self._run_probe, instance)] = (index, instance)
+
+        completed = 0
+        failed = []
+        pending = set(futures)
+        while pending:
+            remaining = cycle_ends - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, instance = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    log.error("Probe for %s failed: %s", instance['name'], e)
+                    failed.append(instance['name'])
+                    continue
+                with self._result_lock:
+                    on_result(index, instance, result)
+                completed += 1
+
+        return {
+            'duration': time.monotonic() - started,
+            'completed': completed,
+            'failed': failed,
+            'timed_out': [futures[future][1]['name'] for future in pending],
+            'skipped': skipped,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
@@ -0,0 +1,103 @@
+"""
+Progress tracking for refreshes requested by saving the configuration.
+
+Saving the config no longer probes anything itself: it marks the new or
+changed instances as due, so the next scheduler tick probes them along with
+whatever else is due, and returns the ID of a job that follows those
+instances. Each instance in a job is completed by the first probe of it that
+started after the job was created, whichever cycle that probe belonged to.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Finished and unfinished jobs kept for /api/refresh/<id>
+MAX_JOBS = 100
+# Seconds before a job's instances are checked against the configuration
+CONFIG_GRACE = 5
+
+
+class RefreshJob:
+    def __init__(self, job_id, names, created):
+        self.id = job_id
+        self.created = created
+        self.finished = None if names else created
+        self.instances = OrderedDict((name, {'state': 'pending', 'status': None}) for name in names)
+
+    def complete(self, name, state, status, now):
+        entry = self.instances.get(name)
+        if entry is None or entry['state'] != 'pending':
+            return
+        entry['state'] = state
+        entry['status'] = status
+        if all(entry['state'] != 'pending' for entry in self.instances.values()):
+            self.finished = now
+
+    def view(self, now):
+        done = sum(entry['state'] != 'pending' for entry in self.instances.values())
+        return {
+            'id': self.id,
+            'created': self.created,
+            'state': 'done' if self.finished is not None else 'running',
+            'completed': done,
+            'total': len(self.instances),
+            'elapsed': round((self.finished or now) - self.created, 1),
+            'instances': {name: dict(entry) for name, entry in self.instances.items()},
+        }
+
+
+class RefreshJobs:
+    def __init__(self, clock=time.time, max_jobs=MAX_JOBS):
+        self.clock = clock
+        self.max_jobs = max_jobs
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+
+    def create(self, names):
+        """Start following `names`. Returns the new job's ID."""
+        with self._lock:
+            # Random so that IDs from different workers never collide
+            job_id = uuid.uuid4().hex[:12]
+            self._add(RefreshJob(job_id, list(names), self.clock()))
+            return job_id
+
+    def add(self, job_id, names, created):
+        """Follow a job created by another worker under its original ID."""
+        with self._lock:
+            if job_id not in self._jobs:
+                self._add(RefreshJob(job_id, list(names), created))
+
+    def _add(self, job):
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.max_jobs:
+            self._jobs.popitem(last=False)
+
+    def complete(self, name, status, started):
+        """
+        Record a probe of `name` that started at `started` and ended with
+        `status` ('failed' or 'timeout' if it produced no result).
+        """
+        now = self.clock()
+        state = 'failed' if status in ('failed', 'timeout') else 'done'
+        with self._lock:
+            for job in self._jobs.values():
+                if job.finished is None and started >= job.created:
+                    job.complete(name, state, status, now)
+
+    def sync(self, names):
+        """Stop waiting for instances that are no longer configured."""
+        now = self.clock()
+        with self._lock:
+            for job in self._jobs.values():
+                # Other workers may not have re-read the config that created a new job yet
+                if job.finished is None and now - job.created >= CONFIG_GRACE:
+                    for name in list(job.instances):
+                        if name not in names:
+                            job.complete(name, 'removed', None, now)
+
+    def get(self, job_id):
+        """Progress of job `job_id`, or None if it is unknown or expired."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.view(self.clock()) if job is not None else None
@@ -1,5 +1,7 @@
 document.addEventListener('DOMContentLoaded', () => {
     const sharedDataMode = document.getElementById('main-script').getAttribute('data-shared-data-mode') === 'true';
+    const defaultBackground = document.getElementById('main-script').getAttribute('data-default-background')
+        || '/static/images/background.jpg';
     const state = window.portalState || {};
 
     // --- Modal Elements ---
@@ -83,7 +85,7 @@ document.addEventListener('DOMContentLoaded', () => {
                         openConfigModal();
                     }
                 } else {
-                    alert('Invalid password');
+                    alert(loginErrorMessage(response));
                 }
             } catch (err) {
                 console.error(err);
@@ -109,7 +111,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 if (response.ok) {
                     location.reload();
                 } else {
-                    alert('Invalid password');
+                    alert(loginErrorMessage(response));
                 }
             } catch (err) {
                 console.error(err);
@@ -161,6 +163,15 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // --- Helper Functions ---
 
+    function loginErrorMessage(response) {
+        // 429/503: the server is limiting login attempts
+        if (response.status === 429 || response.status === 503) {
+            const retryAfter = response.headers.get('Retry-After');
+            return `Too many login attempts, try again${retryAfter ? ` in ${retryAfter} seconds` : ' later'}`;
+        }
+        return 'Invalid password';
+    }
+
     function openLoginModal() {
         loginModal.style.display = 'block';
         document.getElementById('login-password').value = '';
@@ -199,6 +210,9 @@ document.addEventListener('DOMContentLoaded', () => {
         const container = document.getElementById('instances-container');
         const div = document.createElement('div');
         div.className = 'instance-row form-group';
+        // Keep settings the form doesn't edit (e.g. probe mode) across saves
+        const { name, url, ...extra } = data;
+        div.dataset.extra = JSON.stringify(extra);
         div.innerHTML = `
             <input type="text" placeholder="Name" value="${data.name}" class="instance-name" required>
             <input type="url" placeholder="URL" value="${data.url}" class="instance-url" required>
@@ -215,56 +229,107 @@ document.addEventListener('DOMContentLoaded', () => {
     function getInstancesFromDOM() {
         const rows = document.querySelectorAll('.instance-row');
         return Array.from(rows).map(row => ({
+            ...JSON.parse(row.dataset.extra || '{}'),
             name: row.querySelector('.instance-name').value,
             url: row.querySelector('.instance-url').value
         }));
     }
 
-    // --- Polling for Status (Existing Logic) ---
-    function fetchStatus() {
-        if (state.viewerLocked || !state.isConfigured) return;
+    // Instance cards by instance name, patched in place on every update
+    const instanceCards = new Map();
+
+    function createInstanceCard() {
+        const card = document.createElement('div');
+        const info = document.createElement('div');
+        info.className = 'instance-info-container';
+        const header = document.createElement('div');
+        header.className = 'instance-header';
+        const indicator = document.createElement('span');
+        const name = document.createElement('h3');
+        header.append(indicator, name);
+        const urlLine = document.createElement('p');
+        urlLine.className = 'instance-url';
+        const link = document.createElement('a');
+        link.target = '_blank';
+        urlLine.appendChild(link);
+        info.append(header, urlLine);
+        card.appendChild(info);
+        return { card, indicator, name, link, instance: null };
+    }
 
-        fetch('/api/instance-status')
-            .then(response => response.json())
-            .then(data => {
-                updateDashboard(data);
-            })
-            .catch(error => console.error('Error fetching status:', error));
+    function patchInstanceCard(entry, instance) {
+        const previous = entry.instance || {};
+        entry.instance = instance;
+        const { card } = entry;
+
+        const className = `instance-card ${instance.status}${instance.stale ? ' stale' : ''}`;
+        if (card.className !== className) {
+            card.className = className;
+            entry.indicator.className = `status-indicator ${instance.status}`;
+        }
+        // Restored from before a restart; not probed again yet
+        const title = instance.stale
+            ? `Last known status from ${formatRelativeTime(instance.stale_since, false)}` : '';
+        if (card.title !== title) card.title = title;
+        if (previous.name !== instance.name) entry.name.textContent = instance.name;
+        if (previous.url !== instance.url) {
+            entry.link.href = instance.url;
+            entry.link.textContent = instance.url;
+        }
+
+        if (instance.background && (previous.background !== instance.background || previous.url !== instance.url)) {
+            const backgroundUrl = instance.background.startsWith('/')
+                ? new URL(instance.url).origin + instance.background
+                : instance.url + instance.background;
+            card.style.backgroundImage = `url('${backgroundUrl}')`;
+            card.style.backgroundSize = 'cover';
+            card.style.backgroundPosition = 'center';
+        } else if (!instance.background && previous.background) {
+            card.style.backgroundImage = '';
+        }
+    }
+
+    // Put `nodes` into `container` in order, moving only the ones that are out of place
+    function reconcileOrder(container, nodes) {
+        let cursor = container.firstChild;
+        nodes.forEach(node => {
+            if (node === cursor) {
+                cursor = cursor.nextSibling;
+            } else {
+                container.insertBefore(node, cursor);
+            }
+        });
     }
 
     function updateDashboard(instances) {
         const instanceList = document.getElementById('instance-list');
-        instanceList.innerHTML = '';
 
         // Store instances for world card click handling
         window.instanceCache = instances;
 
-        instances.forEach(instance => {
-            // Update Instance List
-            const instanceCard = document.createElement('div');
-            instanceCard.className = `instance-card ${instance.status}`;
-
-            // Add background image if available
-            if (instance.background) {
-                const backgroundUrl = instance.background.startsWith('/')
-                    ? new URL(instance.url).origin + instance.background
-                    : instance.url + instance.background;
-                instanceCard.style.backgroundImage = `url('${backgroundUrl}')`;
-                instanceCard.style.backgroundSize = 'cover';
-                instanceCard.style.backgroundPosition = 'center';
+        const seen = new Set();
+        const cards = instances.map(instance => {
+            let entry = instanceCards.get(instance.name);
+            if (!entry) {
+                entry = createInstanceCard();
+                instanceCards.set(instance.name, entry);
             }
-
-            instanceCard.innerHTML = `
-                <div class="instance-info-container">
-                    <div class="instance-header">
-                        <span class="status-indicator ${instance.status}"></span>
-                        <h3>${instance.name}</h3>
-                    </div>
-                    <p class="instance-url"><a href="${instance.url}" target="_blank">${instance.url}</a></p>
-                </div>
-            `;
-            instanceList.appendChild(instanceCard);
+            if (entry.instance !== instance) {
+                patchInstanceCard(entry, instance);
+            }
+            seen.add(instance.name);
+            return entry.card;
         });
+        instanceCards.forEach((entry, name) => {
+            if (!seen.has(name)) {
+                entry.card.remove();
+                instanceCards.delete(name);
+            }
+        });
+        reconcileOrder(instanceList, cards);
+
+        // Player counts shown on active world cards come from the instances
+        worldCards.forEach(entry => patchWorldPlayers(entry));
     }
 
     // --- Worlds Management ---
@@ -301,34 +366,72 @@ document.addEventListener('DOMContentLoaded', () => {
         return `${diffMonths} month${diffMonths !== 1 ? 's' : ''} ago`;
     }
 
-    function loadWorldBackground(card, cachedUrl, instanceUrl) {
-        if (!cachedUrl) {
-            card.style.backgroundImage = 'url(/static/images/background.jpg)';
-            return;
-        }
+    // Background URL -> 'loading' | 'loaded' | 'failed', so each image is requested once per page
+    const backgroundStates = new Map();
+    const backgroundWaiters = new Map();
 
-        // Resolve URL
-        let fullUrl;
-        if (cachedUrl.startsWith('http')) {
-            fullUrl = cachedUrl;
-        } else if (cachedUrl.startsWith('/')) {
-            fullUrl = new URL(instanceUrl).origin + cachedUrl;
-        } else {
-            fullUrl = instanceUrl + '/' + cachedUrl;
+    function resolveWorldBackground(world) {
+        const cachedUrl = world.cached_background_url;
+        const instanceUrl = world.instance_url;
+        if (!cachedUrl) return defaultBackground;
+
+        // Prefer the portal's cached thumbnail over the full image on the instance
+        if (world.background_thumbnail) return world.background_thumbnail;
+        if (cachedUrl.startsWith('http')) return cachedUrl;
+        if (cachedUrl.startsWith('/')) return new URL(instanceUrl).origin + cachedUrl;
+        return instanceUrl + '/' + cachedUrl;
+    }
+
+    function showBackground(card, url) {
+        const loadState = backgroundStates.get(url);
+        const shown = loadState === 'failed' ? defaultBackground : url;
+        card.style.backgroundImage = `url('${shown}')`;
+    }
+
+    function loadWorldBackground(card, world) {
+        const url = resolveWorldBackground(world);
+        if (card.dataset.background === url) return;
+        card.dataset.background = url;
+
+        const loadState = backgroundStates.get(url);
+        if (url === defaultBackground || loadState === 'loaded' || loadState === 'failed') {
+            showBackground(card, url);
+            return;
         }
+        // Cards waiting for the same URL share a single request
+        if (!backgroundWaiters.has(url)) backgroundWaiters.set(url, new Set());
+        backgroundWaiters.get(url).add(card);
+        if (loadState === 'loading') return;
 
-        // Try to load the image
+        backgroundStates.set(url, 'loading');
         const img = new Image();
-        img.onload = () => {
-            card.style.backgroundImage = `url('${fullUrl}')`;
-        };
-        img.onerror = () => {
-            // Fallback to placeholder
-            card.style.backgroundImage = 'url(/static/images/background.jpg)';
+        const settle = (result) => {
+            backgroundStates.set(url, result);
+            (backgroundWaiters.get(url) || []).forEach(waiting => {
+                if (waiting.dataset.background === url) showBackground(waiting, url);
+            });
+            backgroundWaiters.delete(url);
         };
-        img.src = fullUrl;
+        img.onload = () => settle('loaded');
+        img.onerror = () => settle('failed');  // Fallback to placeholder
+        img.src = url;
     }
 
+    // Backgrounds are only fetched for cards near the viewport
+    const backgroundObserver = window.IntersectionObserver
+        ? new IntersectionObserver(entries => {
+            entries.forEach(observed => {
+                if (!observed.isIntersecting) return;
+                backgroundObserver.unobserve(observed.target);
+                const entry = worldCardsByNode.get(observed.target);
+                if (entry) {
+                    entry.visible = true;
+                    loadWorldBackground(entry.card, entry.world);
+                }
+            });
+        }, { rootMargin: '200px' })
+        : null;
+
     function getStatusTooltip(status) {
         const tooltips = {
             'active': 'World is currently running',
@@ -338,94 +441,151 @@ document.addEventListener('DOMContentLoaded', () => {
         return tooltips[status] || 'Unknown status';
     }
 
-    function updateWorldsGallery(worlds) {
-        const worldsGallery = document.getElementById('worlds-gallery');
+    // World cards by world key (instance::world), patched in place on every update
+    const worldCards = new Map();
+    const worldCardsByNode = new WeakMap();
+    let worldSearchQuery = '';
 
-        // Check if data has actually changed to avoid unnecessary re-renders
-        const currentWorldsJson = JSON.stringify(worlds);
-        if (window.lastWorldsJson === currentWorldsJson) {
-            return; // No changes, skip update
-        }
-        window.lastWorldsJson = currentWorldsJson;
+    function worldKey(world) {
+        return `${world.instance_name}::${world.name}`;
+    }
 
-        worldsGallery.innerHTML = '';
+    function createWorldCard(world) {
+        const card = document.createElement('div');
+        const statusDot = document.createElement('span');
+        card.appendChild(statusDot);
+
+        const playIcon = document.createElement('i');
+        playIcon.className = 'fas fa-play-circle play-icon';
+
+        // World info container
+        const info = document.createElement('div');
+        info.className = 'world-info';
+        const name = document.createElement('h3');
+        const instanceInfo = document.createElement('p');
+        instanceInfo.className = 'world-instance';
+        const timeInfo = document.createElement('p');
+        timeInfo.className = 'world-time';
+        const playerInfo = document.createElement('p');
+        playerInfo.className = 'world-players';
+        info.append(name, instanceInfo, timeInfo);
+        card.appendChild(info);
+
+        const entry = { card, statusDot, playIcon, name, instanceInfo, timeInfo, playerInfo,
+                        world: null, visible: !backgroundObserver };
+
+        card.addEventListener('click', () => {
+            if (entry.world.status === 'active') {
+                window.open(`${entry.world.instance_url}/join`, '_blank');
+            }
+        });
 
-        if (worlds.length === 0) {
-            worldsGallery.innerHTML = '<p class="no-worlds">No worlds discovered yet.</p>';
-            return;
+        // Admin delete button
+        if (state.isAdmin) {
+            const deleteBtn = document.createElement('button');
+            deleteBtn.className = 'delete-world';
+            deleteBtn.innerHTML = '&times;';
+            deleteBtn.title = 'Remove from history';
+            deleteBtn.addEventListener('click', (e) => {
+                e.stopPropagation();
+                deleteWorldFromHistory(entry.world);
+            });
+            card.appendChild(deleteBtn);
         }
 
-        worlds.forEach(world => {
-            const worldCard = document.createElement('div');
-            worldCard.className = `world-card ${world.status}`;
-            worldCard.setAttribute('data-world-name', world.name.toLowerCase());
+        worldCardsByNode.set(card, entry);
+        if (backgroundObserver) backgroundObserver.observe(card);
+        return entry;
+    }
 
-            // Load background with fallback chain
-            loadWorldBackground(worldCard, world.cached_background_url, world.instance_url);
+    function patchWorldPlayers(entry) {
+        // Show players only for active worlds
+        let players = null;
+        if (entry.world.status === 'active') {
+            const instance = window.instanceCache?.find(i => i.name === entry.world.instance_name);
+            if (instance && instance.active_world && instance.active_world.name === entry.world.name) {
+                players = `Players: ${instance.active_world.players}`;
+            }
+        }
+        if (players === null) {
+            entry.playerInfo.remove();
+        } else {
+            if (entry.playerInfo.textContent !== players) entry.playerInfo.textContent = players;
+            if (!entry.playerInfo.parentNode) entry.timeInfo.after(entry.playerInfo);
+        }
+    }
 
-            // Status indicator
-            const statusDot = document.createElement('span');
-            statusDot.className = `world-status ${world.status}`;
-            statusDot.title = getStatusTooltip(world.status);
-            worldCard.appendChild(statusDot);
+    function patchWorldCard(entry, world) {
+        const previous = entry.world || {};
+        entry.world = world;
+        const { card } = entry;
 
+        if (previous.status !== world.status) {
+            card.className = `world-card ${world.status}`;
+            entry.statusDot.className = `world-status ${world.status}`;
+            entry.statusDot.title = getStatusTooltip(world.status);
             // Play icon for active worlds
             if (world.status === 'active') {
-                const playIcon = document.createElement('i');
-                playIcon.className = 'fas fa-play-circle play-icon';
-                worldCard.appendChild(playIcon);
-
-                worldCard.addEventListener('click', () => {
-                    window.open(`${world.instance_url}/join`, '_blank');
-                });
+                entry.statusDot.after(entry.playIcon);
+            } else {
+                entry.playIcon.remove();
             }
+        }
+        if (previous.name !== world.name) {
+            entry.name.textContent = world.name;
+            card.setAttribute('data-world-name', world.name.toLowerCase());
+            card.style.display = matchesSearch(card) ? '' : 'none';
+        }
+        if (previous.instance_name !== world.instance_name) {
+            entry.instanceInfo.textContent = `on ${world.instance_name}`;
+        }
+        const time = formatRelativeTime(world.last_seen, world.status === 'active');
+        if (entry.timeInfo.textContent !== time) entry.timeInfo.textContent = time;
+        patchWorldPlayers(entry);
 
-            // World info container
-            const infoContainer = document.createElement('div');
-            infoContainer.className = 'world-info';
-
-            const worldName = document.createElement('h3');
-            worldName.textContent = world.name;
-            infoContainer.appendChild(worldName);
-
-            const instanceInfo = document.createElement('p');
-            instanceInfo.className = 'world-instance';
-            instanceInfo.textContent = `on ${world.instance_name}`;
-            infoContainer.appendChild(instanceInfo);
+        // Load background with fallback chain, reusing images that are already loaded
+        if (entry.visible) loadWorldBackground(card, world);
+    }
 
-            const timeInfo = document.createElement('p');
-            timeInfo.className = 'world-time';
-            timeInfo.textContent = formatRelativeTime(world.last_seen, world.status === 'active');
-            infoContainer.appendChild(timeInfo);
+    function updateWorldsGallery(worlds) {
+        const worldsGallery = document.getElementById('worlds-gallery');
 
-            // Show players only for active worlds
-            if (world.status === 'active') {
-                const instance = window.instanceCache?.find(i => i.name === world.instance_name);
-                if (instance && instance.active_world && instance.active_world.name === world.name) {
-                    const playerInfo = document.createElement('p');
-                    playerInfo.className = 'world-players';
-                    playerInfo.textContent = `Players: ${instance.active_world.players}`;
-                    infoContainer.appendChild(playerInfo);
-                }
+        if (worlds.length === 0) {
+            if (!worldCards.size && worldsGallery.querySelector('.no-worlds')) return;
+            if (backgroundObserver) backgroundObserver.disconnect();
+            worldCards.clear();
+            worldsGallery.innerHTML = '<p class="no-worlds">No worlds discovered yet.</p>';
+            return;
+        }
+        const placeholder = worldsGallery.querySelector('.no-worlds');
+        if (placeholder) placeholder.remove();
+
+        const seen = new Set();
+        const fresh = document.createDocumentFragment();
+        const cards = worlds.map(world => {
+            const key = worldKey(world);
+            let entry = worldCards.get(key);
+            if (!entry) {
+                entry = createWorldCard(world);
+                worldCards.set(key, entry);
+                fresh.appendChild(entry.card);
             }
-
-            worldCard.appendChild(infoContainer);
-
-            // Admin delete button
-            if (state.isAdmin) {
-                const deleteBtn = document.createElement('button');
-                deleteBtn.className = 'delete-world';
-                deleteBtn.innerHTML = '&times;';
-                deleteBtn.title = 'Remove from history';
-                deleteBtn.addEventListener('click', (e) => {
-                    e.stopPropagation();
-                    deleteWorldFromHistory(world);
-                });
-                worldCard.appendChild(deleteBtn);
+            if (entry.world !== world) {
+                patchWorldCard(entry, world);
             }
-
-            worldsGallery.appendChild(worldCard);
+            seen.add(key);
+            return entry.card;
         });
+        worldCards.forEach((entry, key) => {
+            if (!seen.has(key)) {
+                if (backgroundObserver) backgroundObserver.unobserve(entry.card);
+                entry.card.remove();
+                worldCards.delete(key);
+            }
+        });
+        // New cards go in with one insertion, then everything is put in order
+        worldsGallery.appendChild(fresh);
+        reconcileOrder(worldsGallery, cards);
     }
 
     function deleteWorldFromHistory(world) {
@@ -452,28 +612,177 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     // Real-time search filter
+    function matchesSearch(card) {
+        const worldName = card.getAttribute('data-world-name');
+        return !worldSearchQuery || Boolean(worldName && worldName.includes(worldSearchQuery));
+    }
+
     const searchInput = document.getElementById('world-search');
     if (searchInput) {
         searchInput.addEventListener('input', (e) => {
-            const query = e.target.value.toLowerCase();
-            const worldCards = document.querySelectorAll('.world-card');
+            worldSearchQuery = e.target.value.toLowerCase();
+            worldCards.forEach(({ card }) => {
+                const display = matchesSearch(card) ? '' : 'none';
+                if (card.style.display !== display) card.style.display = display;
+            });
+        });
+    }
+    // --- Live Updates ---
+
+    // Milliseconds a tab may stay hidden before it stops receiving updates
+    const HIDDEN_DISCONNECT_DELAY = 30000;
+    const POLL_INTERVAL = 5000;
+    // Multi-worker servers don't stream (see /api/events), so the page polls from the start
+    let usePolling = !window.EventSource || state.eventStream === false;
+    let eventSource = null;
+    let pollTimer = null;
+    let hiddenTimer = null;
+    // State version token (`<epoch>:<n>`) the dashboard reflects, for /api/changes?since=
+    let stateVersion = null;
+
+    function oldestVersion(tokens) {
+        // Both full responses must come from the same epoch; otherwise resync on the next poll
+        const parsed = tokens.map(token => (token || '').split(':'));
+        const epoch = parsed[0][0];
+        const numbers = parsed.map(([, number]) => parseInt(number, 10));
+        if (!epoch || parsed.some(([other]) => other !== epoch) || numbers.some(isNaN)) return null;
+        return `${epoch}:${Math.min(...numbers)}`;
+    }
 
-            worldCards.forEach(card => {
-                const worldName = card.getAttribute('data-world-name');
-                if (worldName && worldName.includes(query)) {
-                    card.style.display = '';
-                } else {
-                    card.style.display = 'none';
+    function resyncState() {
+        return Promise.all([fetch('/api/instance-status'), fetch('/api/worlds')])
+            .then(async ([statusResponse, worldsResponse]) => {
+                const versions = [statusResponse, worldsResponse]
+                    .map(response => response.headers.get('X-State-Version'));
+                updateDashboard(await statusResponse.json());
+                const worlds = await worldsResponse.json();
+                window.allWorlds = worlds;  // Store for search filtering
+                updateWorldsGallery(worlds);
+                stateVersion = oldestVersion(versions);
+            })
+            .catch(error => console.error('Error fetching dashboard state:', error));
+    }
+
+    function sortWorlds(worlds) {
+        // Same order as the server: active, idle, offline, then most recently seen
+        const statusPriority = { active: 0, idle: 1, offline: 2 };
+        return worlds.sort((a, b) => {
+            const priority = (statusPriority[a.status] ?? 2) - (statusPriority[b.status] ?? 2);
+            return priority || new Date(b.last_seen || 0) - new Date(a.last_seen || 0);
+        });
+    }
+
+    function applyChanges(changes) {
+        const instanceChanges = changes.instances;
+        if (Object.keys(instanceChanges.changed).length || instanceChanges.removed.length) {
+            const byName = new Map((window.instanceCache || []).map(instance => [instance.name, instance]));
+            instanceChanges.removed.forEach(name => byName.delete(name));
+            Object.entries(instanceChanges.changed).forEach(([name, instance]) => byName.set(name, instance));
+            updateDashboard(changes.instance_order.filter(name => byName.has(name)).map(name => byName.get(name)));
+        }
+
+        const worldChanges = changes.worlds;
+        if (Object.keys(worldChanges.changed).length || worldChanges.removed.length) {
+            const byKey = new Map((window.allWorlds || []).map(world => [`${world.instance_name}::${world.name}`, world]));
+            worldChanges.removed.forEach(key => byKey.delete(key));
+            Object.entries(worldChanges.changed).forEach(([key, world]) => byKey.set(key, world));
+            const worlds = sortWorlds(Array.from(byKey.values()));
+            window.allWorlds = worlds;
+            updateWorldsGallery(worlds);
+        }
+    }
+
+    function fetchChanges() {
+        if (state.viewerLocked || !state.isConfigured) return;
+        if (stateVersion === null) {
+            resyncState();
+            return;
+        }
+
+        fetch(`/api/changes?since=${encodeURIComponent(stateVersion)}`)
+            .then(response => response.json())
+            .then(changes => {
+                if (changes.resync) {
+                    return resyncState();
                 }
-            });
+                applyChanges(changes);
+                stateVersion = changes.version;
+            })
+            .catch(error => console.error('Error fetching changes:', error));
+    }
+
+    function schedulePoll() {
+        clearTimeout(pollTimer);
+        // Only entries that changed since the last poll are transferred
+        pollTimer = setTimeout(() => {
+            fetchChanges();
+            schedulePoll();
+        }, POLL_INTERVAL);
+    }
+
+    function startPolling() {
+        if (pollTimer !== null) return;
+        if (stateVersion === null) {
+            resyncState();
+        } else {
+            fetchChanges();  // Catch up on anything missed while disconnected
+        }
+        schedulePoll();
+    }
+
+    // Prefer server-pushed updates; fall back to polling if streaming isn't available
+    function openStream() {
+        if (eventSource) return;
+        // A new stream starts with the current instance list and world history
+        const source = eventSource = new EventSource('/api/events');
+        source.addEventListener('instances', (e) => {
+            updateDashboard(JSON.parse(e.data));
+        });
+        source.addEventListener('worlds', (e) => {
+            const worlds = JSON.parse(e.data);
+            window.allWorlds = worlds;  // Store for search filtering
+            updateWorldsGallery(worlds);
         });
+        source.onerror = () => {
+            // The browser reconnects on its own (resuming via Last-Event-ID)
+            // unless the server refused the stream outright
+            if (source.readyState === EventSource.CLOSED) {
+                eventSource = null;
+                usePolling = true;
+                startPolling();
+            }
+        };
+    }
+
+    function connect() {
+        if (usePolling) {
+            startPolling();
+        } else {
+            openStream();
+        }
     }
 
-    // Initial fetch and interval
-    if (state.isConfigured && !state.viewerLocked) {
-        fetchStatus();
-        fetchWorlds();
-        setInterval(fetchStatus, 5000);
-        setInterval(fetchWorlds, 5000);
+    function disconnect() {
+        if (eventSource) {
+            eventSource.close();
+            eventSource = null;
+        }
+        clearTimeout(pollTimer);
+        pollTimer = null;
+    }
+
+    // Hidden tabs stop loading the server; they catch up as soon as they're shown again
+    document.addEventListener('visibilitychange', () => {
+        if (document.hidden) {
+            hiddenTimer = setTimeout(disconnect, HIDDEN_DISCONNECT_DELAY);
+        } else {
+            clearTimeout(hiddenTimer);
+            hiddenTimer = null;
+            if (state.isConfigured && !state.viewerLocked) connect();
+        }
+    });
+
+    if (state.isConfigured && !state.viewerLocked && !document.hidden) {
+        connect();
     }
 });
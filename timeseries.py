@@ -0,0 +1,243 @@
+"""
+Fixed-memory player count history for each instance.
+
+Every probe result is stored as a numeric (timestamp, current players, max
+players, status) sample in a ring buffer backed by `array` columns, and is
+also folded into 1 minute, 1 hour and 1 day rollup rings. All rings are
+allocated up front, so memory per instance is constant no matter how long the
+portal runs. Queries read from the coarsest ring that still fits the
+requested step and walk it backwards from the newest entry, so a 30 day query
+touches a few hundred buckets rather than every raw sample.
+"""
+import re
+import threading
+import time
+from array import array
+
+STATUS_CODES = {'offline': 0, 'online': 1, 'active': 2}
+RAW_CAPACITY = 4096
+# bucket size in seconds -> buckets kept (1 day of minutes, 30 days of hours, 1 year of days)
+ROLLUPS = ((60, 1440), (3600, 720), (86400, 366))
+DURATION_PATTERN = re.compile(r'^(\d+(?:\.\d+)?)([smhd]?)$')
+DURATION_UNITS = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}
+MAX_POINTS = 1000
+# Player counts are stored as 16-bit integers
+MAX_PLAYERS = 32767
+
+
+def parse_duration(value):
+    """Seconds in a duration like "90", "15m", "6h" or "7d". Raises ValueError."""
+    match = DURATION_PATTERN.match((value or '').strip().lower())
+    if not match:
+        raise ValueError(f"Invalid duration: {value!r}")
+    seconds = float(match.group(1)) * DURATION_UNITS[match.group(2)]
+    if seconds <= 0:
+        raise ValueError(f"Duration must be positive: {value!r}")
+    return seconds
+
+
+def column(typecode, capacity, fill=0):
+    return array(typecode, [fill]) * capacity
+
+
+class RawRing:
+    """The most recent samples, oldest overwritten first."""
+
+    def __init__(self, capacity=RAW_CAPACITY):
+        self.capacity = capacity
+        self.times = column('d', capacity)
+        # -1 when the count isn't known
+        self.current = column('h', capacity, -1)
+        self.maximum = column('h', capacity, -1)
+        self.status = column('b', capacity)
+        self.next = 0
+        self.count = 0
+
+    def nbytes(self):
+        return sum(values.itemsize * len(values)
+                   for values in (self.times, self.current, self.maximum, self.status))
+
+    def add(self, timestamp, current, maximum, status):
+        index = self.next
+        self.times[index] = timestamp
+        self.current[index] = current
+        self.maximum[index] = maximum
+        self.status[index] = status
+        self.next = (index + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def newest_first(self, start):
+        """Indexes of samples at or after `start`, newest first."""
+        for offset in range(1, self.count + 1):
+            index = (self.next - offset) % self.capacity
+            if self.times[index] < start:
+                return
+            yield index
+
+    def buckets(self, start):
+        """(time, samples, active, online, player_samples, player_total, player_max, player_limit)."""
+        for index in self.newest_first(start):
+            current, status = self.current[index], self.status[index]
+            known = current >= 0
+            yield (self.times[index], 1, int(status == 2), int(status >= 1), int(known),
+                   current if known else 0, current, self.maximum[index])
+
+
+class RollupRing:
+    """Per-bucket sample counts and player statistics for fixed-size time buckets."""
+
+    def __init__(self, bucket_seconds, capacity):
+        self.bucket_seconds = bucket_seconds
+        self.capacity = capacity
+        self.starts = column('d', capacity)
+        self.samples = column('l', capacity)
+        self.active = column('l', capacity)
+        self.online = column('l', capacity)
+        self.player_samples = column('l', capacity)
+        self.player_total = column('d', capacity)
+        self.player_max = column('h', capacity, -1)
+        self.player_limit = column('h', capacity, -1)
+        self.newest = -1
+        self.count = 0
+
+    def nbytes(self):
+        return sum(values.itemsize * len(values)
+                   for values in (self.starts, self.samples, self.active, self.online,
+                                  self.player_samples, self.player_total, self.player_max,
+                                  self.player_limit))
+
+    def add(self, timestamp, current, maximum, status):
+        start = timestamp - timestamp % self.bucket_seconds
+        index = self.newest
+        if index < 0 or start > self.starts[index]:
+            index = self.newest = (index + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+            self.starts[index] = start
+            self.samples[index] = self.active[index] = self.online[index] = 0
+            self.player_samples[index] = 0
+            self.player_total[index] = 0
+            self.player_max[index] = self.player_limit[index] = -1
+        elif start < self.starts[index]:
+            return  # clock went backwards; the raw ring still has the sample
+        self.samples[index] += 1
+        self.active[index] += status == 2
+        self.online[index] += status >= 1
+        if current >= 0:
+            self.player_samples[index] += 1
+            self.player_total[index] += current
+            self.player_max[index] = max(self.player_max[index], current)
+        self.player_limit[index] = max(self.player_limit[index], maximum)
+
+    def buckets(self, start):
+        """Buckets overlapping `start` onwards, newest first, in RawRing.buckets' layout."""
+        for offset in range(self.count):
+            index = (self.newest - offset) % self.capacity
+            if self.starts[index] + self.bucket_seconds <= start:
+                return
+            yield (self.starts[index], self.samples[index], self.active[index], self.online[index],
+                   self.player_samples[index], self.player_total[index], self.player_max[index],
+                   self.player_limit[index])
+
+
+class InstanceHistory:
+    def __init__(self):
+        self.raw = RawRing()
+        self.rollups = [RollupRing(bucket_seconds, capacity) for bucket_seconds, capacity in ROLLUPS]
+
+    def nbytes(self):
+        return self.raw.nbytes() + sum(rollup.nbytes() for rollup in self.rollups)
+
+    def add(self, timestamp, current, maximum, status):
+        self.raw.add(timestamp, current, maximum, status)
+        for rollup in self.rollups:
+            rollup.add(timestamp, current, maximum, status)
+
+    def source_for(self, step):
+        """The coarsest ring whose resolution is no coarser than `step`."""
+        source = self.raw
+        for rollup in self.rollups:
+            if rollup.bucket_seconds <= step:
+                source = rollup
+        return source
+
+
+class PlayerHistory:
+    """Player count history of every configured instance."""
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._instances = {}
+
+    def sync(self, names):
+        """Keep history only for the given instance names."""
+        with self._lock:
+            for name in list(self._instances):
+                if name not in names:
+                    del self._instances[name]
+
+    def record(self, name, status, current=None, maximum=None, timestamp=None):
+        code = STATUS_CODES.get(status)
+        if code is None:
+            return
+        with self._lock:
+            history = self._instances.get(name)
+            if history is None:
+                history = self._instances[name] = InstanceHistory()
+            history.add(timestamp or self.clock(), -1 if current is None else min(current, MAX_PLAYERS),
+                        -1 if maximum is None else min(maximum, MAX_PLAYERS), code)
+
+    def nbytes(self):
+        """Memory held by all sample and rollup arrays."""
+        with self._lock:
+            return sum(history.nbytes() for history in self._instances.values())
+
+    def query(self, name, range_seconds, step=None):
+        """
+        Samples of `name` over the last `range_seconds`, aggregated into
+        `step`-second points (chosen automatically if None). Returns None if
+        the instance has no history.
+        """
+        if step is None:
+            step = max(60, range_seconds / 300)
+        # Keep the response bounded regardless of what was asked for
+        step = max(step, range_seconds / MAX_POINTS)
+        now = self.clock()
+        start = now - range_seconds
+
+        points = {}
+        with self._lock:
+            history = self._instances.get(name)
+            if history is None:
+                return None
+            source = history.source_for(step)
+            for bucket in source.buckets(start):
+                bucket_time = bucket[0]
+                point_time = max(bucket_time, start) // step * step
+                point = points.get(point_time)
+                if point is None:
+                    points[point_time] = list(bucket[1:])
+                    continue
+                for field in range(4):
+                    point[field] += bucket[1 + field]
+                point[4] += bucket[5]
+                point[5] = max(point[5], bucket[6])
+                point[6] = max(point[6], bucket[7])
+
+        resolution = getattr(source, 'bucket_seconds', 0)
+        return {
+            'instance': name,
+            'range': range_seconds,
+            'step': step,
+            'resolution': resolution,
+            'points': [{
+                'time': point_time,
+                'samples': samples,
+                'active': round(active / samples, 3) if samples else None,
+                'online': round(online / samples, 3) if samples else None,
+                'avg_players': round(total / player_samples, 2) if player_samples else None,
+                'max_players': player_max if player_max >= 0 else None,
+                'player_limit': player_limit if player_limit >= 0 else None,
+            } for point_time, (samples, active, online, player_samples, total, player_max, player_limit)
+                in sorted(points.items())],
+        }
@@ -0,0 +1,103 @@
+"""
+Per-cycle trace spans for the refresh loop.
+
+Each refresh cycle is recorded as a tree of timed spans: the cycle itself,
+one span per instance probe, and one per probe phase (HTTP probe, browser
+startup, page load, waiting for player counts). Only the last `max_cycles`
+cycles are kept, and `/debug/trace` shows them newest first.
+
+Spans nest by execution context: a span opened while another is open becomes
+its child. The open spans are kept in a context variable, so work submitted to
+another thread with the context copied (the refresh engine does this for
+probes) still attaches to the cycle that started it, even when several cycles
+overlap.
+"""
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+DEFAULT_MAX_CYCLES = 20
+
+
+class Span:
+    __slots__ = ('name', 'attrs', 'started', 'duration', 'status', 'children')
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.started = time.time()
+        self.duration = None
+        self.status = 'ok'
+        self.children = []
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def view(self, origin):
+        return {
+            'name': self.name,
+            'offset_ms': round((self.started - origin) * 1000, 1),
+            'duration_ms': round(self.duration * 1000, 1) if self.duration is not None else None,
+            'status': self.status,
+            'attrs': dict(self.attrs),
+            'children': [child.view(origin) for child in list(self.children)],
+        }
+
+
+class Tracer:
+    def __init__(self, max_cycles=DEFAULT_MAX_CYCLES):
+        self._lock = threading.Lock()
+        self._cycles = deque(maxlen=max_cycles)
+        # Spans open in the current context, innermost last
+        self._open = contextvars.ContextVar('open_spans', default=())
+
+    def configure(self, max_cycles):
+        with self._lock:
+            if max_cycles != self._cycles.maxlen:
+                self._cycles = deque(self._cycles, maxlen=max(1, int(max_cycles)))
+
+    @contextmanager
+    def _record(self, span, parent):
+        if parent is not None:
+            with self._lock:
+                parent.children.append(span)
+        token = self._open.set(self._open.get() + (span,))
+        started = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.status = 'error'
+            span.attrs['error'] = str(e)
+            raise
+        finally:
+            span.duration = time.perf_counter() - started
+            self._open.reset(token)
+
+    @contextmanager
+    def cycle(self, **attrs):
+        """Trace a refresh cycle; spans opened while it runs become its children."""
+        span = Span('cycle', attrs)
+        with self._lock:
+            self._cycles.append(span)
+        with self._record(span, None):
+            yield span
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """Trace a step of the current cycle. Yields None (and records nothing) outside a cycle."""
+        stack = self._open.get()
+        if not stack:
+            yield None
+            return
+        parent = stack[-1]
+        with self._record(Span(name, attrs), parent) as span:
+            yield span
+
+    def snapshot(self, limit=None):
+        """The recorded cycles, newest first."""
+        with self._lock:
+            cycles = list(self._cycles)
+        cycles.reverse()
+        return [cycle.view(cycle.started) for cycle in cycles[:limit]]
@@ -0,0 +1,573 @@
+"""
+World history and probe observations, kept in memory and stored in SQLite.
+
+The world registry is loaded from the database once and then kept in memory,
+indexed by instance name. Updates mark the changed worlds dirty and a
+debounced background flush writes just those rows, coalescing everything that
+changed in the meantime. Status changes, new worlds and deletions are flushed
+quickly; routine `last_seen` bumps for running worlds are batched over a
+longer window.
+
+Every probe result is also recorded as an observation (instance, world,
+status, player counts) so player activity and uptime can be queried later.
+Raw observations are kept for `observation_retention_days` and then folded
+into hourly rows, which are kept for `history_retention_days`.
+
+An existing `schema_version: 1` worlds.json is imported into the database
+the first time it is opened; the JSON file is left in place as a backup.
+
+An optional `on_change(key, world)` callback is told about every world entry
+that is added, updated or removed (with `world` None), so callers can keep a
+change log without diffing the whole registry.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+import metrics
+
+log = logging.getLogger('portal.storage')
+
+SCHEMA_VERSION = 2
+LEGACY_SCHEMA_VERSION = 1
+URGENT_FLUSH_DELAY = 2
+ROUTINE_FLUSH_DELAY = 60
+DEFAULT_SETTINGS = {
+    'observation_retention_days': 7,
+    'history_retention_days': 365,
+}
+# How often raw observations are downsampled and expired
+MAINTENANCE_INTERVAL = 3600
+# Observations held in memory while the database can't be written
+MAX_PENDING_OBSERVATIONS = 10000
+HOUR = 3600
+DAY = 24 * HOUR
+
+WORLD_COLUMNS = ('name', 'instance_name', 'instance_url', 'first_seen', 'last_seen', 'status',
+                 'cached_background_url', 'times_seen')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS worlds (
+    key TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    instance_name TEXT NOT NULL,
+    instance_url TEXT,
+    first_seen TEXT,
+    last_seen TEXT,
+    status TEXT,
+    cached_background_url TEXT,
+    times_seen INTEGER DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS worlds_by_instance ON worlds (instance_name);
+CREATE TABLE IF NOT EXISTS observations (
+    id INTEGER PRIMARY KEY,
+    observed_at REAL NOT NULL,
+    instance_name TEXT NOT NULL,
+    world_key TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL,
+    players INTEGER,
+    max_players INTEGER
+);
+CREATE INDEX IF NOT EXISTS observations_by_instance ON observations (instance_name, observed_at);
+CREATE INDEX IF NOT EXISTS observations_by_world ON observations (world_key, observed_at);
+CREATE TABLE IF NOT EXISTS observations_hourly (
+    instance_name TEXT NOT NULL,
+    world_key TEXT NOT NULL DEFAULT '',
+    hour INTEGER NOT NULL,
+    samples INTEGER NOT NULL,
+    active_samples INTEGER NOT NULL,
+    online_samples INTEGER NOT NULL,
+    player_samples INTEGER NOT NULL,
+    players_total INTEGER NOT NULL,
+    players_max INTEGER,
+    PRIMARY KEY (instance_name, world_key, hour)
+);
+CREATE INDEX IF NOT EXISTS observations_hourly_by_world ON observations_hourly (world_key, hour);
+"""
+
+# Per-hour aggregates of raw observations, in observations_hourly's column order
+HOURLY_AGGREGATE = """
+SELECT instance_name, world_key, CAST(observed_at / 3600 AS INTEGER) * 3600 AS hour,
+       COUNT(*), SUM(status = 'active'), SUM(status != 'offline'),
+       COUNT(players), COALESCE(SUM(players), 0), MAX(players)
+FROM observations
+"""
+
+
+def empty_worlds_data():
+    return {"worlds": {}, "schema_version": SCHEMA_VERSION}
+
+
+def read_worlds_file(path):
+    """Load world history from a legacy worlds.json file."""
+    if not os.path.exists(path):
+        return {"worlds": {}, "schema_version": LEGACY_SCHEMA_VERSION}
+    try:
+        with open(path, 'r') as file:
+            return json.load(file)
+    except (json.JSONDecodeError, IOError):
+        log.error("Could not load %s, returning empty data", path)
+        return {"worlds": {}, "schema_version": LEGACY_SCHEMA_VERSION}
+
+
+def world_key(instance_name, world_name):
+    return f"{instance_name}::{world_name}"
+
+
+def parse_players(player_info):
+    """(current, maximum) from a "3 / 6" player count string, or (None, None)."""
+    try:
+        current, maximum = (int(part) for part in player_info.split('/'))
+        return current, maximum
+    except (AttributeError, TypeError, ValueError):
+        return None, None
+
+
+class WorldStore:
+    def __init__(self, path, legacy_path=None, urgent_delay=URGENT_FLUSH_DELAY,
+                 routine_delay=ROUTINE_FLUSH_DELAY, on_change=None):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.on_change = on_change
+        self.urgent_delay = urgent_delay
+        self.routine_delay = routine_delay
+        self.settings = dict(DEFAULT_SETTINGS)
+        self._lock = threading.RLock()
+        # Serializes all database access; the connection is shared between threads
+        self._write_lock = threading.Lock()
+        self._db = None
+        self._loaded = False
+        self._worlds = {}
+        self._by_instance = {}
+        # Last (status, active world name) applied per instance
+        self._instance_states = {}
+        # Worlds changed or deleted since the last flush, and observations not yet written
+        self._dirty_keys = set()
+        self._pending_observations = []
+        self._timer = None
+        self._timer_due = None
+        self._last_maintenance = 0
+        # Bumped on every change so readers can cache derived views
+        self.version = 0
+
+    def configure(self, settings):
+        """Apply the ``storage`` section of config.yaml."""
+        merged = dict(DEFAULT_SETTINGS)
+        merged.update(settings or {})
+        self.settings = merged
+
+    # --- Database ---
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.executescript(SCHEMA)
+        return db
+
+    def _migrate(self, db):
+        """Import a schema_version 1 worlds.json once, when the database is new."""
+        if db.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone():
+            return
+        worlds = {}
+        if self.legacy_path and os.path.exists(self.legacy_path):
+            data = read_worlds_file(self.legacy_path)
+            if data.get('schema_version', LEGACY_SCHEMA_VERSION) == LEGACY_SCHEMA_VERSION:
+                worlds = data.get('worlds', {})
+            else:
+                log.error("%s has unknown schema_version %s, not importing it",
+                          self.legacy_path, data.get('schema_version'))
+        with metrics.storage_duration.time(operation='migrate'):
+            db.execute('BEGIN')
+            self._write_worlds(db, worlds.items(), [])
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('schema_version', ?)",
+                       (str(SCHEMA_VERSION),))
+            db.execute('COMMIT')
+        if worlds:
+            log.info("Imported %d worlds from %s into %s", len(worlds), self.legacy_path, self.path)
+
+    @staticmethod
+    def _write_worlds(db, upserts, deletes):
+        db.executemany('DELETE FROM worlds WHERE key = ?', [(key,) for key in deletes])
+        db.executemany(
+            f"INSERT OR REPLACE INTO worlds (key, {', '.join(WORLD_COLUMNS)}) "
+            f"VALUES (?, {', '.join('?' for _ in WORLD_COLUMNS)})",
+            [(key,) + tuple(world.get(column) for column in WORLD_COLUMNS) for key, world in upserts])
+
+    # --- Loading and indexing ---
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        # Read outside self._lock: flushes take the database lock before it
+        worlds = self._read_worlds()
+        with self._lock:
+            if self._loaded:
+                return
+            self._set_worlds(worlds)
+            self._loaded = True
+
+    def _read_worlds(self):
+        with self._write_lock:
+            try:
+                with metrics.storage_duration.time(operation='load'):
+                    if self._db is None:
+                        self._db = self._connect()
+                        self._migrate(self._db)
+                    rows = self._db.execute(f"SELECT key, {', '.join(WORLD_COLUMNS)} FROM worlds").fetchall()
+            except sqlite3.Error as e:
+                log.error("Could not open %s: %s", self.path, e)
+                rows = []
+        worlds = {}
+        for row in rows:
+            worlds[row[0]] = {column: value for column, value in zip(WORLD_COLUMNS, row[1:])
+                              if value is not None}
+        return worlds
+
+    def reload(self):
+        """Read the registry from the database again, e.g. when taking over from another process."""
+        self.mirror(self._read_worlds())
+
+    def mirror(self, worlds):
+        """
+        Replace the in-memory registry with another process's copy without
+        writing anything, e.g. in a follower worker. Returns True if it changed.
+        """
+        with self._lock:
+            changed = [key for key in set(self._worlds) | set(worlds)
+                       if self._worlds.get(key) != worlds.get(key)]
+            self._loaded = True
+            if not changed:
+                return False
+            self._set_worlds({key: dict(world) for key, world in worlds.items()})
+            self.version += 1
+            self._notify(sorted(changed))
+            return True
+
+    def mirror_changes(self, changed, removed):
+        """
+        Apply another process's changes to single entries (`changed` maps keys
+        to entries, `removed` lists keys) without writing anything.
+        """
+        with self._lock:
+            keys = []
+            for key, world in changed.items():
+                if self._worlds.get(key) != world:
+                    self._worlds[key] = dict(world)
+                    self._by_instance.setdefault(world['instance_name'], set()).add(key)
+                    keys.append(key)
+            for key in removed:
+                world = self._worlds.pop(key, None)
+                if world is not None:
+                    self._by_instance.get(world['instance_name'], set()).discard(key)
+                    keys.append(key)
+            if keys:
+                self.version += 1
+                self._notify(keys)
+            return bool(keys)
+
+    def _set_worlds(self, worlds):
+        self._worlds = worlds
+        self._by_instance = {}
+        self._instance_states = {}
+        for key, world in worlds.items():
+            self._by_instance.setdefault(world['instance_name'], set()).add(key)
+            if world.get('status', 'offline') != 'offline':
+                # Unknown until the instance is probed again
+                self._instance_states[world['instance_name']] = None
+
+    def _notify(self, keys):
+        if self.on_change is None:
+            return
+        for key in keys:
+            world = self._worlds.get(key)
+            self.on_change(key, dict(world) if world is not None else None)
+
+    # --- Reads ---
+
+    def snapshot(self):
+        """Copy of the full worlds mapping."""
+        self._ensure_loaded()
+        with self._lock:
+            return {key: dict(world) for key, world in self._worlds.items()}
+
+    def worlds(self):
+        """Copy of every world entry as a list."""
+        self._ensure_loaded()
+        with self._lock:
+            return [dict(world) for world in self._worlds.values()]
+
+    def get(self, key):
+        """Copy of a single world entry, or None."""
+        self._ensure_loaded()
+        with self._lock:
+            world = self._worlds.get(key)
+            return dict(world) if world is not None else None
+
+    def history(self, instance_name=None, key=None, since=None):
+        """
+        Hourly activity of an instance or a world since `since` (epoch seconds):
+        a list of {time, samples, active, online, avg_players, max_players}.
+        """
+        self._ensure_loaded()
+        column, value = ('world_key', key) if key is not None else ('instance_name', instance_name)
+        since = since or 0
+        buckets = {}
+        with self._write_lock:
+            if self._db is None:
+                return []
+            # Already downsampled hours, plus raw observations aggregated on the fly
+            rows = self._db.execute(
+                f"SELECT hour, samples, active_samples, online_samples, player_samples, players_total, "
+                f"players_max FROM observations_hourly WHERE {column} = ? AND hour >= ?",
+                (value, since - since % HOUR)).fetchall()
+            rows += [row[2:] for row in self._db.execute(
+                f"{HOURLY_AGGREGATE} WHERE {column} = ? AND observed_at >= ? GROUP BY 1, 2, 3",
+                (value, since)).fetchall()]
+        for hour, samples, active, online, player_samples, players_total, players_max in rows:
+            bucket = buckets.setdefault(hour, [0, 0, 0, 0, 0, None])
+            bucket[0] += samples
+            bucket[1] += active
+            bucket[2] += online
+            bucket[3] += player_samples
+            bucket[4] += players_total
+            if players_max is not None:
+                bucket[5] = max(bucket[5] or 0, players_max)
+        return [{
+            'time': hour,
+            'samples': samples,
+            'active': round(active / samples, 3),
+            'online': round(online / samples, 3),
+            'avg_players': round(players_total / player_samples, 2) if player_samples else None,
+            'max_players': players_max,
+        } for hour, (samples, active, online, player_samples, players_total, players_max)
+            in sorted(buckets.items())]
+
+    # --- Writes ---
+
+    def replace(self, worlds):
+        """Replace the whole registry (e.g. clearing history)."""
+        self._ensure_loaded()
+        with self._lock:
+            previous = set(self._worlds)
+            self._set_worlds({key: dict(world) for key, world in worlds.items()})
+            changed = previous | set(self._worlds)
+            self._mark_dirty(changed, urgent=True)
+            self._notify(changed)
+
+    def delete(self, key):
+        """Remove a single world. Returns False if it doesn't exist."""
+        self._ensure_loaded()
+        with self._lock:
+            world = self._worlds.pop(key, None)
+            if world is None:
+                return False
+            keys = self._by_instance.get(world['instance_name'])
+            if keys:
+                keys.discard(key)
+            self._mark_dirty([key], urgent=True)
+            self._notify([key])
+            return True
+
+    def record_observation(self, instance_name, status, world_name=None, players=None, max_players=None):
+        """Queue one probe result to be written with the next flush."""
+        key = world_key(instance_name, world_name) if world_name else ''
+        with self._lock:
+            self._pending_observations.append((time.time(), instance_name, key, status, players, max_players))
+            if len(self._pending_observations) > MAX_PENDING_OBSERVATIONS:
+                del self._pending_observations[:-MAX_PENDING_OBSERVATIONS]
+            self._schedule_flush(self.routine_delay)
+
+    def _set_status(self, key, status):
+        world = self._worlds[key]
+        if world.get('status') != status:
+            world['status'] = status
+            return True
+        return False
+
+    def apply_instances(self, instances, probed=None):
+        """
+        Update world statuses from the latest instance states.
+        Only instances whose state changed since the last call touch their
+        worlds; running worlds just get their last_seen bumped. If `probed`
+        (a set of instance names) is given, only those instances' running
+        worlds count as seen again; the others' entries are cached results.
+        Returns copies of the worlds that are new or whose background changed.
+        """
+        self._ensure_loaded()
+        now = datetime.utcnow().isoformat() + 'Z'
+        urgent = False
+        new_backgrounds = []
+        changed = set()
+
+        with self._lock:
+            seen = set()
+            for instance in instances:
+                instance_name = instance['name']
+                instance_status = instance['status']
+                seen.add(instance_name)
+
+                active_key = None
+                if instance_status == 'active' and instance.get('active_world'):
+                    # World is running
+                    active_world = instance['active_world']
+                    active_key = world_key(instance_name, active_world['name'])
+                    world = self._worlds.get(active_key)
+                    fresh = probed is None or instance_name in probed
+                    if world is not None:
+                        # A cached result from an earlier cycle doesn't mean the world was seen again
+                        if fresh:
+                            world['last_seen'] = now
+                            world['times_seen'] = world.get('times_seen', 0) + 1
+                            changed.add(active_key)
+                        if active_world.get('background') and \
+                                world.get('cached_background_url') != active_world['background']:
+                            world['cached_background_url'] = active_world['background']
+                            changed.add(active_key)
+                            new_backgrounds.append(dict(world))
+                            urgent = True
+                    else:
+                        self._worlds[active_key] = {
+                            'name': active_world['name'],
+                            'instance_name': instance_name,
+                            'instance_url': instance['url'],
+                            'first_seen': now,
+                            'last_seen': now,
+                            'status': 'active',
+                            'cached_background_url': active_world.get('background'),
+                            'times_seen': 1
+                        }
+                        self._by_instance.setdefault(instance_name, set()).add(active_key)
+                        changed.add(active_key)
+                        new_backgrounds.append(dict(self._worlds[active_key]))
+                        urgent = True
+
+                state = (instance_status, active_key)
+                if self._instance_states.get(instance_name, ()) == state:
+                    continue
+                self._instance_states[instance_name] = state
+
+                # Instance changed state: re-derive the status of each of its worlds
+                idle_status = 'idle' if instance_status == 'online' else 'offline'
+                for key in self._by_instance.get(instance_name, ()):
+                    if self._set_status(key, 'active' if key == active_key else idle_status):
+                        changed.add(key)
+                        urgent = True
+
+            # Instances no longer reported (e.g. removed from config) go offline
+            for instance_name in [name for name in self._instance_states if name not in seen]:
+                del self._instance_states[instance_name]
+                for key in self._by_instance.get(instance_name, ()):
+                    if self._set_status(key, 'offline'):
+                        changed.add(key)
+                        urgent = True
+
+            if changed:
+                self._mark_dirty(changed, urgent=urgent)
+            self._notify(sorted(changed))
+        return new_backgrounds
+
+    # --- Write-behind persistence ---
+
+    def _mark_dirty(self, keys, urgent=False):
+        self.version += 1
+        self._dirty_keys.update(keys)
+        self._schedule_flush(self.urgent_delay if urgent else self.routine_delay)
+
+    def _schedule_flush(self, delay):
+        due = time.monotonic() + delay
+        if self._timer is not None and self._timer_due <= due:
+            return  # an earlier flush is already scheduled and will include this change
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, self.flush)
+        self._timer.daemon = True
+        self._timer_due = due
+        self._timer.start()
+
+    def flush(self):
+        """Write changed worlds and new observations to the database."""
+        with self._write_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                    self._timer_due = None
+                if self._db is None or not (self._dirty_keys or self._pending_observations):
+                    return
+                upserts = [(key, dict(self._worlds[key])) for key in self._dirty_keys if key in self._worlds]
+                deletes = [key for key in self._dirty_keys if key not in self._worlds]
+                observations = self._pending_observations
+                self._dirty_keys = set()
+                self._pending_observations = []
+
+            try:
+                with metrics.storage_duration.time(operation='flush'):
+                    self._db.execute('BEGIN')
+                    try:
+                        self._write_worlds(self._db, upserts, deletes)
+                        self._db.executemany(
+                            'INSERT INTO observations (observed_at, instance_name, world_key, status, players, '
+                            'max_players) VALUES (?, ?, ?, ?, ?, ?)', observations)
+                        self._db.execute('COMMIT')
+                    except sqlite3.Error:
+                        self._db.execute('ROLLBACK')
+                        raise
+                log.debug("Saved %d worlds, removed %d, recorded %d observations to %s",
+                          len(upserts), len(deletes), len(observations), self.path)
+            except sqlite3.Error as e:
+                log.error("Could not save %s: %s", self.path, e)
+                with self._lock:
+                    # Retry later, unless a newer change to the same world is already pending
+                    self._dirty_keys.update(key for key, _ in upserts)
+                    self._dirty_keys.update(deletes)
+                    self._pending_observations[:0] = observations
+                    del self._pending_observations[:-MAX_PENDING_OBSERVATIONS]
+                    self._schedule_flush(self.routine_delay)
+                return
+
+            if time.time() - self._last_maintenance >= MAINTENANCE_INTERVAL:
+                self._maintain()
+
+    # --- Retention ---
+
+    def _maintain(self):
+        """Fold expired raw observations into hourly rows and drop expired hourly rows."""
+        now = time.time()
+        raw_cutoff = now - float(self.settings['observation_retention_days']) * DAY
+        history_cutoff = now - float(self.settings['history_retention_days']) * DAY
+        try:
+            with metrics.storage_duration.time(operation='maintenance'):
+                self._db.execute('BEGIN')
+                try:
+                    self._db.execute(
+                        f"INSERT INTO observations_hourly {HOURLY_AGGREGATE} WHERE observed_at < ? "
+                        f"GROUP BY 1, 2, 3 "
+                        f"ON CONFLICT (instance_name, world_key, hour) DO UPDATE SET "
+                        f"samples = samples + excluded.samples, "
+                        f"active_samples = active_samples + excluded.active_samples, "
+                        f"online_samples = online_samples + excluded.online_samples, "
+                        f"player_samples = player_samples + excluded.player_samples, "
+                        f"players_total = players_total + excluded.players_total, "
+                        f"players_max = MAX(COALESCE(players_max, 0), COALESCE(excluded.players_max, 0))",
+                        (raw_cutoff,))
+                    downsampled = self._db.execute('DELETE FROM observations WHERE observed_at < ?',
+                                                   (raw_cutoff,)).rowcount
+                    expired = self._db.execute('DELETE FROM observations_hourly WHERE hour < ?',
+                                               (history_cutoff,)).rowcount
+                    self._db.execute('COMMIT')
+                except sqlite3.Error:
+                    self._db.execute('ROLLBACK')
+                    raise
+            self._last_maintenance = now
+            if downsampled or expired:
+                log.info("Downsampled %d observations, expired %d hourly rows", downsampled, expired)
+        except sqlite3.Error as e:
+            log.error("Observation maintenance failed: %s", e)